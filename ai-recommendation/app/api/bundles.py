@@ -1,7 +1,7 @@
 """Bundle API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlmodel import Session
-from typing import List, Optional, Dict, Any
+from sqlmodel import Session, select
+from typing import Iterable, List, Optional, Dict, Any, Type
 from app.db.session import get_session
 from app.services.concierge_agent import ConciergeAgent
 from app.services.deal_selector import DealSelector
@@ -17,6 +17,42 @@ from app.models import Bundle, FlightDeal, HotelDeal
 router = APIRouter(prefix="/bundles", tags=["bundles"])
 
 
+def _load_by_id(session: Session, model: Type, ids: Iterable[int]) -> Dict[int, Any]:
+    """Load rows of model with one IN query, keyed by ID"""
+    ids = set(ids)
+    if not ids:
+        return {}
+    return {row.id: row for row in session.exec(select(model).where(model.id.in_(ids)))}
+
+
+def _bundle_responses(session: Session, bundles: List[Bundle]) -> List[BundleResponse]:
+    """Build bundle responses, loading every flight and hotel of the page at once"""
+    flights = _load_by_id(
+        session, FlightDeal, (fid for bundle in bundles for fid in bundle.deal_ids("flight"))
+    )
+    hotels = _load_by_id(
+        session, HotelDeal, (hid for bundle in bundles for hid in bundle.deal_ids("hotel"))
+    )
+    
+    return [
+        BundleResponse(
+            id=bundle.id,
+            name=bundle.name,
+            description=bundle.description,
+            total_price=bundle.total_price,
+            savings=bundle.savings,
+            tags=bundle.tag_list,
+            flights=[FlightDealResponse.model_validate(flights[fid])
+                     for fid in bundle.deal_ids("flight") if fid in flights],
+            hotels=[HotelDealResponse.model_validate(hotels[hid])
+                    for hid in bundle.deal_ids("hotel") if hid in hotels],
+            cars=[],  # Car deals not yet implemented
+            created_at=bundle.created_at
+        )
+        for bundle in bundles
+    ]
+
+
 @router.get("", response_model=List[BundleResponse])
 async def get_bundles(
     origin: Optional[str] = Query(None),
@@ -39,41 +75,7 @@ async def get_bundles(
     concierge = ConciergeAgent(session)
     bundles = concierge.recommend_bundles(params, limit=limit)
     
-    # Convert to response format
-    result = []
-    for bundle in bundles:
-        # Parse deal IDs
-        flight_ids = [int(id) for id in bundle.flight_deal_ids.split(",") if id.strip()]
-        hotel_ids = [int(id) for id in bundle.hotel_deal_ids.split(",") if id.strip()]
-        
-        # Fetch deals
-        flights = []
-        for fid in flight_ids:
-            flight = session.get(FlightDeal, fid)
-            if flight:
-                flights.append(FlightDealResponse.model_validate(flight))
-        
-        hotels = []
-        for hid in hotel_ids:
-            hotel = session.get(HotelDeal, hid)
-            if hotel:
-                hotels.append(HotelDealResponse.model_validate(hotel))
-        
-        bundle_response = BundleResponse(
-            id=bundle.id,
-            name=bundle.name,
-            description=bundle.description,
-            total_price=bundle.total_price,
-            savings=bundle.savings,
-            tags=[tag.strip() for tag in bundle.tags.split(",") if tag.strip()],
-            flights=flights,
-            hotels=hotels,
-            cars=[],  # Car deals not yet implemented
-            created_at=bundle.created_at
-        )
-        result.append(bundle_response)
-    
-    return result
+    return _bundle_responses(session, bundles)
 
 
 @router.get("/{bundle_id}", response_model=BundleResponse)
@@ -86,27 +88,7 @@ async def get_bundle(
     if not bundle:
         raise HTTPException(status_code=404, detail="Bundle not found")
     
-    # Parse and fetch deals
-    flight_ids = [int(id) for id in bundle.flight_deal_ids.split(",") if id.strip()]
-    hotel_ids = [int(id) for id in bundle.hotel_deal_ids.split(",") if id.strip()]
-    
-    flights = [FlightDealResponse.model_validate(session.get(FlightDeal, fid))
-               for fid in flight_ids if session.get(FlightDeal, fid)]
-    hotels = [HotelDealResponse.model_validate(session.get(HotelDeal, hid))
-              for hid in hotel_ids if session.get(HotelDeal, hid)]
-    
-    return BundleResponse(
-        id=bundle.id,
-        name=bundle.name,
-        description=bundle.description,
-        total_price=bundle.total_price,
-        savings=bundle.savings,
-        tags=[tag.strip() for tag in bundle.tags.split(",") if tag.strip()],
-        flights=flights,
-        hotels=hotels,
-        cars=[],
-        created_at=bundle.created_at
-    )
+    return _bundle_responses(session, [bundle])[0]
 
 
 @router.post("/query", response_model=List[BundleResponse])
@@ -153,39 +135,7 @@ async def query_bundles(
     concierge = ConciergeAgent(session)
     bundles = concierge.recommend_bundles(search_params, limit=5)
     
-    # Convert to response format
-    result = []
-    for bundle in bundles:
-        flight_ids = [int(id) for id in bundle.flight_deal_ids.split(",") if id.strip()]
-        hotel_ids = [int(id) for id in bundle.hotel_deal_ids.split(",") if id.strip()]
-        
-        flights = []
-        for fid in flight_ids:
-            flight = session.get(FlightDeal, fid)
-            if flight:
-                flights.append(FlightDealResponse.model_validate(flight))
-        
-        hotels = []
-        for hid in hotel_ids:
-            hotel = session.get(HotelDeal, hid)
-            if hotel:
-                hotels.append(HotelDealResponse.model_validate(hotel))
-        
-        bundle_response = BundleResponse(
-            id=bundle.id,
-            name=bundle.name,
-            description=bundle.description,
-            total_price=bundle.total_price,
-            savings=bundle.savings,
-            tags=[tag.strip() for tag in bundle.tags.split(",") if tag.strip()],
-            flights=flights,
-            hotels=hotels,
-            cars=[],
-            created_at=bundle.created_at
-        )
-        result.append(bundle_response)
-    
-    return result
+    return _bundle_responses(session, bundles)
 
 
 @router.post("", response_model=BundleResponse)
@@ -197,8 +147,10 @@ async def create_bundle(
     concierge = ConciergeAgent(session)
     
     # Fetch deals
-    flights = [session.get(FlightDeal, fid) for fid in bundle_data.flight_deal_ids]
-    hotels = [session.get(HotelDeal, hid) for hid in bundle_data.hotel_deal_ids]
+    flights_by_id = _load_by_id(session, FlightDeal, bundle_data.flight_deal_ids)
+    hotels_by_id = _load_by_id(session, HotelDeal, bundle_data.hotel_deal_ids)
+    flights = [flights_by_id.get(fid) for fid in bundle_data.flight_deal_ids]
+    hotels = [hotels_by_id.get(hid) for hid in bundle_data.hotel_deal_ids]
     
     # Calculate totals
     total_price = (
@@ -214,10 +166,12 @@ async def create_bundle(
         name=bundle_data.name,
         description=bundle_data.description,
         total_price=total_price,
-        savings=savings,
-        flight_deal_ids=",".join(str(fid) for fid in bundle_data.flight_deal_ids),
-        hotel_deal_ids=",".join(str(hid) for hid in bundle_data.hotel_deal_ids),
-        car_deal_ids=",".join(str(cid) for cid in bundle_data.car_deal_ids)
+        savings=savings
+    )
+    bundle.set_contents(
+        flight_ids=bundle_data.flight_deal_ids,
+        hotel_ids=bundle_data.hotel_deal_ids,
+        car_ids=bundle_data.car_deal_ids
     )
     
     session.add(bundle)
@@ -95,7 +95,7 @@ async def chat_message(
                     "description": bundle.description,
                     "total_price": bundle.total_price,
                     "savings": bundle.savings,
-                    "tags": bundle.tags.split(",") if bundle.tags else []
+                    "tags": bundle.tag_list
                 })
             
             # Generate response message
@@ -0,0 +1,361 @@
+"""Offline bulk import of datasets straight into the database, bypassing Kafka"""
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, inspect, select, text, update
+from sqlmodel import Session
+
+from app.data.csv_processor import DATASET_FILES, CSVProcessor
+from app.data.deal_leaderboard import deal_leaderboards
+from app.db.session import create_db_and_tables, engine
+from app.deals_agent.deal_detector import DealDetector
+from app.deals_agent.offer_tagger import OfferTagger
+from app.models import FlightDeal, HotelDeal, PriceDailyRollup, PriceHistory
+from app.models.keys import location_key
+
+# Departure hour for the Flight Price dataset's time-of-day buckets
+_DEPARTURE_HOURS = {
+    "Early_Morning": 6,
+    "Morning": 9,
+    "Afternoon": 14,
+    "Evening": 18,
+    "Night": 21,
+    "Late_Night": 23,
+}
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_IMPORT_TABLES = [
+    FlightDeal.__table__,
+    HotelDeal.__table__,
+    PriceHistory.__table__,
+    PriceDailyRollup.__table__,
+]
+
+
+class BulkImporter:
+    """Seeds deals and price history from dataset files without Kafka
+    
+    Records go through the same normalization, batch scoring and tagging as
+    the ingestion worker and are written with multi-row inserts, one
+    transaction per batch. Every priced record becomes a price point. Deals
+    scoring at least min_deal_score (by default the worker's good-deal
+    threshold) are kept as one row per flight (airline, flight number) or
+    hotel (name, city), the last one winning. Scoring uses no price history,
+    so this is meant for seeding an empty or stale database, not for
+    replaying live feeds. Secondary indexes on the target tables are dropped
+    for the load and rebuilt at the end.
+    """
+    
+    def __init__(
+        self,
+        batch_size: int = None,
+        min_deal_score: float = None,
+        rebuild_indexes: bool = None
+    ):
+        self.batch_size = batch_size or int(os.getenv("BULK_IMPORT_BATCH_SIZE", "50000"))
+        min_deal_score = min_deal_score if min_deal_score is not None else os.getenv(
+            "BULK_IMPORT_MIN_DEAL_SCORE", ""
+        )
+        self.min_deal_score = float(min_deal_score) if min_deal_score != "" else None
+        self.rebuild_indexes = rebuild_indexes if rebuild_indexes is not None else (
+            os.getenv("BULK_IMPORT_REBUILD_INDEXES", "true").lower() == "true"
+        )
+        self.now = datetime.now()
+        self._flights: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._hotels: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # (listing_type, listing_id) -> [price_sum, price_count, min_price, max_price]
+        self._rollups: Dict[Tuple[str, str], List[float]] = {}
+        self.stats = defaultdict(int)
+    
+    def run(self, datasets: List[Tuple[str, str]]):
+        """Import (path, dataset_type) files, then write deals and rebuild indexes"""
+        create_db_and_tables()
+        started = time.perf_counter()
+        dropped = self._drop_indexes() if self.rebuild_indexes else []
+        try:
+            for dataset_path, dataset_type in datasets:
+                self.import_dataset(dataset_path, dataset_type)
+            self._write_deals()
+            self._write_rollups()
+        finally:
+            if dropped:
+                self._create_indexes(dropped)
+        self._rebuild_leaderboards()
+        print(
+            f"Bulk import finished in {time.perf_counter() - started:.1f}s: "
+            f"{self.stats['records']} records, {self.stats['price_points']} price points, "
+            f"{self.stats['flights_inserted']} + {self.stats['flights_updated']} flight deals, "
+            f"{self.stats['hotels_inserted']} + {self.stats['hotels_updated']} hotel deals "
+            f"(inserted + updated), {self.stats['skipped']} skipped"
+        )
+    
+    def import_dataset(self, dataset_path: str, dataset_type: str):
+        """Score and tag one dataset, storing its price points batch by batch"""
+        started = time.perf_counter()
+        count = 0
+        for records in CSVProcessor.process_dataset_batches(
+            dataset_path, dataset_type, self.batch_size
+        ):
+            self._import_batch(records)
+            count += len(records)
+            elapsed = time.perf_counter() - started
+            print(f"Imported {count} records from {dataset_path} ({count / max(elapsed, 1e-6):.0f} records/s)...")
+    
+    def _import_batch(self, records: List[Dict[str, Any]]):
+        self.stats["records"] += len(records)
+        flights = [r for r in records if r.get("type") == "flight"]
+        hotels = [r for r in records if r.get("type") == "hotel"]
+        price_points: List[Dict[str, Any]] = []
+        
+        for flight_data, deal_info in zip(flights, DealDetector.detect_flight_deals(flights)):
+            self._add_price_point(
+                price_points, "flight", flight_data.get("flight_number", ""), deal_info["discounted_price"]
+            )
+            if not self._keep_deal(deal_info):
+                continue
+            times = self._flight_times(flight_data)
+            if times is None:
+                self.stats["skipped"] += 1
+                continue
+            row = self._flight_row(flight_data, deal_info, *times)
+            self._flights[(row["airline"], row["flight_number"])] = row
+        
+        for hotel_data, deal_info in zip(hotels, DealDetector.detect_hotel_deals(hotels)):
+            self._add_price_point(
+                price_points, "hotel", hotel_data.get("name", ""), deal_info["discounted_price_per_night"]
+            )
+            if not self._keep_deal(deal_info):
+                continue
+            row = self._hotel_row(hotel_data, deal_info)
+            self._hotels[(row["name"], row["city"])] = row
+        
+        if price_points:
+            with Session(engine) as session:
+                session.execute(insert(PriceHistory), price_points)
+                session.commit()
+            self.stats["price_points"] += len(price_points)
+    
+    def _keep_deal(self, deal_info: Dict[str, Any]) -> bool:
+        if self.min_deal_score is None:
+            return deal_info["is_good_deal"]
+        return deal_info["deal_score"] >= self.min_deal_score
+    
+    def _flight_times(self, flight_data: Dict[str, Any]) -> Optional[Tuple[datetime, datetime]]:
+        """Departure and arrival datetimes, derived from days_left/duration when not given"""
+        departure = _as_datetime(flight_data.get("departure_time"))
+        arrival = _as_datetime(flight_data.get("arrival_time"))
+        if departure is not None and arrival is not None:
+            return departure, arrival
+        if flight_data.get("days_left") is None:
+            return None
+        day = datetime.combine(self.now.date(), datetime.min.time())
+        departure = day + timedelta(
+            days=flight_data["days_left"],
+            hours=_DEPARTURE_HOURS.get(flight_data.get("departure_time"), 0)
+        )
+        return departure, departure + timedelta(hours=flight_data.get("duration") or 0)
+    
+    def _flight_row(
+        self,
+        flight_data: Dict[str, Any],
+        deal_info: Dict[str, Any],
+        departure: datetime,
+        arrival: datetime
+    ) -> Dict[str, Any]:
+        tags = OfferTagger.tag_flight(flight_data)
+        return {
+            "airline": flight_data.get("airline", ""),
+            "flight_number": flight_data.get("flight_number", ""),
+            "origin": flight_data.get("origin", ""),
+            "destination": flight_data.get("destination", ""),
+            "origin_key": location_key(flight_data.get("origin")),
+            "destination_key": location_key(flight_data.get("destination")),
+            "departure_time": departure,
+            "arrival_time": arrival,
+            "original_price": deal_info["original_price"],
+            "discounted_price": deal_info["discounted_price"],
+            "discount_percentage": deal_info["discount_percentage"],
+            "available_seats": flight_data.get("available_seats", 0),
+            "deal_score": deal_info["deal_score"],
+            "tags": ",".join(tags),
+            "is_active": True,
+            "created_at": self.now,
+            "updated_at": self.now,
+            "last_price_update": self.now if deal_info["discounted_price"] else None
+        }
+    
+    def _hotel_row(self, hotel_data: Dict[str, Any], deal_info: Dict[str, Any]) -> Dict[str, Any]:
+        tags = OfferTagger.tag_hotel(hotel_data)
+        return {
+            "name": hotel_data.get("name", ""),
+            "city": hotel_data.get("city", ""),
+            "city_key": location_key(hotel_data.get("city")),
+            "state": hotel_data.get("state"),
+            "country": hotel_data.get("country", ""),
+            "address": hotel_data.get("address", ""),
+            "original_price_per_night": deal_info["original_price_per_night"],
+            "discounted_price_per_night": deal_info["discounted_price_per_night"],
+            "discount_percentage": deal_info["discount_percentage"],
+            "available_rooms": hotel_data.get("available_rooms", 0),
+            "rating": hotel_data.get("rating"),
+            "deal_score": deal_info["deal_score"],
+            "tags": ",".join(tags),
+            "is_active": True,
+            "created_at": self.now,
+            "updated_at": self.now,
+            "last_price_update": self.now if deal_info["discounted_price_per_night"] else None
+        }
+    
+    def _add_price_point(
+        self,
+        price_points: List[Dict[str, Any]],
+        listing_type: str,
+        listing_id: str,
+        price: float
+    ):
+        """Queue a price point row and fold it into the in-memory daily rollup"""
+        if not price:
+            return
+        price_points.append(
+            {"listing_type": listing_type, "listing_id": listing_id, "ts": self.now, "price": price}
+        )
+        rollup = self._rollups.get((listing_type, listing_id))
+        if rollup is None:
+            self._rollups[(listing_type, listing_id)] = [price, 1, price, price]
+        else:
+            rollup[0] += price
+            rollup[1] += 1
+            rollup[2] = min(rollup[2], price)
+            rollup[3] = max(rollup[3], price)
+    
+    def _write_deals(self):
+        """Insert new deal rows and update the ones that already exist"""
+        for model, rows, key_columns, label in (
+            (FlightDeal, self._flights, (FlightDeal.airline, FlightDeal.flight_number), "flights"),
+            (HotelDeal, self._hotels, (HotelDeal.name, HotelDeal.city), "hotels"),
+        ):
+            if not rows:
+                continue
+            with Session(engine) as session:
+                existing = {
+                    (first, second): deal_id
+                    for deal_id, first, second in session.execute(select(model.id, *key_columns))
+                }
+                inserts = []
+                updates = []
+                for key, row in rows.items():
+                    deal_id = existing.get(key)
+                    if deal_id is None:
+                        inserts.append(row)
+                    else:
+                        row = dict(row, id=deal_id)
+                        row.pop("created_at")
+                        updates.append(row)
+                for start in range(0, len(inserts), self.batch_size):
+                    session.execute(insert(model), inserts[start:start + self.batch_size])
+                for start in range(0, len(updates), self.batch_size):
+                    session.execute(update(model), updates[start:start + self.batch_size])
+                session.commit()
+            self.stats[f"{label}_inserted"] += len(inserts)
+            self.stats[f"{label}_updated"] += len(updates)
+    
+    def _write_rollups(self):
+        """Fold the imported price points into today's daily rollups"""
+        if not self._rollups:
+            return
+        day = self.now.date()
+        with Session(engine) as session:
+            existing = {
+                (rollup.listing_type, rollup.listing_id): rollup
+                for rollup in session.execute(
+                    select(PriceDailyRollup).where(PriceDailyRollup.day == day)
+                ).scalars()
+            }
+            inserts = []
+            for (listing_type, listing_id), (price_sum, count, low, high) in self._rollups.items():
+                rollup = existing.get((listing_type, listing_id))
+                if rollup is None:
+                    inserts.append({
+                        "listing_type": listing_type,
+                        "listing_id": listing_id,
+                        "day": day,
+                        "price_sum": price_sum,
+                        "price_count": count,
+                        "min_price": low,
+                        "max_price": high
+                    })
+                else:
+                    rollup.price_sum += price_sum
+                    rollup.price_count += count
+                    rollup.min_price = min(rollup.min_price, low)
+                    rollup.max_price = max(rollup.max_price, high)
+            for start in range(0, len(inserts), self.batch_size):
+                session.execute(insert(PriceDailyRollup), inserts[start:start + self.batch_size])
+            session.commit()
+    
+    def _rebuild_leaderboards(self):
+        """Re-rank every route and city over the imported deals"""
+        if not deal_leaderboards.enabled:
+            return
+        with Session(engine) as session:
+            boards = deal_leaderboards.rebuild(session)
+            session.commit()
+        print(f"Rebuilt {boards} deal leaderboard(s)")
+    
+    def _drop_indexes(self) -> list:
+        """Drop secondary indexes on the import tables; returns them for _create_indexes"""
+        dropped = []
+        for table in _IMPORT_TABLES:
+            # Only those that exist: migrations skip unique indexes the data violates
+            existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    index.drop(engine)
+                    dropped.append(index)
+        return dropped
+    
+    def _create_indexes(self, indexes: list):
+        """Recreate dropped indexes and refresh the planner statistics"""
+        started = time.perf_counter()
+        for index in indexes:
+            index.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            if engine.dialect.name == "sqlite":
+                conn.execute(text("ANALYZE"))
+            elif engine.dialect.name == "mysql":
+                conn.execute(text(f"ANALYZE TABLE {', '.join(t.name for t in _IMPORT_TABLES)}"))
+            else:
+                for table in _IMPORT_TABLES:
+                    conn.execute(text(f"ANALYZE {table.name}"))
+        print(f"Rebuilt {len(indexes)} index(es) in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    """Bulk-import every dataset file found under DATASETS_DIR"""
+    datasets_dir = Path(os.getenv("DATASETS_DIR", "./datasets"))
+    datasets = [
+        (str(datasets_dir / file_name), dataset_type)
+        for file_name, dataset_type, _ in DATASET_FILES
+        if (datasets_dir / file_name).exists()
+    ]
+    if not datasets:
+        print(f"No dataset files found in {datasets_dir}")
+        return
+    BulkImporter().run(datasets)
+
+
+if __name__ == "__main__":
+    main()
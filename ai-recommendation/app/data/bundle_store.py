@@ -0,0 +1,189 @@
+"""Memoized bundle compositions, persisted by a background writer"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from sqlmodel import Session, select
+from app.db.session import engine
+from app.models import Bundle
+from app.models.keys import location_key
+
+
+def composition_key(
+    origin: Optional[str],
+    destination: Optional[str],
+    city: Optional[str],
+    max_price: Optional[float],
+    flight_ids: List[int],
+    hotel_ids: List[int],
+    tags: List[str]
+) -> str:
+    """Canonical key of the search params a bundle was composed for and what it holds"""
+    canonical = json.dumps([
+        location_key(origin),
+        location_key(destination),
+        location_key(city),
+        float(max_price) if max_price else None,
+        list(flight_ids),
+        list(hotel_ids),
+        sorted(tags)
+    ], separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class BundleStore:
+    """Reuse of identical bundle compositions and off-request persistence of new ones
+    
+    Composed bundles are identified by composition_key. A key seen before
+    resolves to its existing row, through an LRU-bounded memo of key -> bundle
+    ID or an indexed lookup on bundles.composition_key. New compositions are
+    handed to a single writer thread that inserts them in its own transaction,
+    so read endpoints never commit; until the write lands the caller serves
+    the unsaved bundle, whose id is None, and repeats of the key are not
+    queued twice.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, async_writes: Optional[bool] = None):
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("BUNDLE_MEMO_SIZE", "10000")
+        )
+        self.async_writes = async_writes if async_writes is not None else (
+            os.getenv("BUNDLE_ASYNC_WRITES", "true").lower() == "true"
+        )
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._pending: Dict[str, Bundle] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def lookup(self, session: Session, key: str) -> Optional[Bundle]:
+        """Existing active bundle for a composition, or the unsaved one still being written"""
+        with self._lock:
+            bundle_id = self._ids.get(key)
+            if bundle_id is not None:
+                self._ids.move_to_end(key)
+            pending = self._pending.get(key)
+        if bundle_id is not None:
+            bundle = session.get(Bundle, bundle_id)
+            if bundle is not None and bundle.is_active:
+                return bundle
+            self._forget(key)
+        elif pending is not None:
+            return pending
+        
+        bundle = session.exec(
+            select(Bundle)
+            .where(Bundle.composition_key == key, Bundle.is_active == True)
+            .order_by(Bundle.id)
+            .limit(1)
+        ).first()
+        if bundle is not None:
+            self._remember(key, bundle.id)
+        return bundle
+    
+    def save(self, bundle: Bundle):
+        """Persist a newly composed bundle, off the calling thread unless async writes are off"""
+        key = bundle.composition_key
+        row = self._snapshot(bundle)
+        if not self.async_writes:
+            bundle.id = self._write(key, row)
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = bundle
+            executor = self._writer()
+        executor.submit(self._write_pending, key, row)
+    
+    def save_now(self, bundle: Bundle) -> int:
+        """Persist a bundle before returning and return its ID, reusing a stored or queued one"""
+        key = bundle.composition_key
+        row = self._snapshot(bundle)
+        if not self.async_writes:
+            return self._write(key, row)
+        # Queued behind any pending write of the composition on the single
+        # writer, so _write finds that row instead of inserting a second one
+        with self._lock:
+            executor = self._writer()
+        return executor.submit(self._write, key, row).result()
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the writer, finishing queued writes if wait is set"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+    
+    def _writer(self) -> ThreadPoolExecutor:
+        """The writer thread's executor, started on first use; call with the lock held"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bundle-writer")
+        return self._executor
+    
+    def _write_pending(self, key: str, row: Dict[str, Any]):
+        try:
+            self._write(key, row)
+        except Exception as e:
+            print(f"Error persisting bundle {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+    
+    def _write(self, key: str, row: Dict[str, Any]) -> int:
+        """Insert the bundle unless its composition was stored meanwhile; returns its ID"""
+        with Session(engine) as session:
+            bundle_id = session.exec(
+                select(Bundle.id)
+                .where(Bundle.composition_key == key, Bundle.is_active == True)
+                .order_by(Bundle.id)
+                .limit(1)
+            ).first()
+            if bundle_id is None:
+                bundle = Bundle(**row["fields"], composition_key=key)
+                bundle.set_contents(**row["contents"])
+                session.add(bundle)
+                session.commit()
+                bundle_id = bundle.id
+        self._remember(key, bundle_id)
+        return bundle_id
+    
+    @staticmethod
+    def _snapshot(bundle: Bundle) -> Dict[str, Any]:
+        """Plain copy of a bundle's contents, so the writer never touches the caller's object"""
+        return {
+            "fields": {
+                "name": bundle.name,
+                "description": bundle.description,
+                "total_price": bundle.total_price,
+                "savings": bundle.savings
+            },
+            "contents": {
+                "flight_ids": bundle.deal_ids("flight"),
+                "hotel_ids": bundle.deal_ids("hotel"),
+                "car_ids": bundle.deal_ids("car"),
+                "tags": bundle.tag_list
+            }
+        }
+    
+    def _remember(self, key: str, bundle_id: int):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._ids[key] = bundle_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+    
+    def _forget(self, key: str):
+        with self._lock:
+            self._ids.pop(key, None)
+
+
+# Global bundle store instance
+bundle_store = BundleStore()
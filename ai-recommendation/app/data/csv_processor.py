@@ -1,10 +1,126 @@
 """CSV processor for Kaggle datasets"""
 import csv
+import io
 import pandas as pd
-from typing import Dict, Any, List, Iterator
-from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional, Tuple
 import os
 
+# Bump whenever normalized output changes, so cached datasets are rebuilt
+NORMALIZER_VERSION = 1
+
+# Rows per chunk when streaming a dataset; memory use scales with this, not the file size
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "50000"))
+
+# Bytes read at a time while scanning a file for shard boundaries
+SHARD_SCAN_BLOCK_BYTES = 1024 * 1024
+
+# Columns read from each dataset and their dtypes. Free-form fields (Airbnb
+# prices such as "$1,200.00", flight stops such as "one") are read as text
+# and parsed during normalization.
+AIRBNB_COLUMNS = {
+    "id": str,
+    "name": str,
+    "neighbourhood_group_cleansed": str,
+    "street": str,
+    "price": str,
+    "availability_365": "float64",
+    "review_scores_rating": "float64",
+    "amenities": str,
+    "latitude": "float64",
+    "longitude": "float64",
+    "room_type": str,
+    "minimum_nights": "float64",
+}
+
+HOTEL_BOOKING_COLUMNS = {
+    "hotel": str,
+    "country": str,
+    "adr": "float64",
+    "availability": "float64",
+    "arrival_date": str,
+    "adults": "float64",
+    "children": "float64",
+    "is_canceled": "float64",
+}
+
+FLIGHT_PRICE_COLUMNS = {
+    "airline": str,
+    "flight": str,
+    "source_city": str,
+    "destination_city": str,
+    "dep_time": str,
+    "arrival_time": str,
+    "price": "float64",
+    "stops": str,
+    "class": str,
+    "duration": "float64",
+    "days_left": "float64",
+}
+
+_STOPS = {"zero": 0, "one": 1, "two_or_more": 2}
+
+# Expected dataset files under DATASETS_DIR: (file name, dataset type, label)
+DATASET_FILES = [
+    ("airbnb_nyc.csv", "airbnb", "Inside Airbnb"),
+    ("hotel_booking.csv", "hotel_booking", "Hotel Booking"),
+    ("flight_prices.csv", "flight_price", "Flight Price"),
+]
+
+
+def _text(df: pd.DataFrame, column: str, default: str = "") -> pd.Series:
+    """String column with missing values (or a missing column) set to default"""
+    if column not in df:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].fillna(default).astype(str)
+
+
+def _number(df: pd.DataFrame, column: str, default: float = 0) -> pd.Series:
+    """Float column with unparseable or missing values set to default"""
+    if column not in df:
+        return pd.Series(float(default), index=df.index)
+    values = df[column]
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        values = pd.to_numeric(
+            values.str.replace(r"[$,]", "", regex=True), errors="coerce"
+        )
+    return values.fillna(default).astype("float64")
+
+
+def _integer(df: pd.DataFrame, column: str, default: int = 0) -> pd.Series:
+    return _number(df, column, default).astype("int64")
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of `length` bytes of an open file from its current position"""
+    
+    def __init__(self, f, length: int):
+        self._file = f
+        self._remaining = length
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def records_from_columns(columns: Dict[str, Any], length: int) -> List[Dict[str, Any]]:
+    """Assemble row dicts from Series or list columns; scalars are repeated on every row"""
+    keys = list(columns)
+    values = [
+        column.tolist() if isinstance(column, pd.Series)
+        else column if isinstance(column, list)
+        else [column] * length
+        for column in columns.values()
+    ]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
 
 class CSVProcessor:
     """Processes CSV files from Kaggle datasets"""
@@ -18,83 +134,267 @@ class CSVProcessor:
             print(f"Error reading CSV file {file_path}: {e}")
             raise
     
+    @staticmethod
+    def read_csv_chunks(
+        file_path: str,
+        columns: Dict[str, Any],
+        chunksize: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream a CSV file in chunks, reading only the given columns with their dtypes"""
+        try:
+            reader = pd.read_csv(
+                file_path,
+                usecols=lambda name: name in columns,
+                dtype=columns,
+                chunksize=chunksize or CSV_CHUNK_SIZE
+            )
+            with reader:
+                yield from reader
+        except Exception as e:
+            print(f"Error reading CSV file {file_path}: {e}")
+            raise
+    
+    @staticmethod
+    def csv_byte_ranges(file_path: str, shard_bytes: int) -> List[Tuple[int, int]]:
+        """Split a CSV file's rows into (start, end) byte ranges of about shard_bytes
+        
+        Ranges start after the header and end on line breaks outside quoted
+        fields, so a field spanning several lines stays whole. Finding them
+        takes one pass over the file counting quotes: an escaped "" flips the
+        quoted state twice and leaves it unchanged.
+        """
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            f.readline()
+            boundaries = [f.tell()]
+            position = f.tell()
+            quoted = False
+            while True:
+                block = f.read(SHARD_SCAN_BLOCK_BYTES)
+                if not block:
+                    break
+                index = 0
+                while True:
+                    # Quotes before the next shard's earliest start only flip the state
+                    target = max(index, min(boundaries[-1] + shard_bytes - position, len(block)))
+                    quoted ^= block.count(b'"', index, target) % 2 == 1
+                    index = target
+                    newline = block.find(b"\n", index)
+                    if newline < 0:
+                        quoted ^= block.count(b'"', index) % 2 == 1
+                        break
+                    quoted ^= block.count(b'"', index, newline) % 2 == 1
+                    index = newline + 1
+                    if not quoted and position + index < size:
+                        boundaries.append(position + index)
+                position += len(block)
+        if boundaries[0] >= size:
+            return []
+        boundaries.append(size)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+    
+    @staticmethod
+    def read_csv_range(
+        file_path: str,
+        columns: Dict[str, Any],
+        start: int,
+        end: int,
+        chunksize: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the rows in one byte range of a CSV file, as read_csv_chunks does"""
+        try:
+            with open(file_path, "rb") as f:
+                header = next(csv.reader([f.readline().decode("utf-8-sig")]))
+                f.seek(start)
+                reader = pd.read_csv(
+                    io.BufferedReader(_ByteRange(f, end - start)),
+                    names=header,
+                    header=None,
+                    usecols=lambda name: name in columns,
+                    dtype=columns,
+                    chunksize=chunksize or CSV_CHUNK_SIZE
+                )
+                with reader:
+                    yield from reader
+        except Exception as e:
+            print(f"Error reading CSV file {file_path} bytes {start}-{end}: {e}")
+            raise
+    
+    @staticmethod
+    def normalize_airbnb_columns(df: pd.DataFrame) -> Dict[str, Any]:
+        """Normalized columns for a chunk of the Inside Airbnb dataset"""
+        price = _number(df, "price")
+        return {
+            "type": "hotel",
+            "name": _text(df, "name"),
+            "city": _text(df, "neighbourhood_group_cleansed", "NYC"),
+            "state": "NY",
+            "country": "USA",
+            "address": _text(df, "street"),
+            "price_per_night": price,
+            "original_price": price,
+            "available_rooms": (_number(df, "availability_365") > 0).astype("int64"),
+            "rating": _number(df, "review_scores_rating"),
+            "amenities": _text(df, "amenities"),
+            "latitude": _number(df, "latitude"),
+            "longitude": _number(df, "longitude"),
+            "listing_id": _text(df, "id"),
+            "room_type": _text(df, "room_type"),
+            "minimum_nights": _integer(df, "minimum_nights", 1),
+            "source": "inside_airbnb"
+        }
+    
+    @staticmethod
+    def normalize_hotel_booking_columns(df: pd.DataFrame) -> Dict[str, Any]:
+        """Normalized columns for a chunk of the Hotel Booking Demand dataset"""
+        hotel = _text(df, "hotel")
+        adr = _number(df, "adr")
+        arrival_date = _text(df, "arrival_date")
+        return {
+            "type": "hotel",
+            "name": "Hotel_" + _text(df, "hotel", "Unknown"),
+            "city": hotel,
+            "country": _text(df, "country"),
+            "price_per_night": adr,
+            "original_price": adr,
+            "available_rooms": _integer(df, "availability"),
+            "check_in": arrival_date,
+            "check_out": arrival_date,  # Simplified
+            "adults": _integer(df, "adults", 1),
+            "children": _integer(df, "children"),
+            "is_canceled": _number(df, "is_canceled").astype(bool),
+            "source": "hotel_booking_demand"
+        }
+    
+    @staticmethod
+    def normalize_flight_price_columns(df: pd.DataFrame) -> Dict[str, Any]:
+        """Normalized columns for a chunk of the Flight Price Prediction dataset"""
+        price = _number(df, "price")
+        stops = _text(df, "stops")
+        return {
+            "type": "flight",
+            "airline": _text(df, "airline", "Unknown"),
+            "flight_number": _text(df, "flight"),
+            "origin": _text(df, "source_city"),
+            "destination": _text(df, "destination_city"),
+            "departure_time": _text(df, "dep_time"),
+            "arrival_time": _text(df, "arrival_time"),
+            "price": price,
+            "original_price": price,
+            # The Kaggle dataset spells stops out ("zero", "one", "two_or_more")
+            "stops": stops.map(_STOPS).fillna(
+                pd.to_numeric(stops, errors="coerce")
+            ).fillna(0).astype("int64"),
+            "class": _text(df, "class", "Economy"),
+            "duration": _number(df, "duration"),
+            "days_left": _integer(df, "days_left"),
+            "available_seats": 10,  # Default
+            "source": "flight_price_prediction"
+        }
+    
+    @staticmethod
+    def normalize_airbnb_chunk(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Normalize a chunk of the Inside Airbnb dataset"""
+        return records_from_columns(CSVProcessor.normalize_airbnb_columns(df), len(df))
+    
+    @staticmethod
+    def normalize_hotel_booking_chunk(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Normalize a chunk of the Hotel Booking Demand dataset"""
+        return records_from_columns(CSVProcessor.normalize_hotel_booking_columns(df), len(df))
+    
+    @staticmethod
+    def normalize_flight_price_chunk(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Normalize a chunk of the Flight Price Prediction dataset"""
+        return records_from_columns(CSVProcessor.normalize_flight_price_columns(df), len(df))
+    
     @staticmethod
     def normalize_airbnb_data(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
         """Normalize Inside Airbnb dataset data"""
-        for _, row in df.iterrows():
-            yield {
-                "type": "hotel",
-                "name": row.get("name", ""),
-                "city": row.get("neighbourhood_group_cleansed", "NYC"),
-                "state": "NY",
-                "country": "USA",
-                "address": row.get("street", ""),
-                "price_per_night": float(row.get("price", 0)) if pd.notna(row.get("price")) else 0,
-                "original_price": float(row.get("price", 0)) if pd.notna(row.get("price")) else 0,
-                "available_rooms": 1 if row.get("availability_365", 0) > 0 else 0,
-                "rating": float(row.get("review_scores_rating", 0)) if pd.notna(row.get("review_scores_rating")) else 0,
-                "amenities": str(row.get("amenities", "")),
-                "latitude": float(row.get("latitude", 0)) if pd.notna(row.get("latitude")) else 0,
-                "longitude": float(row.get("longitude", 0)) if pd.notna(row.get("longitude")) else 0,
-                "listing_id": str(row.get("id", "")),
-                "room_type": str(row.get("room_type", "")),
-                "minimum_nights": int(row.get("minimum_nights", 1)) if pd.notna(row.get("minimum_nights")) else 1,
-                "source": "inside_airbnb"
-            }
+        yield from CSVProcessor.normalize_airbnb_chunk(df)
     
     @staticmethod
     def normalize_hotel_booking_data(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
         """Normalize Hotel Booking Demand dataset"""
-        for _, row in df.iterrows():
-            yield {
-                "type": "hotel",
-                "name": f"Hotel_{row.get('hotel', 'Unknown')}",
-                "city": str(row.get("hotel", "")),
-                "country": str(row.get("country", "")),
-                "price_per_night": float(row.get("adr", 0)) if pd.notna(row.get("adr")) else 0,
-                "original_price": float(row.get("adr", 0)) if pd.notna(row.get("adr")) else 0,
-                "available_rooms": int(row.get("availability", 0)) if pd.notna(row.get("availability")) else 0,
-                "check_in": str(row.get("arrival_date", "")),
-                "check_out": str(row.get("arrival_date", "")),  # Simplified
-                "adults": int(row.get("adults", 1)) if pd.notna(row.get("adults")) else 1,
-                "children": int(row.get("children", 0)) if pd.notna(row.get("children")) else 0,
-                "is_canceled": bool(row.get("is_canceled", False)),
-                "source": "hotel_booking_demand"
-            }
+        yield from CSVProcessor.normalize_hotel_booking_chunk(df)
     
     @staticmethod
     def normalize_flight_price_data(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
         """Normalize Flight Price Prediction dataset"""
-        for _, row in df.iterrows():
-            yield {
-                "type": "flight",
-                "airline": str(row.get("airline", "Unknown")),
-                "flight_number": str(row.get("flight", "")),
-                "origin": str(row.get("source_city", "")),
-                "destination": str(row.get("destination_city", "")),
-                "departure_time": str(row.get("dep_time", "")),
-                "arrival_time": str(row.get("arrival_time", "")),
-                "price": float(row.get("price", 0)) if pd.notna(row.get("price")) else 0,
-                "original_price": float(row.get("price", 0)) if pd.notna(row.get("price")) else 0,
-                "stops": int(row.get("stops", 0)) if pd.notna(row.get("stops")) else 0,
-                "class": str(row.get("class", "Economy")),
-                "duration": float(row.get("duration", 0)) if pd.notna(row.get("duration")) else 0,
-                "days_left": int(row.get("days_left", 0)) if pd.notna(row.get("days_left")) else 0,
-                "available_seats": 10,  # Default
-                "source": "flight_price_prediction"
-            }
-    
-    @staticmethod
-    def process_dataset(file_path: str, dataset_type: str) -> Iterator[Dict[str, Any]]:
-        """Process a dataset file and return normalized records"""
-        df = CSVProcessor.read_csv_file(file_path)
-        
-        if dataset_type == "airbnb":
-            return CSVProcessor.normalize_airbnb_data(df)
-        elif dataset_type == "hotel_booking":
-            return CSVProcessor.normalize_hotel_booking_data(df)
-        elif dataset_type == "flight_price":
-            return CSVProcessor.normalize_flight_price_data(df)
-        else:
+        yield from CSVProcessor.normalize_flight_price_chunk(df)
+    
+    @staticmethod
+    def dataset_spec(dataset_type: str):
+        """Columns to read and column normalizer for a dataset type"""
+        specs = {
+            "airbnb": (AIRBNB_COLUMNS, CSVProcessor.normalize_airbnb_columns),
+            "hotel_booking": (HOTEL_BOOKING_COLUMNS, CSVProcessor.normalize_hotel_booking_columns),
+            "flight_price": (FLIGHT_PRICE_COLUMNS, CSVProcessor.normalize_flight_price_columns),
+        }
+        if dataset_type not in specs:
             raise ValueError(f"Unknown dataset type: {dataset_type}")
-
+        return specs[dataset_type]
+    
+    @staticmethod
+    def process_dataset_columns(
+        file_path: str,
+        dataset_type: str,
+        chunksize: Optional[int] = None
+    ) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Stream a dataset file as (normalized columns, row count) per chunk"""
+        columns, normalize = CSVProcessor.dataset_spec(dataset_type)
+        for chunk in CSVProcessor.read_csv_chunks(file_path, columns, chunksize):
+            yield normalize(chunk), len(chunk)
+    
+    @staticmethod
+    def process_dataset_batches(
+        file_path: str,
+        dataset_type: str,
+        chunksize: Optional[int] = None,
+        use_cache: Optional[bool] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Stream a dataset file as batches of normalized records, one per chunk
+        
+        With the normalized-dataset cache enabled (DATASET_CACHE_DIR), an
+        unchanged file is read from its cached columns instead of re-parsed.
+        """
+        CSVProcessor.dataset_spec(dataset_type)
+        from app.data.dataset_cache import dataset_cache
+        if use_cache is None:
+            use_cache = dataset_cache.enabled
+        if use_cache:
+            return dataset_cache.dataset_batches(file_path, dataset_type, chunksize)
+        return (
+            records_from_columns(columns, length)
+            for columns, length in CSVProcessor.process_dataset_columns(
+                file_path, dataset_type, chunksize
+            )
+        )
+    
+    @staticmethod
+    def process_dataset_range(
+        file_path: str,
+        dataset_type: str,
+        start: int,
+        end: int,
+        chunksize: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Stream one byte range of a dataset file as batches of normalized records"""
+        columns, normalize = CSVProcessor.dataset_spec(dataset_type)
+        for chunk in CSVProcessor.read_csv_range(file_path, columns, start, end, chunksize):
+            yield records_from_columns(normalize(chunk), len(chunk))
+    
+    @staticmethod
+    def process_dataset(
+        file_path: str,
+        dataset_type: str,
+        chunksize: Optional[int] = None,
+        use_cache: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Process a dataset file and return normalized records"""
+        return (
+            record
+            for batch in CSVProcessor.process_dataset_batches(
+                file_path, dataset_type, chunksize, use_cache
+            )
+            for record in batch
+        )
@@ -0,0 +1,267 @@
+"""Columnar on-disk cache of normalized datasets"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.data.csv_processor import (
+    CSV_CHUNK_SIZE,
+    NORMALIZER_VERSION,
+    CSVProcessor,
+    records_from_columns,
+)
+
+
+def file_digest(file_path: str) -> str:
+    """Content hash of a file, read in 1 MiB blocks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _ColumnWriter:
+    """Appends chunks of one column to raw files, then writes them out as .npy"""
+    
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.kind = None
+        self.dtype = None
+        self.length = 0
+        self.text_bytes = 0
+        self._values = None
+        self._offsets = None
+    
+    def append(self, values: pd.Series):
+        if self.kind is None:
+            numeric = pd.api.types.is_numeric_dtype(values.dtype)
+            self.kind = "number" if numeric else "text"
+            self._values = open(self._raw_path("values"), "wb")
+            if self.kind == "text":
+                self._offsets = open(self._raw_path("offsets"), "wb")
+                self._offsets.write(np.zeros(1, dtype=np.int64).tobytes())
+            else:
+                self.dtype = np.dtype(values.dtype)
+        
+        if self.kind == "text":
+            encoded = [value.encode("utf-8") for value in values.tolist()]
+            lengths = np.fromiter((len(value) for value in encoded), np.int64, len(encoded))
+            self._offsets.write((np.cumsum(lengths) + self.text_bytes).tobytes())
+            self._values.write(b"".join(encoded))
+            self.text_bytes += int(lengths.sum())
+        else:
+            self._values.write(values.to_numpy(dtype=self.dtype).tobytes())
+        self.length += len(values)
+    
+    def finish(self) -> Dict[str, Any]:
+        """Write the .npy files and return the column's metadata"""
+        if self.kind == "text":
+            self._write_npy("values", np.dtype(np.uint8), self.text_bytes)
+            self._write_npy("offsets", np.dtype(np.int64), self.length + 1)
+        else:
+            self._write_npy("values", self.dtype, self.length)
+        return {"kind": self.kind}
+    
+    def close(self):
+        for f in (self._values, self._offsets):
+            if f is not None and not f.closed:
+                f.close()
+    
+    def _raw_path(self, part: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{part}.raw")
+    
+    def _write_npy(self, part: str, dtype: np.dtype, length: int):
+        raw = self._values if part == "values" else self._offsets
+        raw.close()
+        with open(os.path.join(self.directory, f"{self.name}.{part}.npy"), "wb") as out:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (length,)
+            })
+            with open(raw.name, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+        os.remove(raw.name)
+
+
+class CachedDataset:
+    """Memory-mapped columns of one normalized dataset"""
+    
+    def __init__(self, directory: str, meta: Dict[str, Any]):
+        self.directory = directory
+        self.length = meta["length"]
+        self.keys: List[str] = meta["keys"]
+        self.constants: Dict[str, Any] = meta["constants"]
+        self.columns: Dict[str, Any] = {}
+        for name, column in meta["columns"].items():
+            values = self._load(name, "values")
+            if column["kind"] == "text":
+                self.columns[name] = (values, self._load(name, "offsets"))
+            else:
+                self.columns[name] = values
+    
+    def _load(self, name: str, part: str) -> np.ndarray:
+        path = os.path.join(self.directory, f"{name}.{part}.npy")
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            # Empty arrays cannot be memory-mapped
+            return np.load(path)
+    
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Python values of rows [start, stop) of one column"""
+        stop = self.length if stop is None else min(stop, self.length)
+        column = self.columns[name]
+        if not isinstance(column, tuple):
+            return column[start:stop].tolist()
+        values, offsets = column
+        bounds = offsets[start:stop + 1].tolist()
+        blob = values[bounds[0]:bounds[-1]].tobytes()
+        base = bounds[0]
+        return [
+            blob[begin - base:end - base].decode("utf-8")
+            for begin, end in zip(bounds, bounds[1:])
+        ]
+    
+    def batches(self, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the dataset as batches of normalized records"""
+        batch_size = batch_size or CSV_CHUNK_SIZE
+        for start in range(0, self.length, batch_size):
+            stop = min(start + batch_size, self.length)
+            columns = {
+                key: self.constants[key] if key in self.constants else self.column(key, start, stop)
+                for key in self.keys
+            }
+            yield records_from_columns(columns, stop - start)
+
+
+class DatasetCache:
+    """Normalized datasets stored as one .npy file per column
+    
+    Entries are keyed by dataset type, the source file's content hash and
+    NORMALIZER_VERSION, so editing the CSV or changing the normalizers both
+    miss the cache. Text columns are stored as a UTF-8 byte array plus an
+    offsets array, so every column can be memory-mapped. File hashes are
+    remembered per (path, size, mtime) to avoid re-reading unchanged files.
+    """
+    
+    def __init__(self, root: Optional[str] = None):
+        self.root = root if root is not None else os.getenv("DATASET_CACHE_DIR", "")
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+    
+    def entry_dir(self, file_path: str, dataset_type: str) -> str:
+        digest = self._source_digest(file_path)
+        return os.path.join(self.root, f"{dataset_type}-{digest}-v{NORMALIZER_VERSION}")
+    
+    def load(self, file_path: str, dataset_type: str) -> Optional[CachedDataset]:
+        """Cached columns for a dataset file, or None on a miss"""
+        directory = self.entry_dir(file_path, dataset_type)
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return CachedDataset(directory, json.load(f))
+    
+    def dataset_batches(
+        self,
+        file_path: str,
+        dataset_type: str,
+        chunksize: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Batches from the cache, or from the CSV while writing the cache entry"""
+        cached = self.load(file_path, dataset_type)
+        if cached is not None:
+            yield from cached.batches(chunksize)
+            return
+        
+        directory = self.entry_dir(file_path, dataset_type)
+        tmp_dir = f"{directory}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        writers: Dict[str, _ColumnWriter] = {}
+        meta = {
+            "source": os.path.abspath(file_path),
+            "dataset_type": dataset_type,
+            "normalizer_version": NORMALIZER_VERSION,
+            "length": 0,
+            "keys": [],
+            "constants": {},
+            "columns": {}
+        }
+        complete = False
+        try:
+            for columns, length in CSVProcessor.process_dataset_columns(
+                file_path, dataset_type, chunksize
+            ):
+                if not meta["keys"]:
+                    meta["keys"] = list(columns)
+                for key, values in columns.items():
+                    if isinstance(values, pd.Series):
+                        writers.setdefault(key, _ColumnWriter(tmp_dir, key)).append(values)
+                    else:
+                        meta["constants"][key] = values
+                meta["length"] += length
+                yield records_from_columns(columns, length)
+            
+            meta["columns"] = {key: writer.finish() for key, writer in writers.items()}
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            self._replace_entry(tmp_dir, directory, meta["source"], dataset_type)
+            complete = True
+        finally:
+            for writer in writers.values():
+                writer.close()
+            if not complete:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    def _replace_entry(self, tmp_dir: str, directory: str, source: str, dataset_type: str):
+        """Publish a finished entry and drop older entries for the same source file"""
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if path == directory or not name.startswith(f"{dataset_type}-") or ".tmp-" in name:
+                continue
+            try:
+                with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                    stale = json.load(f).get("source") == source
+            except (OSError, ValueError):
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+    
+    def _source_digest(self, file_path: str) -> str:
+        """Content hash of a source file, reusing the last one while size and mtime match"""
+        os.makedirs(self.root, exist_ok=True)
+        index_path = os.path.join(self.root, "sources.json")
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        
+        stat = os.stat(file_path)
+        source = os.path.abspath(file_path)
+        known = index.get(source)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["digest"]
+        
+        digest = file_digest(file_path)
+        index[source] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        tmp_path = f"{index_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        return digest
+
+
+# Global cache instance
+dataset_cache = DatasetCache()
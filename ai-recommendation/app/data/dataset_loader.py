@@ -1,67 +1,299 @@
 """Dataset loader - loads Kaggle datasets and publishes to Kafka"""
 import asyncio
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from app.data.csv_processor import CSVProcessor
-from app.kafka.producer import KafkaProducerClient
-from typing import Dict, Any
-import json
+from app.data.csv_processor import DATASET_FILES, CSVProcessor
+from app.data.load_checkpoint import LoadCheckpoint
+from app.deals_agent.deal_detector import DealDetector
+from app.kafka.codecs import PassthroughCodec, codec_headers, get_feed_codec
+from app.kafka.producer import create_async_producer
+from app.models.keys import feed_listing_key
+from typing import Dict, Any, Iterator, List, Tuple
 
 
 class DatasetLoader:
-    """Loads Kaggle datasets and publishes normalized data to Kafka"""
+    """Loads Kaggle datasets and publishes normalized data to Kafka
     
-    def __init__(self):
+    Records are sent through the aiokafka producer without awaiting each
+    delivery. Up to max_in_flight sends may be outstanding at once, so the
+    producer can fill whole batches while earlier ones are acknowledged.
+    
+    Progress is checkpointed after every acknowledged batch (see
+    LoadCheckpoint); with resume enabled, a file is loaded from its last
+    checkpoint and fully loaded files are skipped.
+    """
+    
+    def __init__(
+        self,
+        score_records: bool = None,
+        codec=None,
+        max_in_flight: int = None,
+        resume: bool = None
+    ):
         self.producer = None
+        # JSON by default; KAFKA_FEED_ENCODING=binary publishes compact feed records
+        self.codec = codec or get_feed_codec()
+        self.headers = codec_headers(self.codec)
         self.kafka_topic = os.getenv("KAFKA_TOPIC_RAW_FEEDS", "raw_supplier_feeds")
+        # Optionally pre-score records with the vectorized DealDetector before publishing
+        self.score_records = score_records if score_records is not None else (
+            os.getenv("DATASET_SCORE_RECORDS", "false").lower() == "true"
+        )
+        self.max_in_flight = max_in_flight or int(os.getenv("DATASET_MAX_IN_FLIGHT", "10000"))
+        self.resume = resume if resume is not None else (
+            os.getenv("DATASET_RESUME", "false").lower() == "true"
+        )
+        self._in_flight = None
+        self._started = 0.0
+        self.sent = 0
+        self.delivered = 0
+        self.failed = 0
     
     async def load_and_publish_dataset(
         self,
         dataset_path: str,
         dataset_type: str,
-        batch_size: int = 100
+        batch_size: int = None
     ):
         """Load dataset and publish to Kafka"""
-        if not self.producer:
-            self.producer = KafkaProducerClient()
-            await self.producer.start()
+        batch_size = batch_size or int(os.getenv("DATASET_BATCH_SIZE", "1000"))
+        checkpoint = self._open_checkpoint(dataset_path, dataset_type)
+        if checkpoint.completed:
+            return
+        offset, skip = checkpoint.position
+        await self._start_publishing()
         
         try:
-            records = CSVProcessor.process_dataset(dataset_path, dataset_type)
-            batch = []
-            
-            for record in records:
-                batch.append(record)
-                
-                if len(batch) >= batch_size:
-                    await self._publish_batch(batch)
-                    batch = []
-                    print(f"Published batch of {batch_size} records...")
-            
-            # Publish remaining records
-            if batch:
-                await self._publish_batch(batch)
-            
-            print(f"Finished publishing dataset: {dataset_path}")
-        
+            row = skip
+            for records in self._dataset_batches(dataset_path, dataset_type, offset):
+                if skip >= len(records):
+                    skip -= len(records)
+                    continue
+                records, skip = records[skip:], 0
+                for i in range(0, len(records), batch_size):
+                    batch = records[i:i + batch_size]
+                    row += len(batch)
+                    await self._publish_batch(batch, checkpoint, offset, row)
+                self._report_progress()
+            await self._finish_publishing(dataset_path, [checkpoint])
         except Exception as e:
             print(f"Error loading dataset: {e}")
             raise
         finally:
-            if self.producer:
-                await self.producer.close()
+            await self._stop_publishing()
     
-    async def _publish_batch(self, batch: list[Dict[str, Any]]):
-        """Publish a batch of records to Kafka"""
-        for record in batch:
-            try:
-                await self.producer.send(
-                    topic=self.kafka_topic,
-                    key=record.get("listing_id") or record.get("flight_number") or "unknown",
-                    value=json.dumps(record)
+    async def load_datasets_parallel(
+        self,
+        datasets: List[Tuple[str, str]],
+        workers: int = None,
+        shard_bytes: int = None,
+        batch_size: int = None
+    ):
+        """Load (path, dataset_type) files in a process pool and publish them from here
+        
+        Files are split into byte-range shards of about shard_bytes. Worker
+        processes parse, normalize, score and encode one shard each and send
+        back (key, value bytes) pairs; this process only publishes them, in
+        file order, with at most two shards per worker queued up at a time.
+        Checkpoints name the shard's start offset, so a resumed file is
+        re-split from there.
+        """
+        workers = workers or int(os.getenv("DATASET_LOAD_WORKERS", "0")) or os.cpu_count() or 1
+        shard_bytes = shard_bytes or int(os.getenv("DATASET_SHARD_BYTES", str(64 * 1024 * 1024)))
+        batch_size = batch_size or int(os.getenv("DATASET_BATCH_SIZE", "1000"))
+        checkpoints = {}
+        skips = {}
+        shards = []
+        for dataset_path, dataset_type in datasets:
+            checkpoint = self._open_checkpoint(dataset_path, dataset_type)
+            if checkpoint.completed:
+                continue
+            offset, skips[dataset_path] = checkpoint.position
+            checkpoints[dataset_path] = checkpoint
+            shards.extend(
+                (dataset_path, dataset_type, max(start, offset), end)
+                for start, end in CSVProcessor.csv_byte_ranges(dataset_path, shard_bytes)
+                if end > offset
+            )
+        print(f"Loading {len(checkpoints)} dataset(s) as {len(shards)} shard(s) with {workers} worker(s)...")
+        
+        await self._start_publishing()
+        loop = asyncio.get_running_loop()
+        pending = deque()
+        
+        async def publish_next():
+            (dataset_path, _, start, end), future = pending.popleft()
+            items = await future
+            # Rows a checkpoint already covers may run past the first resumed shard
+            skip = min(skips[dataset_path], len(items))
+            skips[dataset_path] -= skip
+            await self._publish_encoded(
+                items, checkpoints[dataset_path], start, end, skip, batch_size
+            )
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for shard in shards:
+                    pending.append((shard, loop.run_in_executor(
+                        pool, _encode_shard, *shard, self.codec, self.score_records
+                    )))
+                    if len(pending) >= workers * 2:
+                        await publish_next()
+                while pending:
+                    await publish_next()
+            await self._finish_publishing(
+                ", ".join(path for path, _ in datasets), list(checkpoints.values())
+            )
+        except Exception as e:
+            for _, future in pending:
+                future.cancel()
+            print(f"Error loading datasets: {e}")
+            raise
+        finally:
+            await self._stop_publishing()
+    
+    def _open_checkpoint(self, dataset_path: str, dataset_type: str) -> LoadCheckpoint:
+        checkpoint = LoadCheckpoint(dataset_path, dataset_type, resume=self.resume)
+        if checkpoint.completed:
+            print(f"Skipping dataset: {dataset_path} (already loaded)")
+        elif checkpoint.position != (0, 0):
+            offset, row = checkpoint.position
+            print(
+                f"Resuming dataset: {dataset_path} after batch {checkpoint.batch} "
+                f"(byte offset {offset}, row {row})"
+            )
+        return checkpoint
+    
+    @staticmethod
+    def _dataset_batches(
+        dataset_path: str,
+        dataset_type: str,
+        offset: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Normalized batches of a dataset file, starting at a checkpointed byte offset"""
+        if not offset:
+            return CSVProcessor.process_dataset_batches(dataset_path, dataset_type)
+        return CSVProcessor.process_dataset_range(
+            dataset_path, dataset_type, offset, os.path.getsize(dataset_path)
+        )
+    
+    async def _start_publishing(self):
+        if not self.producer:
+            # Values are encoded before they reach the producer (here or in a worker)
+            self.producer = create_async_producer(PassthroughCodec())
+            await self.producer.start()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.sent = self.delivered = self.failed = 0
+        self._started = time.perf_counter()
+    
+    def _report_progress(self):
+        elapsed = time.perf_counter() - self._started
+        print(f"Published {self.sent} records ({self.sent / max(elapsed, 1e-6):.0f} records/s)...")
+    
+    async def _finish_publishing(self, source: str, checkpoints: List[LoadCheckpoint]):
+        # Wait for outstanding deliveries before reporting
+        await self.producer.flush()
+        # Let the delivery callbacks of the last acknowledgements run
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - self._started
+        print(
+            f"Finished publishing dataset: {source} "
+            f"({self.delivered} delivered, {self.failed} failed, "
+            f"{self.delivered / max(elapsed, 1e-6):.0f} records/s)"
+        )
+        for checkpoint in checkpoints:
+            if not checkpoint.finish():
+                print(
+                    f"Checkpoint for {checkpoint.source} kept after batch {checkpoint.batch}; "
+                    f"rerun with DATASET_RESUME=true to retry the rest"
                 )
-            except Exception as e:
-                print(f"Error publishing record: {e}")
+    
+    async def _stop_publishing(self):
+        if self.producer:
+            await self.producer.stop()
+            self.producer = None
+    
+    @staticmethod
+    def _score_batch(batch: list[Dict[str, Any]]):
+        """Attach deal scores to a batch of records in place"""
+        for listing_type, detect in (
+            ("flight", DealDetector.detect_flight_deals),
+            ("hotel", DealDetector.detect_hotel_deals),
+        ):
+            records = [r for r in batch if r.get("type") == listing_type]
+            for record, deal_info in zip(records, detect(records)):
+                record["discount_percentage"] = deal_info["discount_percentage"]
+                record["deal_score"] = deal_info["deal_score"]
+                record["is_good_deal"] = deal_info["is_good_deal"]
+    
+    async def _publish_batch(
+        self,
+        batch: list[Dict[str, Any]],
+        checkpoint: LoadCheckpoint,
+        offset: int,
+        row: int
+    ):
+        """Queue a batch of records for publishing, waiting only while the in-flight limit is reached"""
+        if self.score_records:
+            self._score_batch(batch)
+        
+        encode = self.codec.encode
+        seq = checkpoint.begin_batch(len(batch), offset, row)
+        for record in batch:
+            await self._send(self._record_key(record), encode(record), checkpoint, seq)
+    
+    async def _publish_encoded(
+        self,
+        items: List[Tuple[str, bytes]],
+        checkpoint: LoadCheckpoint,
+        start: int,
+        end: int,
+        skip: int,
+        batch_size: int
+    ):
+        """Queue records of one shard, encoded by a worker process, for publishing"""
+        for i in range(skip, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            done = i + len(batch)
+            offset, row = (end, 0) if done == len(items) else (start, done)
+            seq = checkpoint.begin_batch(len(batch), offset, row)
+            for key, value in batch:
+                await self._send(key, value, checkpoint, seq)
+        self._report_progress()
+    
+    async def _send(self, key: str, value: bytes, checkpoint: LoadCheckpoint, seq: int):
+        await self._in_flight.acquire()
+        try:
+            delivery = await self.producer.send(
+                self.kafka_topic, value=value, key=key, headers=self.headers
+            )
+        except Exception as e:
+            self._in_flight.release()
+            self.failed += 1
+            checkpoint.ack(seq, delivered=False)
+            print(f"Error publishing record: {e}")
+            return
+        self.sent += 1
+        delivery.add_done_callback(lambda d: self._on_delivery(d, checkpoint, seq))
+    
+    def _on_delivery(self, delivery: asyncio.Future, checkpoint: LoadCheckpoint, seq: int):
+        self._in_flight.release()
+        if delivery.cancelled() or delivery.exception() is not None:
+            self.failed += 1
+            checkpoint.ack(seq, delivered=False)
+            if not delivery.cancelled():
+                print(f"Error publishing record: {delivery.exception()}")
+        else:
+            self.delivered += 1
+            checkpoint.ack(seq)
+    
+    @staticmethod
+    def _record_key(record: Dict[str, Any]) -> str:
+        # Keyed by the listing the feed writes to, so its updates share a partition
+        return feed_listing_key(record)
     
     async def load_airbnb_dataset(self, file_path: str):
         """Load Inside Airbnb dataset"""
@@ -76,28 +308,49 @@ class DatasetLoader:
         await self.load_and_publish_dataset(file_path, "flight_price")
 
 
+def _encode_shard(
+    dataset_path: str,
+    dataset_type: str,
+    start: int,
+    end: int,
+    codec,
+    score_records: bool
+) -> List[Tuple[str, bytes]]:
+    """Worker process: normalize one byte range of a dataset into encoded (key, value) pairs"""
+    encoded = []
+    for records in CSVProcessor.process_dataset_range(dataset_path, dataset_type, start, end):
+        if score_records:
+            DatasetLoader._score_batch(records)
+        encoded.extend(
+            (DatasetLoader._record_key(record), codec.encode(record)) for record in records
+        )
+    return encoded
+
+
 async def main():
     """Main function to load datasets"""
     loader = DatasetLoader()
     
     # Example usage - update paths to your Kaggle dataset files
     datasets_dir = Path(os.getenv("DATASETS_DIR", "./datasets"))
-    
     # Load datasets if they exist
-    airbnb_file = datasets_dir / "airbnb_nyc.csv"
-    if airbnb_file.exists():
-        print("Loading Inside Airbnb dataset...")
-        await loader.load_airbnb_dataset(str(airbnb_file))
-    
-    hotel_file = datasets_dir / "hotel_booking.csv"
-    if hotel_file.exists():
-        print("Loading Hotel Booking dataset...")
-        await loader.load_hotel_booking_dataset(str(hotel_file))
-    
-    flight_file = datasets_dir / "flight_prices.csv"
-    if flight_file.exists():
-        print("Loading Flight Price dataset...")
-        await loader.load_flight_price_dataset(str(flight_file))
+    datasets = [
+        (datasets_dir / file_name, dataset_type, label)
+        for file_name, dataset_type, label in DATASET_FILES
+        if (datasets_dir / file_name).exists()
+    ]
+    
+    # DATASET_LOAD_WORKERS=1 loads files one after another in this process;
+    # 0 (one per CPU) or more parses them in a process pool
+    if int(os.getenv("DATASET_LOAD_WORKERS", "1")) != 1:
+        await loader.load_datasets_parallel(
+            [(str(path), dataset_type) for path, dataset_type, _ in datasets]
+        )
+        return
+    
+    for path, dataset_type, label in datasets:
+        print(f"Loading {label} dataset...")
+        await loader.load_and_publish_dataset(str(path), dataset_type)
 
 
 if __name__ == "__main__":
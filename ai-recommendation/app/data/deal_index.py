@@ -0,0 +1,340 @@
+"""Process-local index of active deals by route and city, ranked by deal score"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlmodel import Session, select
+from app.db.session import engine
+from app.models import FlightDeal, HotelDeal
+from app.models.keys import location_key
+
+# session.info key for deal changes applied to the index once the transaction commits
+_STAGED_DEALS = "deal_index_staged_deals"
+
+# Route lists remembered per origin- or destination-only query before the memo is reset
+_MATCH_CACHE_SIZE = 10000
+
+
+class _Ranking:
+    """Deals under one key, kept sorted by deal score (best first) with their prices"""
+    
+    __slots__ = ("entries", "by_id")
+    
+    def __init__(self):
+        # (-deal_score, deal_id, price), ascending
+        self.entries: List[Tuple[float, int, float]] = []
+        self.by_id: Dict[int, Tuple[float, int, float]] = {}
+    
+    def put(self, deal_id: int, deal_score: float, price: float):
+        self.remove(deal_id)
+        entry = (-deal_score, deal_id, price)
+        insort(self.entries, entry)
+        self.by_id[deal_id] = entry
+    
+    def remove(self, deal_id: int):
+        entry = self.by_id.pop(deal_id, None)
+        if entry is not None:
+            del self.entries[bisect_left(self.entries, entry)]
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class DealIndex:
+    """In-memory top-K lookups for DealSelector
+    
+    Active flight deals are grouped by (origin_key, destination_key) and
+    hotel deals by city_key; each group is sorted by deal score and carries
+    the deal's price, so the best deals under a price cap are found without
+    a table scan. Filters match keys exactly, as the selector's queries do.
+    The index is rebuilt from the database on startup and kept current with
+    committed ingestion upserts; lookups return deal IDs, which callers load
+    by primary key. Once stale it is rebuilt on a background thread while
+    lookups keep using the current one. Upserts committed during a rebuild's
+    scan are journaled and replayed onto the new snapshot before it is
+    swapped in, so they are not rolled back.
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None, max_age_seconds: Optional[float] = None):
+        self._enabled = enabled if enabled is not None else (
+            os.getenv("DEAL_INDEX_ENABLED", "true").lower() == "true"
+        )
+        # Rebuild in the background once older than this (0 = only at startup), so
+        # processes that don't run the ingestion worker themselves see new deals
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else float(
+            os.getenv("DEAL_INDEX_MAX_AGE_SECONDS", "60")
+        )
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _Ranking] = {}
+        self._cities: Dict[str, _Ranking] = {}
+        self._flight_keys: Dict[int, Tuple[str, str]] = {}
+        self._hotel_keys: Dict[int, str] = {}
+        self._route_matches: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self.built_at: Optional[float] = None
+        # Serializes rebuilds, so at most one journal is open
+        self._rebuild_lock = threading.Lock()
+        self._journal: Optional[List[Tuple[str, list]]] = None
+        self._refreshing = False
+    
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+    
+    @property
+    def ready(self) -> bool:
+        """Whether lookups can be answered from the index"""
+        return self._enabled and self.built_at is not None
+    
+    @property
+    def _tracking(self) -> bool:
+        """Whether committed upserts are wanted: the index is built or being built"""
+        return self._enabled and (self.built_at is not None or self._journal is not None)
+    
+    def is_stale(self) -> bool:
+        return self.max_age_seconds > 0 and (
+            self.built_at is None or time.monotonic() - self.built_at > self.max_age_seconds
+        )
+    
+    def refresh_in_background(self):
+        """Start a rebuild on a background thread unless one is already running"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._background_rebuild, name="deal-index-rebuild", daemon=True
+        ).start()
+    
+    def rebuild(self, session: Session) -> int:
+        """Replace the index with every active deal in the database"""
+        if not self._enabled:
+            return 0
+        with self._rebuild_lock:
+            try:
+                return self._rebuild(session)
+            finally:
+                with self._lock:
+                    self._journal = None
+    
+    def _background_rebuild(self):
+        try:
+            with Session(engine) as session:
+                self.rebuild(session)
+        except Exception as e:
+            print(f"Error rebuilding deal index: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def _rebuild(self, session: Session) -> int:
+        # Upserts committed from here on may be missed by the scan
+        with self._lock:
+            self._journal = []
+        routes: Dict[Tuple[str, str], _Ranking] = {}
+        cities: Dict[str, _Ranking] = {}
+        flight_keys: Dict[int, Tuple[str, str]] = {}
+        hotel_keys: Dict[int, str] = {}
+        
+        flights = select(
+            FlightDeal.id, FlightDeal.origin_key, FlightDeal.destination_key,
+            FlightDeal.deal_score, FlightDeal.discounted_price
+        ).where(FlightDeal.is_active == True)
+        for deal_id, origin_key, destination_key, deal_score, price in session.exec(
+            flights.execution_options(yield_per=10000)
+        ):
+            key = (origin_key, destination_key)
+            routes.setdefault(key, _Ranking()).put(deal_id, deal_score, price)
+            flight_keys[deal_id] = key
+        
+        hotels = select(
+            HotelDeal.id, HotelDeal.city_key, HotelDeal.deal_score,
+            HotelDeal.discounted_price_per_night
+        ).where(HotelDeal.is_active == True)
+        for deal_id, key, deal_score, price in session.exec(
+            hotels.execution_options(yield_per=10000)
+        ):
+            cities.setdefault(key, _Ranking()).put(deal_id, deal_score, price)
+            hotel_keys[deal_id] = key
+        
+        with self._lock:
+            journal, self._journal = self._journal, None
+            for listing_type, rows in journal:
+                if listing_type == "flight":
+                    self._apply_flights(routes, flight_keys, None, rows)
+                else:
+                    self._apply_hotels(cities, hotel_keys, rows)
+            self._routes, self._cities = routes, cities
+            self._flight_keys, self._hotel_keys = flight_keys, hotel_keys
+            self._route_matches = {}
+            self.built_at = time.monotonic()
+        return len(flight_keys) + len(hotel_keys)
+    
+    def top_flight_ids(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        max_price: Optional[float] = None,
+        limit: int = 10
+    ) -> List[int]:
+        """IDs of the best active flight deals matching the filters, best first"""
+        query = (location_key(origin), location_key(destination))
+        with self._lock:
+            if all(query):
+                keys = [query] if query in self._routes else []
+            else:
+                keys = self._route_matches.get(query)
+                if keys is None:
+                    keys = [
+                        key for key in self._routes
+                        if query[0] in ("", key[0]) and query[1] in ("", key[1])
+                    ]
+                    self._remember(self._route_matches, query, keys)
+            return self._top([self._routes[key] for key in keys], max_price, limit)
+    
+    def top_hotel_ids(
+        self,
+        city: Optional[str] = None,
+        max_price: Optional[float] = None,
+        limit: int = 10
+    ) -> List[int]:
+        """IDs of the best active hotel deals matching the filters, best first"""
+        query = location_key(city)
+        with self._lock:
+            if query:
+                rankings = [self._cities[query]] if query in self._cities else []
+            else:
+                rankings = list(self._cities.values())
+            return self._top(rankings, max_price, limit)
+    
+    def update_flights(self, rows: Iterable[Tuple[int, str, str, float, float, bool]]):
+        """Apply (id, origin, destination, deal_score, price, is_active) snapshots"""
+        rows = list(rows)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("flight", rows))
+            self._apply_flights(self._routes, self._flight_keys, self._route_matches, rows)
+    
+    def update_hotels(self, rows: Iterable[Tuple[int, str, float, float, bool]]):
+        """Apply (id, city, deal_score, price, is_active) snapshots"""
+        rows = list(rows)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("hotel", rows))
+            self._apply_hotels(self._cities, self._hotel_keys, rows)
+    
+    @classmethod
+    def _apply_flights(cls, routes, flight_keys, matches, rows):
+        """Apply flight snapshots to the given maps; caller holds the lock"""
+        for deal_id, origin, destination, deal_score, price, is_active in rows:
+            key = (location_key(origin), location_key(destination))
+            cls._move(routes, flight_keys, matches,
+                      deal_id, key if is_active else None, deal_score, price)
+    
+    @classmethod
+    def _apply_hotels(cls, cities, hotel_keys, rows):
+        """Apply hotel snapshots to the given maps; caller holds the lock"""
+        for deal_id, city, deal_score, price, is_active in rows:
+            cls._move(cities, hotel_keys, None,
+                      deal_id, location_key(city) if is_active else None, deal_score, price)
+    
+    def stage_flight_deals(self, session: Session, deals: Iterable[FlightDeal]):
+        """Queue flight deal rows to be applied once the session commits"""
+        if not self._tracking:
+            return
+        # New rows need their primary keys
+        session.flush()
+        session.info.setdefault(_STAGED_DEALS, []).append(("flight", [
+            (deal.id, deal.origin, deal.destination, deal.deal_score,
+             deal.discounted_price, deal.is_active)
+            for deal in deals
+        ]))
+    
+    def stage_hotel_deals(self, session: Session, deals: Iterable[HotelDeal]):
+        """Queue hotel deal rows to be applied once the session commits"""
+        if not self._tracking:
+            return
+        session.flush()
+        session.info.setdefault(_STAGED_DEALS, []).append(("hotel", [
+            (deal.id, deal.city, deal.deal_score, deal.discounted_price_per_night, deal.is_active)
+            for deal in deals
+        ]))
+    
+    def clear(self):
+        with self._lock:
+            self._routes = {}
+            self._cities = {}
+            self._flight_keys = {}
+            self._hotel_keys = {}
+            self._route_matches = {}
+            self.built_at = None
+    
+    def __len__(self) -> int:
+        return len(self._flight_keys) + len(self._hotel_keys)
+    
+    @staticmethod
+    def _top(rankings: List[_Ranking], max_price: Optional[float], limit: int) -> List[int]:
+        """Merge rankings best first, skipping deals over max_price; caller holds the lock"""
+        best: List[Tuple[float, int]] = []
+        for ranking in rankings:
+            taken = 0
+            for neg_score, deal_id, price in ranking.entries:
+                if max_price and price > max_price:
+                    continue
+                if len(best) >= limit and (neg_score, deal_id) >= best[-1]:
+                    break
+                insort(best, (neg_score, deal_id))
+                if len(best) > limit:
+                    best.pop()
+                taken += 1
+                if taken >= limit:
+                    break
+        return [deal_id for _, deal_id in best]
+    
+    @staticmethod
+    def _move(rankings, keys, matches, deal_id, key, deal_score, price):
+        """Put a deal under key (None removes it); caller holds the lock"""
+        old_key = keys.get(deal_id)
+        if old_key is not None and old_key != key:
+            rankings[old_key].remove(deal_id)
+            if not rankings[old_key]:
+                del rankings[old_key]
+                if matches is not None:
+                    matches.clear()
+            del keys[deal_id]
+        if key is None:
+            return
+        ranking = rankings.get(key)
+        if ranking is None:
+            ranking = rankings[key] = _Ranking()
+            if matches is not None:
+                matches.clear()
+        ranking.put(deal_id, deal_score, price)
+        keys[deal_id] = key
+    
+    @staticmethod
+    def _remember(matches: Dict, query, keys):
+        if len(matches) >= _MATCH_CACHE_SIZE:
+            matches.clear()
+        matches[query] = keys
+
+
+# Global index instance
+deal_index = DealIndex()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged_deals(session: Session):
+    """Apply committed deal upserts to the index"""
+    for listing_type, rows in session.info.pop(_STAGED_DEALS, []):
+        if listing_type == "flight":
+            deal_index.update_flights(rows)
+        else:
+            deal_index.update_hotels(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_deals(session: Session):
+    """Drop deal changes from a rolled-back transaction"""
+    session.info.pop(_STAGED_DEALS, None)
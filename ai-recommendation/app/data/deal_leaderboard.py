@@ -0,0 +1,259 @@
+"""Top-N deal leaderboards per route and city, materialized in a table and in memory"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, event, func, insert, tuple_
+from sqlmodel import Session, select
+from app.models import DealLeaderboard, FlightDeal, HotelDeal
+from app.models.keys import location_key
+
+# session.info key for scopes re-ranked once the transaction commits
+_STAGED_SCOPES = "deal_leaderboard_staged_scopes"
+
+# Scopes recomputed per query
+_SCOPE_CHUNK_SIZE = 500
+
+# (deal_id, deal_score, price), best first
+Board = List[Tuple[int, float, float]]
+
+
+def flight_scope(origin: Optional[str], destination: Optional[str]) -> str:
+    """Leaderboard scope of a route"""
+    return f"{location_key(origin)}:{location_key(destination)}"
+
+
+def hotel_scope(city: Optional[str]) -> str:
+    """Leaderboard scope of a city"""
+    return location_key(city)
+
+
+class DealLeaderboards:
+    """The best `size` active deals per (origin, destination) and per city
+    
+    Boards live in the deal_leaderboards table, so every process can load
+    them, and in memory for constant-time lookups. IngestionWorker queues
+    the routes and cities its upserts touch; once that transaction commits,
+    those scopes are re-ranked with one windowed query over the location key
+    indexes, so deals that drop out, lose score or are deactivated leave the
+    board too. Refreshes are serialized within the process.
+    """
+    
+    def __init__(self, size: Optional[int] = None, max_age_seconds: Optional[float] = None):
+        self.size = size if size is not None else int(os.getenv("DEAL_LEADERBOARD_SIZE", "10"))
+        # Reload from the table on lookup once older than this (0 = never), so
+        # processes that don't run the ingestion worker themselves see refreshes
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else float(
+            os.getenv("DEAL_LEADERBOARD_MAX_AGE_SECONDS", "60")
+        )
+        self._boards: Dict[Tuple[str, str], Board] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+    
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.loaded_at is not None
+    
+    def is_stale(self) -> bool:
+        return self.max_age_seconds > 0 and (
+            self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age_seconds
+        )
+    
+    def top_ids(
+        self,
+        listing_type: str,
+        scope_key: str,
+        limit: int,
+        max_price: Optional[float] = None
+    ) -> Optional[List[int]]:
+        """Best deal IDs in a scope under max_price, or None if the board can't tell"""
+        with self._lock:
+            board = self._boards.get((listing_type, scope_key))
+        # Scopes missing from the boards may have deals the last load didn't see
+        if board is None:
+            return None
+        matching = [
+            deal_id for deal_id, _, price in board
+            if not (max_price and price > max_price)
+        ]
+        # A board shorter than size holds every active deal in its scope
+        if len(matching) >= limit or len(board) < self.size:
+            return matching[:limit]
+        return None
+    
+    def load(self, session: Session) -> int:
+        """Replace the in-memory boards with the table's contents"""
+        if not self.enabled:
+            return 0
+        boards: Dict[Tuple[str, str], Board] = {}
+        statement = select(DealLeaderboard).order_by(
+            DealLeaderboard.listing_type, DealLeaderboard.scope_key, DealLeaderboard.rank
+        )
+        for entry in session.exec(statement):
+            boards.setdefault((entry.listing_type, entry.scope_key), []).append(
+                (entry.deal_id, entry.deal_score, entry.price)
+            )
+        with self._lock:
+            self._boards = boards
+            self.loaded_at = time.monotonic()
+        return len(boards)
+    
+    def rebuild(self, session: Session) -> int:
+        """Re-rank every scope from the deal tables and rewrite the table; the caller commits"""
+        if not self.enabled:
+            return 0
+        boards = {**self._rank_flights(session, None), **self._rank_hotels(session, None)}
+        session.execute(delete(DealLeaderboard))
+        self._write(session, boards)
+        with self._lock:
+            self._boards = boards
+            self.loaded_at = time.monotonic()
+        return len(boards)
+    
+    def refresh_flights(self, session: Session, deals: Iterable[FlightDeal]):
+        """Queue the routes of the given flight deals to be re-ranked once the session commits"""
+        if self.ready:
+            session.info.setdefault(_STAGED_SCOPES, set()).update(
+                ("flight", (location_key(deal.origin), location_key(deal.destination)))
+                for deal in deals
+            )
+    
+    def refresh_hotels(self, session: Session, deals: Iterable[HotelDeal]):
+        """Queue the cities of the given hotel deals to be re-ranked once the session commits"""
+        if self.ready:
+            session.info.setdefault(_STAGED_SCOPES, set()).update(
+                ("hotel", location_key(deal.city)) for deal in deals
+            )
+    
+    def refresh(self, bind, scopes: Set[Tuple[str, Any]]):
+        """Re-rank the given (listing_type, scope) pairs and rewrite their rows"""
+        flights = {scope for listing_type, scope in scopes if listing_type == "flight"}
+        hotels = {scope for listing_type, scope in scopes if listing_type == "hotel"}
+        # Concurrent transactions touching one scope would race on its rows
+        with self._refresh_lock, Session(bind) as session:
+            boards = {
+                ("flight", f"{origin_key}:{destination_key}"): []
+                for origin_key, destination_key in flights
+            }
+            boards.update({("hotel", city_key): [] for city_key in hotels})
+            if flights:
+                boards.update(self._rank_flights(session, flights))
+            if hotels:
+                boards.update(self._rank_hotels(session, hotels))
+            for listing_type in ("flight", "hotel"):
+                scope_keys = [key for board_type, key in boards if board_type == listing_type]
+                for start in range(0, len(scope_keys), _SCOPE_CHUNK_SIZE):
+                    session.execute(delete(DealLeaderboard).where(
+                        DealLeaderboard.listing_type == listing_type,
+                        DealLeaderboard.scope_key.in_(scope_keys[start:start + _SCOPE_CHUNK_SIZE])
+                    ))
+            self._write(session, boards)
+            session.commit()
+            # Scopes left without active deals are emptied too
+            with self._lock:
+                for key, board in boards.items():
+                    if board:
+                        self._boards[key] = board
+                    else:
+                        self._boards.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._boards = {}
+            self.loaded_at = None
+    
+    def _rank_flights(self, session: Session, scopes: Optional[Set[Tuple[str, str]]]) -> Dict:
+        """Top `size` active flight deals per route, for the given routes or all of them"""
+        route = (FlightDeal.origin_key, FlightDeal.destination_key)
+        return self._rank(
+            session, "flight", route,
+            lambda origin_key, destination_key: f"{origin_key}:{destination_key}",
+            FlightDeal, FlightDeal.discounted_price, scopes
+        )
+    
+    def _rank_hotels(self, session: Session, scopes: Optional[Set[str]]) -> Dict:
+        """Top `size` active hotel deals per city, for the given cities or all of them"""
+        return self._rank(
+            session, "hotel", (HotelDeal.city_key,), lambda city_key: city_key,
+            HotelDeal, HotelDeal.discounted_price_per_night, scopes
+        )
+    
+    def _rank(self, session, listing_type, scope_columns, scope_key, model, price, scopes) -> Dict:
+        boards: Dict[Tuple[str, str], Board] = {}
+        if scopes is None:
+            chunks = [None]
+        else:
+            scopes = list(scopes)
+            chunks = [
+                scopes[start:start + _SCOPE_CHUNK_SIZE]
+                for start in range(0, len(scopes), _SCOPE_CHUNK_SIZE)
+            ]
+        for chunk in chunks:
+            ranked = select(
+                model.id, model.deal_score, price, *scope_columns,
+                func.row_number().over(
+                    partition_by=scope_columns,
+                    order_by=(model.deal_score.desc(), model.id)
+                ).label("rank")
+            ).where(model.is_active == True)
+            if chunk is not None and len(scope_columns) > 1:
+                ranked = ranked.where(tuple_(*scope_columns).in_(chunk))
+            elif chunk is not None:
+                ranked = ranked.where(scope_columns[0].in_(chunk))
+            ranked = ranked.subquery()
+            rows = session.execute(
+                select(ranked).where(ranked.c.rank <= self.size).order_by(
+                    *(ranked.c[column.key] for column in scope_columns), ranked.c.rank
+                )
+            )
+            for row in rows:
+                key = scope_key(*row[3:3 + len(scope_columns)])
+                boards.setdefault((listing_type, key), []).append((row[0], row[1], row[2]))
+        return boards
+    
+    @staticmethod
+    def _write(session: Session, boards: Dict[Tuple[str, str], Board]):
+        now = datetime.now()
+        rows = [
+            {
+                "listing_type": listing_type,
+                "scope_key": scope_key,
+                "rank": rank,
+                "deal_id": deal_id,
+                "deal_score": deal_score,
+                "price": price,
+                "updated_at": now
+            }
+            for (listing_type, scope_key), board in boards.items()
+            for rank, (deal_id, deal_score, price) in enumerate(board, start=1)
+        ]
+        if rows:
+            session.execute(insert(DealLeaderboard), rows)
+
+
+# Global leaderboards instance
+deal_leaderboards = DealLeaderboards()
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_staged_scopes(session: Session):
+    """Re-rank the scopes touched by a committed transaction"""
+    scopes = session.info.pop(_STAGED_SCOPES, None)
+    if not scopes:
+        return
+    try:
+        deal_leaderboards.refresh(session.get_bind(), scopes)
+    except Exception as e:
+        print(f"Error refreshing deal leaderboards: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_scopes(session: Session):
+    """Drop scopes queued by a rolled-back transaction"""
+    session.info.pop(_STAGED_SCOPES, None)
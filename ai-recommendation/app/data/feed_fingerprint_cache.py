@@ -0,0 +1,135 @@
+"""Process-local cache of feed content fingerprints for change detection"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlmodel import Session
+
+# session.info key for fingerprints recorded once the transaction commits
+_STAGED_FINGERPRINTS = "feed_fingerprint_staged"
+
+
+def feed_fingerprint(*values: Any) -> int:
+    """Compact 64-bit fingerprint of the given values"""
+    digest = hashlib.blake2b(repr(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class FeedFingerprintCache:
+    """LRU-bounded map of (listing_type, listing_id) -> content fingerprint
+    
+    A listing whose latest feed has the same fingerprint as the last one
+    persisted is unchanged and can be skipped. Fingerprints are staged in the
+    session that persists their feeds and recorded only once it commits, so a
+    feed that is dropped, rolled back or never persisted is not skipped when
+    it is redelivered.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, path: Optional[str] = None):
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("FEED_FINGERPRINT_CACHE_SIZE", "100000")
+        )
+        self.path = path if path is not None else os.getenv("FEED_FINGERPRINT_CACHE_PATH", "")
+        self._entries: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def check(self, listing_type: str, listing_id: str, fingerprint: int) -> bool:
+        """Return True if the listing changed since its last persisted feed"""
+        key = (listing_type, listing_id)
+        with self._lock:
+            if self._entries.get(key) == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return False
+            self.misses += 1
+            return True
+    
+    def record(self, fingerprints: Iterable[Tuple[str, str, int]]):
+        """Record (listing_type, listing_id, fingerprint) of persisted feeds"""
+        with self._lock:
+            for listing_type, listing_id, fingerprint in fingerprints:
+                key = (listing_type, listing_id)
+                self._entries[key] = fingerprint
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stage(self, session: Session, fingerprints: Iterable[Tuple[str, str, int]]):
+        """Queue fingerprints to be recorded once the session commits"""
+        if self.enabled:
+            session.info.setdefault(_STAGED_FINGERPRINTS, []).extend(fingerprints)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit (skipped) and miss (processed) counters"""
+        with self._lock:
+            checked = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skip_rate": round(self.hits / checked, 4) if checked else 0.0
+            }
+    
+    def load(self) -> int:
+        """Load fingerprints saved by save(); returns the number loaded"""
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        with self._lock:
+            # Saved oldest first, so replaying them restores the LRU order
+            for listing_type, listing_id, fingerprint in saved[-self.max_entries:]:
+                self._entries[(listing_type, listing_id)] = fingerprint
+                self._entries.move_to_end((listing_type, listing_id))
+        return len(self._entries)
+    
+    def save(self) -> int:
+        """Write fingerprints to the cache file, if one is configured"""
+        if not self.enabled or not self.path:
+            return 0
+        with self._lock:
+            saved = [
+                [listing_type, listing_id, fingerprint]
+                for (listing_type, listing_id), fingerprint in self._entries.items()
+            ]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.path)
+        return len(saved)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Global cache instance
+feed_fingerprint_cache = FeedFingerprintCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_staged_fingerprints(session: Session):
+    """Record fingerprints of feeds persisted by a committed transaction"""
+    staged = session.info.pop(_STAGED_FINGERPRINTS, None)
+    if staged:
+        feed_fingerprint_cache.record(staged)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_fingerprints(session: Session):
+    """Drop fingerprints staged by a rolled-back transaction"""
+    session.info.pop(_STAGED_FINGERPRINTS, None)
@@ -0,0 +1,139 @@
+"""Acknowledged progress of dataset and CSV loads, kept in a local state file"""
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+class LoadCheckpoint:
+    """Resumable position of one load of one source file
+    
+    Records are published in numbered batches. Each batch carries the
+    position just after its last record: a byte offset where reading can
+    restart and a number of rows past that offset. Once every record of a
+    batch and of all earlier batches is acknowledged, that position is
+    written to the state file, so a restart re-sends at most the batches
+    that were still in flight. A batch with a failed record stops the
+    checkpoint from advancing for the rest of the run.
+    
+    State is keyed by the source's absolute path and the kind of load, and
+    is ignored when the file's size or mtime changed since it was written.
+    """
+    
+    def __init__(
+        self,
+        source: str,
+        kind: str,
+        resume: bool = False,
+        path: Optional[str] = None
+    ):
+        self.path = path if path is not None else os.getenv(
+            "LOAD_CHECKPOINT_PATH", ".load_checkpoint.json"
+        )
+        self.source = os.path.abspath(source)
+        self.key = f"{kind}:{self.source}"
+        self.offset = 0
+        self.row = 0
+        self.batch = 0
+        self.completed = False
+        self._failed = False
+        self._next_batch = 0
+        # batch sequence -> [records not yet acknowledged, offset, row]
+        self._pending: Dict[int, list] = {}
+        
+        if resume:
+            self._restore()
+        else:
+            # A fresh load replaces whatever an earlier one left behind
+            self._save()
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+    
+    @property
+    def position(self) -> Tuple[int, int]:
+        """(byte offset, rows past it) where the load should restart"""
+        return self.offset, self.row
+    
+    def begin_batch(self, records: int, offset: int, row: int) -> int:
+        """Register a batch of `records` records ending at (offset, row); returns its sequence"""
+        seq = self._next_batch
+        self._next_batch += 1
+        self._pending[seq] = [records, offset, row]
+        if not records:
+            self._advance()
+        return seq
+    
+    def ack(self, seq: int, delivered: bool = True):
+        """Record the acknowledgement of one record of a batch"""
+        batch = self._pending.get(seq)
+        if batch is None:
+            return
+        if not delivered:
+            self._failed = True
+        batch[0] -= 1
+        self._advance()
+    
+    def finish(self) -> bool:
+        """Mark the source as completely loaded if every batch was acknowledged"""
+        if self._failed or self._pending:
+            return False
+        self.completed = True
+        self._save()
+        return True
+    
+    def _advance(self):
+        moved = False
+        while not self._failed and self._pending:
+            seq = next(iter(self._pending))
+            remaining, offset, row = self._pending[seq]
+            if remaining > 0:
+                break
+            del self._pending[seq]
+            self.offset, self.row, self.batch = offset, row, self.batch + 1
+            moved = True
+        if moved:
+            self._save()
+    
+    def _restore(self):
+        state = self._read_state().get(self.key)
+        if not state:
+            return
+        stat = os.stat(self.source)
+        if state["size"] != stat.st_size or state["mtime_ns"] != stat.st_mtime_ns:
+            print(f"{self.source} changed since its last checkpoint; loading it from the start")
+            return
+        self.offset = state["offset"]
+        self.row = state["row"]
+        self.batch = state["batch"]
+        self.completed = state["completed"]
+    
+    def _read_state(self) -> Dict[str, Any]:
+        if not self.enabled or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading load checkpoint {self.path}: {e}")
+            return {}
+    
+    def _save(self):
+        if not self.enabled:
+            return
+        state = self._read_state()
+        stat = os.stat(self.source)
+        state[self.key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "offset": self.offset,
+            "row": self.row,
+            "batch": self.batch,
+            "completed": self.completed,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
@@ -1,13 +1,23 @@
 """Price history tracking for 30-day averages"""
 from sqlmodel import Session, select, func
+from sqlalchemy import insert, event
 from app.db.session import get_session
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from app.models import PriceHistory, PriceDailyRollup
+from app.data.price_stats_cache import price_stats_cache
+from typing import Dict, Any, Optional, Iterable, List, Tuple
+from datetime import datetime, timedelta, date
 from collections import defaultdict
 
+_STAGED_PRICE_POINTS = "staged_price_points"
+
 
 class PriceHistoryTracker:
-    """Tracks price history and calculates 30-day averages"""
+    """Tracks price history and calculates 30-day averages
+    
+    Every price point is appended to the price_history table and folded into
+    price_history_daily, so a 30-day average is a primary-key range read over
+    about 30 rollup rows per listing.
+    """
     
     @staticmethod
     def get_price_history_key(listing_type: str, listing_id: str) -> str:
@@ -22,38 +32,82 @@ class PriceHistoryTracker:
         current_date: Optional[datetime] = None
     ) -> Optional[float]:
         """Calculate 30-day average price for a listing"""
+        averages = PriceHistoryTracker.calculate_30_day_averages(
+            session, listing_type, [listing_id], current_date
+        )
+        return averages.get(listing_id)
+    
+    @staticmethod
+    def calculate_30_day_averages(
+        session: Session,
+        listing_type: str,
+        listing_ids: Iterable[str],
+        current_date: Optional[datetime] = None
+    ) -> Dict[str, float]:
+        """Calculate 30-day average prices for many listings from the daily rollups"""
+        listing_ids = list(set(listing_ids))
+        if not listing_ids:
+            return {}
+        if current_date is None and price_stats_cache.enabled:
+            return PriceHistoryTracker._cached_30_day_averages(session, listing_type, listing_ids)
         if current_date is None:
             current_date = datetime.now()
         
-        thirty_days_ago = current_date - timedelta(days=30)
+        window_start = (current_date - timedelta(days=30)).date()
         
-        # In a real implementation, this would query a price_history table
-        # For now, we'll use a simplified approach with the deals table
         try:
-            if listing_type == "hotel":
-                from app.models import HotelDeal
-                statement = select(
-                    func.avg(HotelDeal.original_price_per_night)
-                ).where(
-                    HotelDeal.name == listing_id,
-                    HotelDeal.created_at >= thirty_days_ago
-                )
-            elif listing_type == "flight":
-                from app.models import FlightDeal
-                statement = select(
-                    func.avg(FlightDeal.original_price)
-                ).where(
-                    FlightDeal.flight_number == listing_id,
-                    FlightDeal.created_at >= thirty_days_ago
-                )
-            else:
-                return None
+            statement = select(
+                PriceDailyRollup.listing_id,
+                func.sum(PriceDailyRollup.price_sum),
+                func.sum(PriceDailyRollup.price_count)
+            ).where(
+                PriceDailyRollup.listing_type == listing_type,
+                PriceDailyRollup.listing_id.in_(listing_ids),
+                PriceDailyRollup.day >= window_start,
+                PriceDailyRollup.day <= current_date.date()
+            ).group_by(PriceDailyRollup.listing_id)
             
-            result = session.exec(statement).first()
-            return float(result) if result else None
+            return {
+                listing_id: float(total) / count
+                for listing_id, total, count in session.exec(statement).all()
+                if count
+            }
         except Exception as e:
-            print(f"Error calculating 30-day average: {e}")
-            return None
+            print(f"Error calculating 30-day averages: {e}")
+            return {}
+    
+    @staticmethod
+    def _cached_30_day_averages(
+        session: Session,
+        listing_type: str,
+        listing_ids: List[str]
+    ) -> Dict[str, float]:
+        """Serve 30-day averages from the price stats cache, loading misses from the rollups"""
+        today = datetime.now().date()
+        averages, missing = price_stats_cache.get_averages(listing_type, listing_ids, today)
+        
+        if missing:
+            # Registered before the read, so points committed after it are noticed
+            started = price_stats_cache.begin_load(listing_type, missing)
+            try:
+                statement = select(PriceDailyRollup).where(
+                    PriceDailyRollup.listing_type == listing_type,
+                    PriceDailyRollup.listing_id.in_(missing),
+                    PriceDailyRollup.day >= today - timedelta(days=30)
+                )
+                loaded = price_stats_cache.load(
+                    listing_type, missing, session.exec(statement).all(), started
+                )
+            except Exception as e:
+                print(f"Error loading price stats: {e}")
+                return {k: v for k, v in averages.items() if v is not None}
+            finally:
+                price_stats_cache.end_load(listing_type, missing)
+            averages.update(
+                (listing_id, stats.average(today)) for listing_id, stats in loaded.items()
+            )
+        
+        return {k: v for k, v in averages.items() if v is not None}
     
     @staticmethod
     def store_price_point(
@@ -64,32 +118,88 @@ class PriceHistoryTracker:
         timestamp: Optional[datetime] = None
     ):
         """Store a price point in history"""
-        if timestamp is None:
-            timestamp = datetime.now()
-        
-        # In a real implementation, this would insert into a price_history table
-        # For now, we'll just update the deal record with a timestamp
         try:
-            if listing_type == "hotel":
-                from app.models import HotelDeal
-                statement = select(HotelDeal).where(HotelDeal.name == listing_id)
-                deal = session.exec(statement).first()
-                if deal:
-                    deal.last_price_update = timestamp
-                    session.add(deal)
-            elif listing_type == "flight":
-                from app.models import FlightDeal
-                statement = select(FlightDeal).where(FlightDeal.flight_number == listing_id)
-                deal = session.exec(statement).first()
-                if deal:
-                    deal.last_price_update = timestamp
-                    session.add(deal)
-            
+            PriceHistoryTracker.store_price_points(
+                session, listing_type, [(listing_id, price)], timestamp
+            )
             session.commit()
         except Exception as e:
             session.rollback()
             print(f"Error storing price point: {e}")
     
+    @staticmethod
+    def store_price_points(
+        session: Session,
+        listing_type: str,
+        price_points: List[Tuple[str, float]],
+        timestamp: Optional[datetime] = None
+    ):
+        """Bulk-append price points and update daily rollups; the caller owns the transaction"""
+        if not price_points:
+            return
+        if timestamp is None:
+            timestamp = datetime.now()
+        
+        session.execute(
+            insert(PriceHistory),
+            [
+                {
+                    "listing_type": listing_type,
+                    "listing_id": listing_id,
+                    "ts": timestamp,
+                    "price": price
+                }
+                for listing_id, price in price_points
+            ]
+        )
+        PriceHistoryTracker._update_daily_rollups(
+            session, listing_type, price_points, timestamp.date()
+        )
+        
+        # Applied to the price stats cache once the transaction commits
+        if price_stats_cache.enabled:
+            session.info.setdefault(_STAGED_PRICE_POINTS, []).append(
+                (listing_type, list(price_points), timestamp.date())
+            )
+    
+    @staticmethod
+    def _update_daily_rollups(
+        session: Session,
+        listing_type: str,
+        price_points: List[Tuple[str, float]],
+        day: date
+    ):
+        """Fold price points into the per-listing rollup rows for a day"""
+        prices_by_listing: Dict[str, List[float]] = defaultdict(list)
+        for listing_id, price in price_points:
+            prices_by_listing[listing_id].append(price)
+        
+        statement = select(PriceDailyRollup).where(
+            PriceDailyRollup.listing_type == listing_type,
+            PriceDailyRollup.listing_id.in_(list(prices_by_listing)),
+            PriceDailyRollup.day == day
+        )
+        existing = {rollup.listing_id: rollup for rollup in session.exec(statement).all()}
+        
+        for listing_id, prices in prices_by_listing.items():
+            rollup = existing.get(listing_id)
+            if rollup is None:
+                session.add(PriceDailyRollup(
+                    listing_type=listing_type,
+                    listing_id=listing_id,
+                    day=day,
+                    price_sum=sum(prices),
+                    price_count=len(prices),
+                    min_price=min(prices),
+                    max_price=max(prices)
+                ))
+            else:
+                rollup.price_sum += sum(prices)
+                rollup.price_count += len(prices)
+                rollup.min_price = min(rollup.min_price, min(prices))
+                rollup.max_price = max(rollup.max_price, max(prices))
+                session.add(rollup)
+    
     @staticmethod
     def get_historical_data(
         session: Session,
@@ -106,4 +216,37 @@ class PriceHistoryTracker:
             "listing_type": listing_type,
             "listing_id": listing_id
         }
+    
+    @staticmethod
+    def get_historical_data_batch(
+        session: Session,
+        listing_type: str,
+        listing_ids: Iterable[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Get historical price data for many listings, keyed by listing ID"""
+        listing_ids = set(listing_ids)
+        averages = PriceHistoryTracker.calculate_30_day_averages(
+            session, listing_type, listing_ids
+        )
+        
+        return {
+            listing_id: {
+                "avg_price_30d": averages.get(listing_id),
+                "listing_type": listing_type,
+                "listing_id": listing_id
+            }
+            for listing_id in listing_ids
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged_price_points(session: Session):
+    """Feed committed price points into the price stats cache"""
+    for listing_type, price_points, day in session.info.pop(_STAGED_PRICE_POINTS, []):
+        price_stats_cache.record(listing_type, price_points, day)
+
 
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_price_points(session: Session):
+    """Drop price points from a rolled-back transaction"""
+    session.info.pop(_STAGED_PRICE_POINTS, None)
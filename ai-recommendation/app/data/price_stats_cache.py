@@ -0,0 +1,255 @@
+"""Process-local rolling-window price statistics cache"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlmodel import Session, select, func
+from sqlalchemy import and_
+from app.models import PriceDailyRollup
+
+# Rolling window used for historical averages; both ends are inclusive
+WINDOW_DAYS = 30
+
+
+class RollingPriceStats:
+    """Ring buffer of daily price buckets (sum, count, min, max) for one listing"""
+    
+    __slots__ = ("days", "sums", "counts", "mins", "maxs")
+    
+    SIZE = WINDOW_DAYS + 1
+    
+    def __init__(self):
+        self.days = [0] * self.SIZE
+        self.sums = [0.0] * self.SIZE
+        self.counts = [0] * self.SIZE
+        self.mins = [0.0] * self.SIZE
+        self.maxs = [0.0] * self.SIZE
+    
+    def add(self, day: date, price_sum: float, count: int, min_price: float, max_price: float):
+        """Fold aggregated prices for a day into its bucket in O(1)"""
+        ordinal = day.toordinal()
+        slot = ordinal % self.SIZE
+        if self.days[slot] != ordinal:
+            if self.days[slot] > ordinal:
+                return  # Slot already holds a newer day; this one is outside the window
+            self.days[slot] = ordinal
+            self.sums[slot] = price_sum
+            self.counts[slot] = count
+            self.mins[slot] = min_price
+            self.maxs[slot] = max_price
+            return
+        
+        self.sums[slot] += price_sum
+        self.counts[slot] += count
+        self.mins[slot] = min(self.mins[slot], min_price)
+        self.maxs[slot] = max(self.maxs[slot], max_price)
+    
+    def record(self, day: date, price: float):
+        """Record a single price point"""
+        self.add(day, price, 1, price, price)
+    
+    def summary(self, as_of: date) -> Tuple[float, int, Optional[float], Optional[float]]:
+        """Return (sum, count, min, max) over the window ending at as_of"""
+        end = as_of.toordinal()
+        start = end - WINDOW_DAYS
+        total = 0.0
+        count = 0
+        low = None
+        high = None
+        for slot in range(self.SIZE):
+            if self.counts[slot] and start <= self.days[slot] <= end:
+                total += self.sums[slot]
+                count += self.counts[slot]
+                low = self.mins[slot] if low is None else min(low, self.mins[slot])
+                high = self.maxs[slot] if high is None else max(high, self.maxs[slot])
+        return total, count, low, high
+    
+    def average(self, as_of: date) -> Optional[float]:
+        """Average price over the window ending at as_of"""
+        total, count, _, _ = self.summary(as_of)
+        return total / count if count else None
+
+
+class PriceStatsCache:
+    """LRU-bounded map of (listing_type, listing_id) -> RollingPriceStats
+    
+    An entry always reflects the listing's full window: it is loaded from the
+    daily rollups on first use and then kept current with committed price
+    points. Points for listings that are not cached are ignored and picked up
+    from the database on the next lookup. A load can read rollups from before
+    a commit whose points it then misses, so loads are bracketed by
+    begin_load/end_load, and a listing that gets points after its load began
+    is not cached from it.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("PRICE_STATS_CACHE_SIZE", "100000")
+        )
+        self._entries: "OrderedDict[Tuple[str, str], RollingPriceStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Count of record() calls, and for listings being loaded, the last one
+        # that had points for them
+        self._commit_seq = 0
+        self._loading: Dict[Tuple[str, str], int] = {}
+        self._recorded_at: Dict[Tuple[str, str], int] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_averages(
+        self,
+        listing_type: str,
+        listing_ids: Iterable[str],
+        as_of: date
+    ) -> Tuple[Dict[str, Optional[float]], List[str]]:
+        """Return cached averages and the listing IDs that are not cached"""
+        averages: Dict[str, Optional[float]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for listing_id in listing_ids:
+                key = (listing_type, listing_id)
+                stats = self._entries.get(key)
+                if stats is None:
+                    missing.append(listing_id)
+                    continue
+                self._entries.move_to_end(key)
+                averages[listing_id] = stats.average(as_of)
+            self.hits += len(averages)
+            self.misses += len(missing)
+        return averages, missing
+    
+    def begin_load(self, listing_type: str, listing_ids: Iterable[str]) -> int:
+        """Start tracking commits for listings about to be read; pass the result to load()"""
+        with self._lock:
+            for listing_id in listing_ids:
+                key = (listing_type, listing_id)
+                self._loading[key] = self._loading.get(key, 0) + 1
+            return self._commit_seq
+    
+    def end_load(self, listing_type: str, listing_ids: Iterable[str]):
+        """Stop tracking listings passed to begin_load, whether or not they were loaded"""
+        with self._lock:
+            for listing_id in listing_ids:
+                key = (listing_type, listing_id)
+                remaining = self._loading.get(key, 0) - 1
+                if remaining > 0:
+                    self._loading[key] = remaining
+                else:
+                    self._loading.pop(key, None)
+                    self._recorded_at.pop(key, None)
+    
+    def load(
+        self,
+        listing_type: str,
+        listing_ids: Iterable[str],
+        rollups: Iterable[PriceDailyRollup],
+        started: int
+    ) -> Dict[str, RollingPriceStats]:
+        """Add entries for listing_ids from rollup rows read after begin_load returned started
+        
+        Listings cached meanwhile are left alone, and so are listings that got
+        points since: the rows may predate them. Returns the stats built from
+        the rows either way, for the caller's own lookup.
+        """
+        loaded = {listing_id: RollingPriceStats() for listing_id in listing_ids}
+        for rollup in rollups:
+            stats = loaded.get(rollup.listing_id)
+            if stats is not None:
+                stats.add(
+                    rollup.day, rollup.price_sum, rollup.price_count,
+                    rollup.min_price, rollup.max_price
+                )
+        with self._lock:
+            for listing_id, stats in loaded.items():
+                key = (listing_type, listing_id)
+                if key not in self._entries and self._recorded_at.get(key, -1) <= started:
+                    self._put(key, stats)
+        return loaded
+    
+    def record(self, listing_type: str, price_points: List[Tuple[str, float]], day: date):
+        """Apply committed price points to the listings that are cached"""
+        with self._lock:
+            self._commit_seq += 1
+            for listing_id, price in price_points:
+                key = (listing_type, listing_id)
+                stats = self._entries.get(key)
+                if stats is not None:
+                    stats.record(day, price)
+                elif key in self._loading:
+                    self._recorded_at[key] = self._commit_seq
+    
+    def warm(self, session: Session, as_of: Optional[datetime] = None) -> int:
+        """Load the most recently active listings' windows from the daily rollups"""
+        if not self.enabled:
+            return 0
+        if as_of is None:
+            as_of = datetime.now()
+        window_start = (as_of - timedelta(days=WINDOW_DAYS)).date()
+        
+        # Pick at most max_entries listings by last activity so no loaded entry is evicted
+        recent = select(
+            PriceDailyRollup.listing_type,
+            PriceDailyRollup.listing_id,
+            func.max(PriceDailyRollup.day).label("last_day")
+        ).where(
+            PriceDailyRollup.day >= window_start
+        ).group_by(
+            PriceDailyRollup.listing_type, PriceDailyRollup.listing_id
+        ).order_by(
+            func.max(PriceDailyRollup.day).desc()
+        ).limit(self.max_entries).subquery()
+        
+        statement = select(PriceDailyRollup).join(
+            recent,
+            and_(
+                PriceDailyRollup.listing_type == recent.c.listing_type,
+                PriceDailyRollup.listing_id == recent.c.listing_id
+            )
+        ).where(
+            PriceDailyRollup.day >= window_start
+        ).order_by(
+            recent.c.last_day,
+            PriceDailyRollup.listing_type,
+            PriceDailyRollup.listing_id
+        )
+        
+        loaded = 0
+        key = None
+        stats = None
+        with self._lock:
+            for rollup in session.exec(statement.execution_options(yield_per=10000)):
+                if (rollup.listing_type, rollup.listing_id) != key:
+                    key = (rollup.listing_type, rollup.listing_id)
+                    stats = RollingPriceStats()
+                    self._put(key, stats)
+                    loaded += 1
+                stats.add(
+                    rollup.day, rollup.price_sum, rollup.price_count,
+                    rollup.min_price, rollup.max_price
+                )
+        return loaded
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def _put(self, key: Tuple[str, str], stats: RollingPriceStats):
+        """Insert an entry and evict least recently used ones; caller holds the lock"""
+        self._entries[key] = stats
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Global cache instance
+price_stats_cache = PriceStatsCache()
@@ -0,0 +1,56 @@
+"""Bounded thread-pool executor for blocking database work"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from sqlmodel import Session
+from app.db.session import engine
+
+T = TypeVar("T")
+
+
+class DBExecutor:
+    """Runs session-bound callables on a bounded thread pool
+    
+    Each worker thread owns its own Session. Every call runs in its own
+    transaction: committed when the callable returns, rolled back if it raises.
+    """
+    
+    def __init__(self, max_workers: int = 4, thread_name_prefix: str = "db"):
+        # Sized by the owner, e.g. IngestionWorker from INGESTION_DB_WORKERS
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=thread_name_prefix
+        )
+        self._local = threading.local()
+    
+    def _get_session(self) -> Session:
+        """Get the session owned by the current worker thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = Session(engine)
+            self._local.session = session
+        return session
+    
+    def _run_in_transaction(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(session, *args) in a transaction on the current worker thread"""
+        session = self._get_session()
+        try:
+            result = fn(session, *args)
+            session.commit()
+            return result
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(session, *args) on the pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_in_transaction, fn, *args)
+    
+    def shutdown(self, wait: bool = True):
+        """Shut down the worker pool"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,221 @@
+"""Schema migrations for databases created by earlier versions of the models
+
+SQLModel.metadata.create_all only creates missing tables, so columns and
+indexes added to existing tables are applied here. Every migration checks
+the live schema first and is safe to run repeatedly; run_migrations is
+called from create_db_and_tables after create_all.
+"""
+from typing import Callable, Dict, List
+from sqlalchemy import Engine, bindparam, exists, func, insert, inspect, or_, select, text, update
+from app.models import Bundle, BundleItem, BundleTag, FlightDeal, HotelDeal, IngestionOffset
+from app.models.bundle import DEAL_TYPES
+from app.models.keys import location_key
+
+# Rows backfilled per transaction
+BACKFILL_BATCH_SIZE = 10000
+
+
+def _add_missing_columns(engine: Engine, table, columns: List[str]) -> List[str]:
+    """Add key columns missing from an existing table; returns the ones added"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    added = [name for name in columns if name not in existing]
+    with engine.begin() as conn:
+        for name in added:
+            conn.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN {name} VARCHAR(255) NOT NULL DEFAULT ''"
+            ))
+    return added
+
+
+def _backfill_keys(
+    engine: Engine,
+    table,
+    sources: Dict[str, str],
+    normalize: Callable[[str], str]
+) -> int:
+    """Fill key columns (key -> source column) for rows whose keys are still empty"""
+    key_columns = [table.c[key] for key in sources]
+    source_columns = [table.c[source] for source in sources.values()]
+    statement = update(table).where(table.c.id == bindparam("row_id")).values(
+        {key: bindparam(key) for key in sources}
+    )
+    backfilled = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, *source_columns)
+                .where(
+                    table.c.id > last_id,
+                    *(column == "" for column in key_columns),
+                    or_(*(column != "" for column in source_columns))
+                )
+                .order_by(table.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return backfilled
+            conn.execute(statement, [
+                {"row_id": row[0], **{key: normalize(value) for key, value in zip(sources, row[1:])}}
+                for row in rows
+            ])
+        backfilled += len(rows)
+        last_id = rows[-1][0]
+
+
+def _create_missing_indexes(engine: Engine, table) -> List[str]:
+    """Create the model's indexes missing from the table; unique ones only if the data allows"""
+    inspector = inspect(engine)
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    columns = {column["name"] for column in inspector.get_columns(table.name)}
+    created = []
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        # Indexes over columns a later migration adds are created by that migration
+        if index.name in existing or any(column.name not in columns for column in index.columns):
+            continue
+        if index.unique:
+            unique_columns = list(index.columns)
+            with engine.connect() as conn:
+                duplicates = conn.execute(
+                    select(func.count()).select_from(
+                        select(*unique_columns).group_by(*unique_columns).having(func.count() > 1).subquery()
+                    )
+                ).scalar_one()
+            if duplicates:
+                print(
+                    f"Skipping unique index {index.name}: {duplicates} duplicate "
+                    f"({', '.join(column.name for column in unique_columns)}) value(s) in {table.name}"
+                )
+                continue
+        index.create(engine)
+        created.append(index.name)
+    return created
+
+
+def migrate_deal_lookup_keys(engine: Engine):
+    """Add, backfill and index the normalized location keys of the deal tables"""
+    for model, sources in (
+        (FlightDeal, {"origin_key": "origin", "destination_key": "destination"}),
+        (HotelDeal, {"city_key": "city"}),
+    ):
+        table = model.__table__
+        if not inspect(engine).has_table(table.name):
+            continue
+        added = _add_missing_columns(engine, table, list(sources))
+        backfilled = _backfill_keys(engine, table, sources, location_key)
+        created = _create_missing_indexes(engine, table)
+        if added or backfilled or created:
+            print(
+                f"Migrated {table.name}: added {added or 'no'} column(s), "
+                f"backfilled {backfilled} row(s), created {created or 'no'} index(es)"
+            )
+
+
+def _split_csv(value: str) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def migrate_bundle_contents(engine: Engine):
+    """Copy the comma-separated deal IDs and tags of bundles into bundle_items and bundle_tags"""
+    bundles = Bundle.__table__
+    items = BundleItem.__table__
+    tags = BundleTag.__table__
+    if not inspect(engine).has_table(bundles.name):
+        return
+    csv_columns = [bundles.c.flight_deal_ids, bundles.c.hotel_deal_ids, bundles.c.car_deal_ids]
+    created = _create_missing_indexes(engine, bundles)
+    migrated = 0
+    last_id = 0
+    while True:
+        # Contents are written in one transaction, so a bundle with neither items
+        # nor tags rows has not been migrated yet
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(bundles.c.id, *csv_columns, bundles.c.tags)
+                .where(
+                    bundles.c.id > last_id,
+                    ~exists().where(items.c.bundle_id == bundles.c.id),
+                    ~exists().where(tags.c.bundle_id == bundles.c.id),
+                    or_(*(column != "" for column in csv_columns), bundles.c.tags != "")
+                )
+                .order_by(bundles.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            item_rows = []
+            tag_rows = []
+            for bundle_id, *deal_ids, tag_csv in rows:
+                ids = [
+                    (deal_type, int(deal_id))
+                    for deal_type, csv in zip(DEAL_TYPES, deal_ids)
+                    for deal_id in _split_csv(csv) if deal_id.isdigit()
+                ]
+                item_rows.extend(
+                    {
+                        "bundle_id": bundle_id,
+                        "position": position,
+                        "deal_type": deal_type,
+                        "deal_id": deal_id
+                    }
+                    for position, (deal_type, deal_id) in enumerate(ids)
+                )
+                tag_rows.extend(
+                    {"bundle_id": bundle_id, "tag": tag} for tag in sorted(set(_split_csv(tag_csv)))
+                )
+            if item_rows:
+                conn.execute(insert(items), item_rows)
+            if tag_rows:
+                conn.execute(insert(tags), tag_rows)
+        migrated += len(rows)
+        last_id = rows[-1][0]
+    if migrated or created:
+        print(
+            f"Migrated {migrated} bundle(s) to {items.name} and {tags.name}, "
+            f"created {created or 'no'} index(es)"
+        )
+
+
+def migrate_bundle_composition_key(engine: Engine):
+    """Add and index the composition key used to reuse identical bundles"""
+    table = Bundle.__table__
+    if not inspect(engine).has_table(table.name):
+        return
+    # Existing bundles keep an empty key and are never matched for reuse
+    added = _add_missing_columns(engine, table, ["composition_key"])
+    created = _create_missing_indexes(engine, table)
+    if added or created:
+        print(
+            f"Migrated {table.name}: added {added or 'no'} column(s), "
+            f"created {created or 'no'} index(es)"
+        )
+
+
+def migrate_ingestion_offset_pruning(engine: Engine):
+    """Index ingestion offsets by update time for retention pruning"""
+    table = IngestionOffset.__table__
+    if not inspect(engine).has_table(table.name):
+        return
+    created = _create_missing_indexes(engine, table)
+    if created:
+        print(f"Migrated {table.name}: created {created} index(es)")
+
+
+MIGRATIONS = [
+    migrate_deal_lookup_keys,
+    migrate_bundle_contents,
+    migrate_bundle_composition_key,
+    migrate_ingestion_offset_pruning
+]
+
+
+def run_migrations(engine: Engine):
+    """Apply every migration in order"""
+    for migration in MIGRATIONS:
+        migration(engine)
+
+
+if __name__ == "__main__":
+    from app.db.session import engine
+    
+    run_migrations(engine)
@@ -16,6 +16,9 @@ engine = create_engine(DATABASE_URL, echo=False)
 def create_db_and_tables():
     """Create database tables"""
     SQLModel.metadata.create_all(engine)
+    # Bring tables created by older versions of the models up to date
+    from app.db.migrations import run_migrations
+    run_migrations(engine)
 
 
 def get_session() -> Generator[Session, None, None]:
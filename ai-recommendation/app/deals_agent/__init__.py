@@ -2,6 +2,7 @@
 from .deal_detector import DealDetector
 from .offer_tagger import OfferTagger
 from .ingestion_worker import IngestionWorker
+from .pipeline import FeedPipeline, PipelineStage
 
-__all__ = ["DealDetector", "OfferTagger", "IngestionWorker"]
+__all__ = ["DealDetector", "OfferTagger", "IngestionWorker", "FeedPipeline", "PipelineStage"]
 
@@ -2,20 +2,39 @@
 import asyncio
 import csv
 import os
+import random
+import time
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
+from app.data.load_checkpoint import LoadCheckpoint
+from app.kafka.codecs import codec_headers, get_feed_codec
 from app.kafka.producer import create_async_producer
 
 
 CSV_PATH = Path(__file__).resolve().parents[2] / "data" / "raw" / "hotel_prices_sample.csv"
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC_RAW_FEEDS", "raw_supplier_feeds")
-ROW_LIMIT = 100
+# Embedding the source row roughly doubles message size; opt in for debugging
+INCLUDE_RAW = os.getenv("CSV_PRODUCER_INCLUDE_RAW", "false").lower() == "true"
+# Rows per checkpointed batch; RESUME continues after the last acknowledged batch
+BATCH_SIZE = int(os.getenv("CSV_PRODUCER_BATCH_SIZE", "100"))
+RESUME = os.getenv("CSV_PRODUCER_RESUME", "false").lower() == "true"
+# Target send rate in messages/s; 0 sends as fast as the producer accepts them
+RATE = float(os.getenv("CSV_PRODUCER_RATE", "0"))
+# Replay the file from the top until MAX_MESSAGES are sent (0 = no limit)
+LOOP = os.getenv("CSV_PRODUCER_LOOP", "false").lower() == "true"
+MAX_MESSAGES = int(os.getenv("CSV_PRODUCER_MAX_MESSAGES", "0"))
+MAX_IN_FLIGHT = int(os.getenv("CSV_PRODUCER_MAX_IN_FLIGHT", "1000"))
+# Seconds between progress reports (0 reports only at the end)
+REPORT_INTERVAL = float(os.getenv("CSV_PRODUCER_REPORT_INTERVAL", "10"))
+# Latencies kept (reservoir-sampled) per report for the percentiles
+LATENCY_SAMPLES = 100000
 
 
-def build_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+def build_payload(row: Dict[str, Any], include_raw: bool = INCLUDE_RAW) -> Dict[str, Any]:
     """Map CSV row to the normalized payload expected downstream."""
-    return {
+    payload = {
         "source": "hotel_csv",
         "hotel_id": row.get("hotel_id") or row.get("listing_id"),
         "listing_id": row.get("listing_id") or row.get("hotel_id"),
@@ -24,25 +43,174 @@ def build_payload(row: Dict[str, Any]) -> Dict[str, Any]:
         "currency": row.get("currency") or "USD",
         "check_in": row.get("check_in") or row.get("checkin") or row.get("date"),
         "check_out": row.get("check_out") or row.get("checkout"),
-        "raw": row,  # keep original fields for debugging
     }
+    if include_raw:
+        payload["raw"] = row  # keep original fields for debugging
+    return payload
 
 
-async def produce_from_csv(csv_path: Path = CSV_PATH, row_limit: int = ROW_LIMIT):
-    producer = create_async_producer()
-    sent = 0
+def _sample(samples: List[float], seen: int, value: float):
+    """Reservoir-sample `value`, the seen-th observation, into a bounded list"""
+    if len(samples) < LATENCY_SAMPLES:
+        samples.append(value)
+    else:
+        index = random.randrange(seen)
+        if index < LATENCY_SAMPLES:
+            samples[index] = value
 
+
+def _percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no latency samples"
+    ordered = sorted(samples)
+    return ", ".join(
+        f"{label} {ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000:.1f} ms"
+        for label, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+    )
+
+
+class _SendStats:
+    """Send counters and delivery latencies of one producer run"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sent = 0
+        self.delivered = 0
+        self.failed = 0
+        self._run_latencies: List[float] = []
+        self._interval_latencies: List[float] = []
+        self._interval_started = self.started
+        self._interval_delivered = 0
+    
+    def record(self, latency: float, delivered: bool):
+        if not delivered:
+            self.failed += 1
+            return
+        self.delivered += 1
+        _sample(self._run_latencies, self.delivered, latency)
+        _sample(self._interval_latencies, self.delivered - self._interval_delivered, latency)
+    
+    def interval_report(self) -> str:
+        """Throughput and latencies since the previous interval report"""
+        now = time.perf_counter()
+        delivered = self.delivered - self._interval_delivered
+        report = (
+            f"{self.sent} sent, {self.delivered} delivered, {self.failed} failed; "
+            f"{delivered / max(now - self._interval_started, 1e-6):.0f} msg/s, "
+            f"{_percentiles(self._interval_latencies)}"
+        )
+        self._interval_latencies = []
+        self._interval_started = now
+        self._interval_delivered = self.delivered
+        return report
+    
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f"{self.delivered} delivered, {self.failed} failed in {elapsed:.1f}s "
+            f"({self.delivered / max(elapsed, 1e-6):.0f} msg/s); "
+            f"{_percentiles(self._run_latencies)}"
+        )
+
+
+async def produce_from_csv(
+    csv_path: Path = CSV_PATH,
+    rate: float = RATE,
+    loop: bool = LOOP,
+    max_messages: int = MAX_MESSAGES,
+    resume: bool = RESUME,
+    batch_size: int = BATCH_SIZE,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    report_interval: float = REPORT_INTERVAL
+):
+    """Stream a CSV file to Kafka at up to `rate` messages/s, once or in a loop
+    
+    Sends are pipelined: up to max_in_flight messages await acknowledgement
+    while later rows are sent. Delivery latency is measured from send to
+    acknowledgement. Looping runs are load tests and are not checkpointed.
+    """
+    codec = get_feed_codec()
+    producer = create_async_producer(codec)
+    headers = codec_headers(codec)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    stats = _SendStats()
+    checkpoint = None
+    
+    def on_delivery(delivery: asyncio.Future, started: float, seq: int):
+        in_flight.release()
+        delivered = not delivery.cancelled() and delivery.exception() is None
+        stats.record(time.perf_counter() - started, delivered)
+        checkpoint.ack(seq, delivered)
+    
     try:
+        checkpoint = LoadCheckpoint(
+            str(csv_path), "csv_producer", resume=resume and not loop, path="" if loop else None
+        )
+        if checkpoint.completed:
+            print(f"[CSV->Kafka] {csv_path} was already sent; nothing to resume.")
+            return
+        position = checkpoint.row
+        limit_reached = False
         await producer.start()
-        with csv_path.open(newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                payload = build_payload(row)
-                await producer.send_and_wait(KAFKA_TOPIC, value=payload)
-                sent += 1
-                if sent >= row_limit:
-                    break
-        print(f"[CSV->Kafka] Sent {sent} messages to topic '{KAFKA_TOPIC}' from {csv_path}")
+        next_report = time.perf_counter() + report_interval
+        
+        while not limit_reached:
+            pass_sent = stats.sent
+            with csv_path.open(newline="", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                if position:
+                    print(f"[CSV->Kafka] Resuming {csv_path} after row {position}")
+                    for _ in islice(reader, position):
+                        pass
+                
+                while True:
+                    count = batch_size
+                    if max_messages:
+                        count = min(count, max_messages - stats.sent)
+                        limit_reached = count <= 0
+                    rows = list(islice(reader, count)) if not limit_reached else []
+                    if not rows:
+                        break
+                    position += len(rows)
+                    seq = checkpoint.begin_batch(len(rows), 0, position)
+                    for row in rows:
+                        if rate > 0:
+                            # Run up to 1 ms ahead of schedule rather than sleep per message
+                            delay = stats.started + stats.sent / rate - time.perf_counter()
+                            if delay > 0.001:
+                                await asyncio.sleep(delay)
+                        await in_flight.acquire()
+                        started = time.perf_counter()
+                        try:
+                            delivery = await producer.send(
+                                KAFKA_TOPIC, value=build_payload(row), headers=headers
+                            )
+                        except Exception:
+                            in_flight.release()
+                            stats.failed += 1
+                            checkpoint.ack(seq, delivered=False)
+                            raise
+                        stats.sent += 1
+                        delivery.add_done_callback(
+                            lambda d, started=started, seq=seq: on_delivery(d, started, seq)
+                        )
+                        if report_interval and started >= next_report:
+                            print(f"[CSV->Kafka] {stats.interval_report()}")
+                            next_report = started + report_interval
+            
+            if not loop or stats.sent == pass_sent:
+                break
+            position = 0
+        
+        await producer.flush()
+        # Let the delivery callbacks of the last acknowledgements run
+        await asyncio.sleep(0)
+        if not limit_reached:
+            checkpoint.finish()
+        print(
+            f"[CSV->Kafka] Sent {stats.sent} messages to topic '{KAFKA_TOPIC}' from {csv_path}: "
+            f"{stats.summary()}"
+        )
     except FileNotFoundError:
         print(f"[CSV->Kafka] CSV not found at {csv_path}; nothing sent.")
     except Exception as exc:
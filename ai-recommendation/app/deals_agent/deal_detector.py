@@ -1,6 +1,8 @@
 """Deal detector - computes discounts and scores"""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Sequence, Tuple
 from datetime import datetime
+import numpy as np
+from app.schemas.feed_records import FlightFeed, HotelFeed
 
 
 class DealDetector:
@@ -64,6 +66,72 @@ class DealDetector:
         
         return min(score, 100.0)
     
+    @staticmethod
+    def calculate_discounts(original_prices: Sequence[float], current_prices: Sequence[float]) -> np.ndarray:
+        """Vectorized calculate_discount over arrays of prices"""
+        original = np.asarray(original_prices, dtype=np.float64)
+        current = np.asarray(current_prices, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            discounts = ((original - current) / original) * 100
+        return np.where(original <= 0, 0.0, discounts)
+    
+    @staticmethod
+    def calculate_deal_scores(
+        discount_percentage: Sequence[float],
+        price: Sequence[float],
+        availability: Sequence[float],
+        avg_price_30d: Optional[Sequence[float]] = None,
+        threshold: float = 60.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized calculate_deal_score; returns (deal_scores, is_good_deal mask)
+        
+        Each branch repeats the scalar arithmetic in the same order, so scores are
+        bit-for-bit identical to calculate_deal_score. A missing 30-day average is
+        passed as NaN (or 0).
+        """
+        discount = np.asarray(discount_percentage, dtype=np.float64)
+        price = np.asarray(price, dtype=np.float64)
+        availability = np.asarray(availability, dtype=np.float64)
+        
+        # Discount factor (0-50 points); min(x, 50) keeps x unless 50 < x
+        half_discount = discount * 0.5
+        discount_score = np.where(50 < half_discount, 50.0, half_discount)
+        
+        # Price factor (0-30 points); max(5, x) keeps 5 unless x > 5
+        tail_score = 10 - (price - 1000) * 0.01
+        price_score = np.select(
+            [price < 100, price < 500, price < 1000],
+            [30.0, 25 - (price - 100) * 0.05, 15 - (price - 500) * 0.02],
+            default=np.where(tail_score > 5, tail_score, 5.0)
+        )
+        
+        # Availability factor (0-20 points)
+        availability_score = np.select(
+            [availability > 10, availability > 5, availability > 0],
+            [20.0, 15.0, 10.0],
+            default=0.0
+        )
+        
+        score = 0.0 + discount_score
+        score = score + price_score
+        score = score + availability_score
+        
+        # Historical trend factor - only where a non-zero average exists and price is below it
+        if avg_price_30d is not None:
+            avg = np.asarray(avg_price_30d, dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                price_drop = ((avg - price) / avg) * 100
+            below_avg = (avg != 0) & (price < avg)
+            bonus = np.select(
+                [price_drop >= 15, price_drop >= 10, price_drop >= 5],
+                [15.0, 10.0, 5.0],
+                default=0.0
+            )
+            score = np.where(below_avg & (bonus > 0), score + bonus, score)
+        
+        score = np.where(100.0 < score, 100.0, score)
+        return score, score >= threshold
+    
     @staticmethod
     def is_good_deal(deal_score: float, threshold: float = 60.0) -> bool:
         """Determine if a deal is worth highlighting"""
@@ -120,4 +188,82 @@ class DealDetector:
             "is_good_deal": DealDetector.is_good_deal(deal_score),
             "historical_avg_30d": historical_data.get("avg_price_30d") if historical_data else None
         }
-
+    
+    @staticmethod
+    def detect_flight_deals(
+        flights: List[Dict[str, Any]],
+        historical_data: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Batch detect_flight_deal; historical_data is aligned with flights"""
+        if all(isinstance(f, FlightFeed) for f in flights):
+            # Typed records already carry resolved prices
+            original_prices = [f.original_price for f in flights]
+            current_prices = [f.price for f in flights]
+            availability = [f.available_seats for f in flights]
+        else:
+            original_prices = [f.get("original_price", f.get("price", 0)) for f in flights]
+            current_prices = [f.get("price", o) for f, o in zip(flights, original_prices)]
+            availability = [f.get("available_seats", 0) for f in flights]
+        
+        return DealDetector._detect_deals(
+            original_prices, current_prices, availability, historical_data,
+            "original_price", "discounted_price"
+        )
+    
+    @staticmethod
+    def detect_hotel_deals(
+        hotels: List[Dict[str, Any]],
+        historical_data: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Batch detect_hotel_deal; historical_data is aligned with hotels"""
+        if all(isinstance(h, HotelFeed) for h in hotels):
+            original_prices = [h.original_price for h in hotels]
+            current_prices = [h.price_per_night for h in hotels]
+            availability = [h.available_rooms for h in hotels]
+        else:
+            original_prices = [h.get("original_price", h.get("price_per_night", 0)) for h in hotels]
+            current_prices = [h.get("price_per_night", o) for h, o in zip(hotels, original_prices)]
+            availability = [h.get("available_rooms", 0) for h in hotels]
+        
+        return DealDetector._detect_deals(
+            original_prices, current_prices, availability, historical_data,
+            "original_price_per_night", "discounted_price_per_night"
+        )
+    
+    @staticmethod
+    def _detect_deals(
+        original_prices: List[Any],
+        current_prices: List[Any],
+        availability: List[Any],
+        historical_data: Optional[List[Optional[Dict[str, Any]]]],
+        original_key: str,
+        discounted_key: str
+    ) -> List[Dict[str, Any]]:
+        """Score aligned price lists and build detect_*_deal result dicts"""
+        if not original_prices:
+            return []
+        if historical_data is None:
+            historical_data = [None] * len(original_prices)
+        
+        historical_avgs = [h.get("avg_price_30d") if h else None for h in historical_data]
+        avg_prices = [np.nan if avg is None else avg for avg in historical_avgs]
+        
+        discounts = DealDetector.calculate_discounts(original_prices, current_prices)
+        scores, good = DealDetector.calculate_deal_scores(
+            discounts, current_prices, availability, avg_prices
+        )
+        
+        return [
+            {
+                original_key: original,
+                discounted_key: current,
+                "discount_percentage": discount,
+                "deal_score": score,
+                "is_good_deal": is_good,
+                "historical_avg_30d": avg
+            }
+            for original, current, discount, score, is_good, avg in zip(
+                original_prices, current_prices, discounts.tolist(),
+                scores.tolist(), good.tolist(), historical_avgs
+            )
+        ]
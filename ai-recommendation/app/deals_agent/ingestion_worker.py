@@ -1,24 +1,142 @@
 """Ingestion worker - Kafka consumer for raw_supplier_feeds"""
 import asyncio
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import delete
 from sqlmodel import Session, select
-from app.db.session import get_session
-from app.models import FlightDeal, HotelDeal
+from app.db.executor import DBExecutor
+from app.models import FlightDeal, HotelDeal, IngestionOffset
+from app.models.keys import feed_listing_key
 from app.deals_agent.deal_detector import DealDetector
 from app.deals_agent.offer_tagger import OfferTagger
 from app.data.price_history import PriceHistoryTracker
+from app.data.price_stats_cache import price_stats_cache
+from app.data.deal_index import deal_index
+from app.data.deal_leaderboard import deal_leaderboards
+from app.data.feed_fingerprint_cache import feed_fingerprint_cache, feed_fingerprint
+from app.deals_agent.pipeline import FeedPipeline, PipelineStage
 from app.kafka.consumer import KafkaConsumerClient
-from typing import Dict, Any
+from aiokafka import ConsumerRecord, TopicPartition
+from typing import Deque, Dict, Any, List, Optional, Tuple
 import os
 
+# Minimum time between prunes of stale ingestion offsets
+_OFFSET_PRUNE_INTERVAL_SECONDS = 3600
+
+
+class _FetchedBatch:
+    """Offsets of one fetched batch and how many lane chunks are still persisting"""
+    
+    __slots__ = ("offsets", "remaining", "failed")
+    
+    def __init__(self, offsets: Dict[TopicPartition, int], remaining: int):
+        self.offsets = offsets
+        self.remaining = remaining
+        # A chunk failed to persist; nothing at or past this batch is committed
+        self.failed = False
+
+
+class _FeedBatch:
+    """Flight and hotel feeds of one batch and the results of each processing step
+    
+    history, deal_infos and tags line up with entries; deal_infos and tags are
+    None for feeds that are not good deals. fingerprints holds the latest
+    fingerprint accepted per listing.
+    """
+    
+    __slots__ = (
+        "records", "entries", "unchanged", "replayed", "history", "deal_infos", "tags",
+        "fingerprints"
+    )
+    
+    def __init__(
+        self,
+        entries: List[Tuple[Optional[ConsumerRecord], Dict[str, Any]]],
+        records: Optional[List[ConsumerRecord]] = None
+    ):
+        self.records = records or []
+        self.entries = entries
+        self.unchanged = 0
+        self.replayed = 0
+        self.history: List[Optional[Dict[str, Any]]] = []
+        self.deal_infos: List[Optional[Dict[str, Any]]] = []
+        self.tags: List[Optional[List[str]]] = []
+        self.fingerprints: Dict[Tuple[str, str], int] = {}
+
 
 class IngestionWorker:
     """Worker that ingests supplier feeds from Kafka and processes them"""
     
-    def __init__(self):
+    # Chunks queued per lane before the fetch loop waits (backpressure)
+    LANE_QUEUE_SIZE = 2
+    
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        max_linger_ms: Optional[int] = None,
+        lanes: Optional[int] = None,
+        manual_commit: Optional[bool] = None,
+        pipeline: Optional[bool] = None
+    ):
         self.consumer = None
         self.running = False
         self.deal_detector = DealDetector()
         self.offer_tagger = OfferTagger()
+        # Batched mode is enabled when batch_size > 1: messages are pulled with
+        # getmany() and each batch is persisted in a single transaction.
+        self.batch_size = batch_size if batch_size is not None else int(
+            os.getenv("INGESTION_BATCH_SIZE", "1")
+        )
+        self.max_linger_ms = max_linger_ms if max_linger_ms is not None else int(
+            os.getenv("INGESTION_MAX_LINGER_MS", "500")
+        )
+        # Lanes > 1 partitions each batch by listing key across parallel lanes;
+        # a listing always maps to the same lane, so its updates stay ordered.
+        self.lanes = lanes if lanes is not None else int(os.getenv("INGESTION_LANES", "1"))
+        # Manual commit mode commits offsets after each batch's DB transaction and
+        # skips records whose key/offset is already persisted; lanes always use it.
+        if manual_commit is None:
+            manual_commit = os.getenv("INGESTION_MANUAL_COMMIT", "false").lower() == "true"
+        # Pipeline mode runs decode, lookup, scoring, tagging and persistence as
+        # separate stages connected by bounded queues
+        if pipeline is None:
+            pipeline = os.getenv("INGESTION_PIPELINE", "false").lower() == "true"
+        self.pipeline = pipeline
+        self.stage_concurrency = {
+            stage: int(os.getenv(f"INGESTION_{stage.upper()}_CONCURRENCY", "1"))
+            for stage in ("decode", "lookup", "score", "tag")
+        }
+        # Persistence splits each batch by message key into this many transactions
+        self.stage_concurrency["persist"] = int(
+            os.getenv("INGESTION_PERSIST_CONCURRENCY", str(self.lanes))
+        )
+        self.pipeline_queue_size = int(os.getenv("INGESTION_PIPELINE_QUEUE_SIZE", "2"))
+        self.manual_commit = manual_commit or self.lanes > 1 or self.pipeline
+        # Blocking SQLModel work runs on a bounded thread pool, one session per thread,
+        # sized by INGESTION_DB_WORKERS; the default lets every lane, or the lookup
+        # and persist stages at full concurrency, hold a thread at once
+        default_db_workers = max(
+            4,
+            self.lanes,
+            self.stage_concurrency["lookup"] + self.stage_concurrency["persist"]
+        )
+        self.db_executor = DBExecutor(
+            max_workers=int(os.getenv("INGESTION_DB_WORKERS", str(default_db_workers))),
+            thread_name_prefix="ingestion-db"
+        )
+        # Stored offsets only guard against redelivery, which never reaches back
+        # further than the topic's retention; older rows are pruned (0 = keep all)
+        self.offset_retention_hours = float(os.getenv("INGESTION_OFFSET_RETENTION_HOURS", "168"))
+        self._offsets_pruned_at: Optional[float] = None
+        self._pending_batch: Optional[asyncio.Task] = None
+        # Set once a batch fails to persist; offsets past it are never committed
+        self.halted = False
+        # Fingerprints of feeds accepted into batches that haven't committed yet
+        self._unpersisted_fingerprints: Dict[Tuple[str, str], int] = {}
+        self._inflight: Deque[_FetchedBatch] = deque()
+        self._commit_lock = asyncio.Lock()
     
     async def process_supplier_feed(self, topic: str, message: Dict[str, Any]):
         """Process a supplier feed message"""
@@ -39,143 +157,555 @@ class IngestionWorker:
     
     async def _process_flight_feed(self, flight_data: Dict[str, Any]):
         """Process flight feed and create/update deal"""
-        # Get database session
-        session_gen = get_session()
-        session = next(session_gen)
+        if not self._feed_changed(flight_data):
+            return
+        try:
+            if await self.db_executor.run(self._persist_flight_feed, flight_data):
+                print(f"Processed flight deal: {flight_data.get('airline')} {flight_data.get('flight_number')}")
+        except Exception as e:
+            print(f"Error saving flight deal: {e}")
+    
+    def _persist_flight_feed(self, session: Session, flight_data: Dict[str, Any]) -> bool:
+        """Score and upsert one flight feed; runs on the DB executor"""
+        self._stage_fingerprints(session, [flight_data])
+        # Get historical price data (30-day average)
+        listing_id = flight_data.get("flight_number", "")
+        historical_data = PriceHistoryTracker.get_historical_data(
+            session, "flight", listing_id
+        )
+        
+        # Detect deal with historical context
+        deal_info = DealDetector.detect_flight_deal(flight_data, historical_data)
+        
+        # Only process if it's a good deal
+        if not deal_info.get("is_good_deal"):
+            return False
+        
+        # Tag the offer
+        tags = OfferTagger.tag_flight(flight_data)
+        
+        # Check if deal already exists
+        statement = select(FlightDeal).where(
+            FlightDeal.airline == flight_data.get("airline"),
+            FlightDeal.flight_number == flight_data.get("flight_number")
+        )
+        existing = session.exec(statement).first()
+        
+        if existing:
+            # Update existing deal
+            deal = existing
+            self._update_flight_deal(deal, flight_data, deal_info, tags)
+        else:
+            # Create new deal
+            deal = self._new_flight_deal(flight_data, deal_info, tags)
+            session.add(deal)
+        
+        deal_index.stage_flight_deals(session, [deal])
+        deal_leaderboards.refresh_flights(session, [deal])
+        
+        # Store price point in history
+        if deal_info.get("discounted_price"):
+            now = datetime.now()
+            deal.last_price_update = now
+            PriceHistoryTracker.store_price_points(
+                session, "flight", [(listing_id, deal_info["discounted_price"])], now
+            )
         
+        return True
+    
+    async def _process_hotel_feed(self, hotel_data: Dict[str, Any]):
+        """Process hotel feed and create/update deal"""
+        if not self._feed_changed(hotel_data):
+            return
         try:
-            # Get historical price data (30-day average)
-            listing_id = flight_data.get("flight_number", "")
-            historical_data = PriceHistoryTracker.get_historical_data(
-                session, "flight", listing_id
+            if await self.db_executor.run(self._persist_hotel_feed, hotel_data):
+                print(f"Processed hotel deal: {hotel_data.get('name')}")
+        except Exception as e:
+            print(f"Error saving hotel deal: {e}")
+    
+    def _persist_hotel_feed(self, session: Session, hotel_data: Dict[str, Any]) -> bool:
+        """Score and upsert one hotel feed; runs on the DB executor"""
+        self._stage_fingerprints(session, [hotel_data])
+        # Get historical price data (30-day average)
+        listing_id = hotel_data.get("name", "")
+        historical_data = PriceHistoryTracker.get_historical_data(
+            session, "hotel", listing_id
+        )
+        
+        # Detect deal with historical context
+        deal_info = DealDetector.detect_hotel_deal(hotel_data, historical_data)
+        
+        # Only process if it's a good deal
+        if not deal_info.get("is_good_deal"):
+            return False
+        
+        # Tag the offer
+        tags = OfferTagger.tag_hotel(hotel_data)
+        
+        # Check if deal already exists
+        statement = select(HotelDeal).where(
+            HotelDeal.name == hotel_data.get("name"),
+            HotelDeal.city == hotel_data.get("city")
+        )
+        existing = session.exec(statement).first()
+        
+        if existing:
+            # Update existing deal
+            deal = existing
+            self._update_hotel_deal(deal, hotel_data, deal_info, tags)
+        else:
+            # Create new deal
+            deal = self._new_hotel_deal(hotel_data, deal_info, tags)
+            session.add(deal)
+        
+        deal_index.stage_hotel_deals(session, [deal])
+        deal_leaderboards.refresh_hotels(session, [deal])
+        
+        # Store price point in history
+        if deal_info.get("discounted_price_per_night"):
+            now = datetime.now()
+            deal.last_price_update = now
+            PriceHistoryTracker.store_price_points(
+                session, "hotel", [(listing_id, deal_info["discounted_price_per_night"])], now
             )
-            
-            # Detect deal with historical context
-            deal_info = DealDetector.detect_flight_deal(flight_data, historical_data)
-            
-            # Only process if it's a good deal
-            if not deal_info.get("is_good_deal"):
-                return
-            
-            # Tag the offer
-            tags = OfferTagger.tag_flight(flight_data)
-            
-            # Check if deal already exists
-            statement = select(FlightDeal).where(
-                FlightDeal.airline == flight_data.get("airline"),
-                FlightDeal.flight_number == flight_data.get("flight_number")
+        
+        return True
+    
+    async def process_supplier_feed_batch(self, messages: List[Dict[str, Any]]):
+        """Process a batch of supplier feed messages in a single transaction"""
+        batch = await self._collect_feeds([(None, message) for message in messages])
+        if not batch.entries:
+            return
+        
+        try:
+            flight_count, hotel_count = await self.db_executor.run(self._process_batch, batch)
+            print(
+                f"Processed batch of {len(messages)} feed(s): "
+                f"{flight_count} flight deal(s), {hotel_count} hotel deal(s), "
+                f"{batch.unchanged} unchanged"
             )
-            existing = session.exec(statement).first()
+            self._settle_fingerprints(batch)
+        except Exception as e:
+            self._unpersisted_fingerprints.clear()
+            print(f"Error saving feed batch: {e}")
+    
+    async def process_record_batch(self, records: List[ConsumerRecord]) -> bool:
+        """Process a batch of Kafka records in one transaction, skipping replayed ones
+        
+        Returns False if the batch failed to persist; its offsets must not be committed.
+        """
+        batch = await self._collect_feeds([(record, record.value) for record in records])
+        if not batch.entries:
+            return True
+        
+        try:
+            flight_count, hotel_count = await self.db_executor.run(self._process_batch, batch)
+            print(
+                f"Processed batch of {len(records)} feed(s): "
+                f"{flight_count} flight deal(s), {hotel_count} hotel deal(s), "
+                f"{batch.unchanged} unchanged, {batch.replayed} replayed"
+            )
+            self._settle_fingerprints(batch)
+            return True
+        except Exception as e:
+            print(f"Error saving feed batch: {e}")
+            return False
+    
+    async def _collect_feeds(
+        self,
+        entries: List[Tuple[Optional[ConsumerRecord], Dict[str, Any]]]
+    ) -> _FeedBatch:
+        """Gather changed flight and hotel feeds into a batch; other types are handled inline"""
+        batch = _FeedBatch([])
+        for record, message in entries:
+            listing_type = self._listing_type(message)
             
-            if existing:
-                # Update existing deal
-                existing.discounted_price = deal_info["discounted_price"]
-                existing.discount_percentage = deal_info["discount_percentage"]
-                existing.deal_score = deal_info["deal_score"]
-                existing.tags = ",".join(tags)
-                existing.available_seats = flight_data.get("available_seats", 0)
+            if listing_type in ("flight", "hotel"):
+                if self._accept_feed(batch, message):
+                    batch.entries.append((record, message))
+                else:
+                    batch.unchanged += 1
+            elif listing_type == "car":
+                await self._process_car_feed(message)
             else:
-                # Create new deal
-                deal = FlightDeal(
-                    airline=flight_data.get("airline", ""),
-                    flight_number=flight_data.get("flight_number", ""),
-                    origin=flight_data.get("origin", ""),
-                    destination=flight_data.get("destination", ""),
-                    departure_time=flight_data.get("departure_time"),
-                    arrival_time=flight_data.get("arrival_time"),
-                    original_price=deal_info["original_price"],
-                    discounted_price=deal_info["discounted_price"],
-                    discount_percentage=deal_info["discount_percentage"],
-                    deal_score=deal_info["deal_score"],
-                    tags=",".join(tags),
-                    available_seats=flight_data.get("available_seats", 0)
-                )
+                print(f"Unknown listing type: {listing_type}")
+        return batch
+    
+    def _accept_feed(self, batch: _FeedBatch, message: Dict[str, Any]) -> bool:
+        """Whether a feed changes its listing, given feeds accepted but not yet persisted
+        
+        Runs on the event loop, so accepted fingerprints are seen by every
+        batch collected after this one, even while this one is in flight.
+        """
+        if not feed_fingerprint_cache.enabled:
+            return True
+        listing_type, listing_id, fingerprint = self._feed_fingerprint(message)
+        key = (listing_type, listing_id)
+        if key in self._unpersisted_fingerprints:
+            if self._unpersisted_fingerprints[key] == fingerprint:
+                return False
+        elif not feed_fingerprint_cache.check(listing_type, listing_id, fingerprint):
+            return False
+        self._unpersisted_fingerprints[key] = fingerprint
+        batch.fingerprints[key] = fingerprint
+        return True
+    
+    def _settle_fingerprints(self, batch: _FeedBatch):
+        """Drop a persisted batch's fingerprints from the unpersisted ones
+        
+        The committed ones are in the fingerprint cache by now; entries a
+        later batch has replaced stay.
+        """
+        for key, fingerprint in batch.fingerprints.items():
+            if self._unpersisted_fingerprints.get(key) == fingerprint:
+                del self._unpersisted_fingerprints[key]
+    
+    @staticmethod
+    def _feed_fingerprint(message: Dict[str, Any]) -> Tuple[str, str, int]:
+        """Listing key and fingerprint of the price, availability and tags of a feed"""
+        if IngestionWorker._listing_type(message) == "flight":
+            return "flight", message.get("flight_number", ""), feed_fingerprint(
+                message.get("airline"),
+                message.get("price"),
+                message.get("original_price"),
+                message.get("available_seats"),
+                sorted(OfferTagger.tag_flight(message))
+            )
+        return "hotel", message.get("name", ""), feed_fingerprint(
+            message.get("city"),
+            message.get("price_per_night"),
+            message.get("original_price"),
+            message.get("available_rooms"),
+            sorted(OfferTagger.tag_hotel(message))
+        )
+    
+    def _feed_changed(self, message: Dict[str, Any]) -> bool:
+        """Whether a feed differs from the last one persisted for its listing"""
+        if not feed_fingerprint_cache.enabled:
+            return True
+        return feed_fingerprint_cache.check(*self._feed_fingerprint(message))
+    
+    def _stage_fingerprints(self, session: Session, messages):
+        """Record fingerprints of feeds persisted by the session once it commits"""
+        if feed_fingerprint_cache.enabled:
+            feed_fingerprint_cache.stage(
+                session, [self._feed_fingerprint(message) for message in messages]
+            )
+    
+    def _process_batch(self, session: Session, batch: _FeedBatch) -> Tuple[int, int]:
+        """Look up, score, tag and persist a batch; runs on the DB executor"""
+        self._lookup_batch(session, batch)
+        self._score_batch(batch)
+        self._tag_batch(batch)
+        return self._persist_batch(session, batch)
+    
+    def _lookup_batch(self, session: Session, batch: _FeedBatch):
+        """Drop already-persisted records and load 30-day history for the rest"""
+        keys = {
+            (record.topic, record.partition, self._message_key(record, message))
+            for record, message in batch.entries if record is not None
+        }
+        if keys:
+            stored = {
+                offset_key: row.last_offset
+                for offset_key, row in self._stored_offsets(session, keys).items()
+            }
+            fresh = []
+            for record, message in batch.entries:
+                if record is not None:
+                    last_offset = stored.get(
+                        (record.topic, record.partition, self._message_key(record, message))
+                    )
+                    if last_offset is not None and record.offset <= last_offset:
+                        batch.replayed += 1
+                        continue
+                fresh.append((record, message))
+            batch.entries = fresh
+        
+        flight_numbers = []
+        hotel_names = []
+        for _, message in batch.entries:
+            if self._listing_type(message) == "flight":
+                flight_numbers.append(message.get("flight_number", ""))
+            else:
+                hotel_names.append(message.get("name", ""))
+        
+        flight_history = PriceHistoryTracker.get_historical_data_batch(
+            session, "flight", flight_numbers
+        ) if flight_numbers else {}
+        hotel_history = PriceHistoryTracker.get_historical_data_batch(
+            session, "hotel", hotel_names
+        ) if hotel_names else {}
+        
+        batch.history = [
+            flight_history.get(message.get("flight_number", ""))
+            if self._listing_type(message) == "flight"
+            else hotel_history.get(message.get("name", ""))
+            for _, message in batch.entries
+        ]
+    
+    def _score_batch(self, batch: _FeedBatch):
+        """Score the batch with vectorized deal detection, keeping only good deals"""
+        batch.deal_infos = [None] * len(batch.entries)
+        flight_indexes = []
+        hotel_indexes = []
+        for index, (_, message) in enumerate(batch.entries):
+            if self._listing_type(message) == "flight":
+                flight_indexes.append(index)
+            else:
+                hotel_indexes.append(index)
+        
+        for indexes, detect in (
+            (flight_indexes, DealDetector.detect_flight_deals),
+            (hotel_indexes, DealDetector.detect_hotel_deals)
+        ):
+            if not indexes:
+                continue
+            deal_infos = detect(
+                [batch.entries[i][1] for i in indexes],
+                [batch.history[i] for i in indexes]
+            )
+            for index, deal_info in zip(indexes, deal_infos):
+                if deal_info.get("is_good_deal"):
+                    batch.deal_infos[index] = deal_info
+    
+    def _tag_batch(self, batch: _FeedBatch):
+        """Tag the good deals in the batch"""
+        batch.tags = [
+            None if deal_info is None
+            else OfferTagger.tag_flight(message) if self._listing_type(message) == "flight"
+            else OfferTagger.tag_hotel(message)
+            for (_, message), deal_info in zip(batch.entries, batch.deal_infos)
+        ]
+    
+    def _persist_batch(self, session: Session, batch: _FeedBatch) -> Tuple[int, int]:
+        """Upsert the batch's deals, price points and offsets; the caller commits"""
+        flights = []
+        hotels = []
+        for (_, message), deal_info, tags in zip(batch.entries, batch.deal_infos, batch.tags):
+            if deal_info is None:
+                continue
+            if self._listing_type(message) == "flight":
+                flights.append((message, deal_info, tags))
+            else:
+                hotels.append((message, deal_info, tags))
+        
+        now = datetime.now()
+        self._upsert_flight_deals(session, flights, now)
+        self._upsert_hotel_deals(session, hotels, now)
+        self._store_offsets(session, batch, now)
+        self._stage_fingerprints(session, (message for _, message in batch.entries))
+        return len(flights), len(hotels)
+    
+    def _upsert_flight_deals(
+        self,
+        session: Session,
+        scored: List[Tuple[Dict[str, Any], Dict[str, Any], List[str]]],
+        now: datetime
+    ):
+        """Create or update flight deals and record their price points"""
+        if not scored:
+            return
+        
+        # Resolve existing deals for the whole batch with one keyed query
+        flight_numbers = {flight_data.get("flight_number") for flight_data, _, _ in scored}
+        statement = select(FlightDeal).where(FlightDeal.flight_number.in_(flight_numbers))
+        deals: Dict[Tuple[Any, Any], FlightDeal] = {}
+        for deal in session.exec(statement).all():
+            deals.setdefault((deal.airline, deal.flight_number), deal)
+        
+        price_points = []
+        upserted = []
+        for flight_data, deal_info, tags in scored:
+            key = (flight_data.get("airline"), flight_data.get("flight_number"))
+            deal = deals.get(key)
+            if deal:
+                self._update_flight_deal(deal, flight_data, deal_info, tags)
+            else:
+                deal = self._new_flight_deal(flight_data, deal_info, tags)
                 session.add(deal)
+                deals[key] = deal
+            upserted.append(deal)
             
-            # Store price point in history
             if deal_info.get("discounted_price"):
-                PriceHistoryTracker.store_price_point(
-                    session, "flight", listing_id, deal_info["discounted_price"]
+                deal.last_price_update = now
+                price_points.append(
+                    (flight_data.get("flight_number", ""), deal_info["discounted_price"])
                 )
-            
-            session.commit()
-            print(f"Processed flight deal: {flight_data.get('airline')} {flight_data.get('flight_number')}")
         
-        except Exception as e:
-            session.rollback()
-            print(f"Error saving flight deal: {e}")
-        finally:
-            session.close()
+        PriceHistoryTracker.store_price_points(session, "flight", price_points, now)
+        deal_index.stage_flight_deals(session, upserted)
+        deal_leaderboards.refresh_flights(session, upserted)
     
-    async def _process_hotel_feed(self, hotel_data: Dict[str, Any]):
-        """Process hotel feed and create/update deal"""
-        # Get database session
-        session_gen = get_session()
-        session = next(session_gen)
+    def _upsert_hotel_deals(
+        self,
+        session: Session,
+        scored: List[Tuple[Dict[str, Any], Dict[str, Any], List[str]]],
+        now: datetime
+    ):
+        """Create or update hotel deals and record their price points"""
+        if not scored:
+            return
         
-        try:
-            # Get historical price data (30-day average)
-            listing_id = hotel_data.get("name", "")
-            historical_data = PriceHistoryTracker.get_historical_data(
-                session, "hotel", listing_id
-            )
-            
-            # Detect deal with historical context
-            deal_info = DealDetector.detect_hotel_deal(hotel_data, historical_data)
-            
-            # Only process if it's a good deal
-            if not deal_info.get("is_good_deal"):
-                return
-            
-            # Tag the offer
-            tags = OfferTagger.tag_hotel(hotel_data)
-            
-            # Check if deal already exists
-            statement = select(HotelDeal).where(
-                HotelDeal.name == hotel_data.get("name"),
-                HotelDeal.city == hotel_data.get("city")
-            )
-            existing = session.exec(statement).first()
-            
-            if existing:
-                # Update existing deal
-                existing.discounted_price_per_night = deal_info["discounted_price_per_night"]
-                existing.discount_percentage = deal_info["discount_percentage"]
-                existing.deal_score = deal_info["deal_score"]
-                existing.tags = ",".join(tags)
-                existing.available_rooms = hotel_data.get("available_rooms", 0)
+        # Resolve existing deals for the whole batch with one keyed query
+        names = {hotel_data.get("name") for hotel_data, _, _ in scored}
+        statement = select(HotelDeal).where(HotelDeal.name.in_(names))
+        deals: Dict[Tuple[Any, Any], HotelDeal] = {}
+        for deal in session.exec(statement).all():
+            deals.setdefault((deal.name, deal.city), deal)
+        
+        price_points = []
+        upserted = []
+        for hotel_data, deal_info, tags in scored:
+            key = (hotel_data.get("name"), hotel_data.get("city"))
+            deal = deals.get(key)
+            if deal:
+                self._update_hotel_deal(deal, hotel_data, deal_info, tags)
             else:
-                # Create new deal
-                deal = HotelDeal(
-                    name=hotel_data.get("name", ""),
-                    city=hotel_data.get("city", ""),
-                    state=hotel_data.get("state"),
-                    country=hotel_data.get("country", ""),
-                    address=hotel_data.get("address", ""),
-                    original_price_per_night=deal_info["original_price_per_night"],
-                    discounted_price_per_night=deal_info["discounted_price_per_night"],
-                    discount_percentage=deal_info["discount_percentage"],
-                    deal_score=deal_info["deal_score"],
-                    tags=",".join(tags),
-                    available_rooms=hotel_data.get("available_rooms", 0),
-                    rating=hotel_data.get("rating")
-                )
+                deal = self._new_hotel_deal(hotel_data, deal_info, tags)
                 session.add(deal)
+                deals[key] = deal
+            upserted.append(deal)
             
-            # Store price point in history
             if deal_info.get("discounted_price_per_night"):
-                PriceHistoryTracker.store_price_point(
-                    session, "hotel", listing_id, deal_info["discounted_price_per_night"]
+                deal.last_price_update = now
+                price_points.append(
+                    (hotel_data.get("name", ""), deal_info["discounted_price_per_night"])
                 )
-            
-            session.commit()
-            print(f"Processed hotel deal: {hotel_data.get('name')}")
         
-        except Exception as e:
-            session.rollback()
-            print(f"Error saving hotel deal: {e}")
-        finally:
-            session.close()
+        PriceHistoryTracker.store_price_points(session, "hotel", price_points, now)
+        deal_index.stage_hotel_deals(session, upserted)
+        deal_leaderboards.refresh_hotels(session, upserted)
+    
+    def _store_offsets(self, session: Session, batch: _FeedBatch, now: datetime):
+        """Advance the stored offset of every message key persisted in the batch"""
+        latest: Dict[Tuple[str, int, str], int] = {}
+        for record, message in batch.entries:
+            if record is not None:
+                offset_key = (record.topic, record.partition, self._message_key(record, message))
+                latest[offset_key] = max(record.offset, latest.get(offset_key, -1))
+        if not latest:
+            return
+        
+        stored = self._stored_offsets(session, latest)
+        for (topic, partition, key), offset in latest.items():
+            row = stored.get((topic, partition, key))
+            if row is None:
+                session.add(IngestionOffset(
+                    topic=topic,
+                    partition_id=partition,
+                    message_key=key,
+                    last_offset=offset,
+                    updated_at=now
+                ))
+            else:
+                row.last_offset = max(row.last_offset, offset)
+                row.updated_at = now
+                session.add(row)
+        self._prune_offsets(session, now)
+    
+    @staticmethod
+    def _stored_offsets(session: Session, offset_keys) -> Dict[Tuple[str, int, str], IngestionOffset]:
+        """Stored offset rows of the given (topic, partition, message key) triples"""
+        keys_by_partition: Dict[Tuple[str, int], List[str]] = {}
+        for topic, partition, key in offset_keys:
+            keys_by_partition.setdefault((topic, partition), []).append(key)
+        # One query per partition, so each is a seek on the full primary key
+        stored = {}
+        for (topic, partition), keys in keys_by_partition.items():
+            statement = select(IngestionOffset).where(
+                IngestionOffset.topic == topic,
+                IngestionOffset.partition_id == partition,
+                IngestionOffset.message_key.in_(keys)
+            )
+            for row in session.exec(statement).all():
+                stored[(row.topic, row.partition_id, row.message_key)] = row
+        return stored
+    
+    def _prune_offsets(self, session: Session, now: datetime):
+        """Delete offsets not advanced within the retention, at most once per interval"""
+        if self.offset_retention_hours <= 0:
+            return
+        if self._offsets_pruned_at is not None and (
+            time.monotonic() - self._offsets_pruned_at < _OFFSET_PRUNE_INTERVAL_SECONDS
+        ):
+            return
+        self._offsets_pruned_at = time.monotonic()
+        session.execute(delete(IngestionOffset).where(
+            IngestionOffset.updated_at < now - timedelta(hours=self.offset_retention_hours)
+        ))
+    
+    @staticmethod
+    def _new_flight_deal(
+        flight_data: Dict[str, Any],
+        deal_info: Dict[str, Any],
+        tags: List[str]
+    ) -> FlightDeal:
+        """Build a new flight deal row from a scored feed"""
+        return FlightDeal(
+            airline=flight_data.get("airline", ""),
+            flight_number=flight_data.get("flight_number", ""),
+            origin=flight_data.get("origin", ""),
+            destination=flight_data.get("destination", ""),
+            departure_time=flight_data.get("departure_time"),
+            arrival_time=flight_data.get("arrival_time"),
+            original_price=deal_info["original_price"],
+            discounted_price=deal_info["discounted_price"],
+            discount_percentage=deal_info["discount_percentage"],
+            deal_score=deal_info["deal_score"],
+            tags=",".join(tags),
+            available_seats=flight_data.get("available_seats", 0)
+        )
+    
+    @staticmethod
+    def _update_flight_deal(
+        deal: FlightDeal,
+        flight_data: Dict[str, Any],
+        deal_info: Dict[str, Any],
+        tags: List[str]
+    ):
+        """Apply a scored feed to an existing flight deal row"""
+        deal.discounted_price = deal_info["discounted_price"]
+        deal.discount_percentage = deal_info["discount_percentage"]
+        deal.deal_score = deal_info["deal_score"]
+        deal.tags = ",".join(tags)
+        deal.available_seats = flight_data.get("available_seats", 0)
+    
+    @staticmethod
+    def _new_hotel_deal(
+        hotel_data: Dict[str, Any],
+        deal_info: Dict[str, Any],
+        tags: List[str]
+    ) -> HotelDeal:
+        """Build a new hotel deal row from a scored feed"""
+        return HotelDeal(
+            name=hotel_data.get("name", ""),
+            city=hotel_data.get("city", ""),
+            state=hotel_data.get("state"),
+            country=hotel_data.get("country", ""),
+            address=hotel_data.get("address", ""),
+            original_price_per_night=deal_info["original_price_per_night"],
+            discounted_price_per_night=deal_info["discounted_price_per_night"],
+            discount_percentage=deal_info["discount_percentage"],
+            deal_score=deal_info["deal_score"],
+            tags=",".join(tags),
+            available_rooms=hotel_data.get("available_rooms", 0),
+            rating=hotel_data.get("rating")
+        )
+    
+    @staticmethod
+    def _update_hotel_deal(
+        deal: HotelDeal,
+        hotel_data: Dict[str, Any],
+        deal_info: Dict[str, Any],
+        tags: List[str]
+    ):
+        """Apply a scored feed to an existing hotel deal row"""
+        deal.discounted_price_per_night = deal_info["discounted_price_per_night"]
+        deal.discount_percentage = deal_info["discount_percentage"]
+        deal.deal_score = deal_info["deal_score"]
+        deal.tags = ",".join(tags)
+        deal.available_rooms = hotel_data.get("available_rooms", 0)
     
     async def _process_car_feed(self, car_data: Dict[str, Any]):
         """Process car feed (placeholder)"""
@@ -185,18 +715,361 @@ class IngestionWorker:
     async def start(self):
         """Start the ingestion worker"""
         topics = [os.getenv("KAFKA_TOPIC_RAW_FEEDS", "raw_supplier_feeds")]
-        self.consumer = KafkaConsumerClient(topics=topics, group_id="ai-recommendation-ingestion")
+        self.consumer = KafkaConsumerClient(
+            topics=topics,
+            group_id="ai-recommendation-ingestion",
+            # In manual commit mode offsets are committed once their batch is persisted
+            enable_auto_commit=not self.manual_commit,
+            # The pipeline's decode stage deserializes values itself
+            decode_values=not self.pipeline,
+            typed_records=True
+        )
+        
+        self.running = True
+        
+        if price_stats_cache.enabled:
+            try:
+                warmed = await self.db_executor.run(price_stats_cache.warm)
+                print(f"Warmed price stats cache with {warmed} listing(s)")
+            except Exception as e:
+                print(f"Error warming price stats cache: {e}")
+        
+        if deal_index.enabled:
+            try:
+                indexed = await self.db_executor.run(deal_index.rebuild)
+                print(f"Built deal index with {indexed} active deal(s)")
+            except Exception as e:
+                print(f"Error building deal index: {e}")
+        
+        if deal_leaderboards.enabled:
+            try:
+                boards = await self.db_executor.run(deal_leaderboards.rebuild)
+                print(f"Rebuilt {boards} deal leaderboard(s)")
+            except Exception as e:
+                print(f"Error rebuilding deal leaderboards: {e}")
+        
+        try:
+            loaded = feed_fingerprint_cache.load()
+            if loaded:
+                print(f"Loaded {loaded} feed fingerprint(s)")
+        except Exception as e:
+            print(f"Error loading feed fingerprints: {e}")
+        
+        if self.pipeline:
+            concurrency = ", ".join(
+                f"{stage}={count}" for stage, count in self.stage_concurrency.items()
+            )
+            print(
+                f"Starting ingestion worker in pipeline mode "
+                f"(batch_size={self.batch_size}, {concurrency})..."
+            )
+            await self._run_pipeline()
+            return
+        
+        if self.lanes > 1:
+            print(
+                f"Starting ingestion worker with {self.lanes} lanes "
+                f"(batch_size={self.batch_size}, max_linger_ms={self.max_linger_ms})..."
+            )
+            await self._run_lanes()
+            return
+        
+        if self.manual_commit:
+            print(
+                f"Starting ingestion worker with manual offset commits "
+                f"(batch_size={self.batch_size}, max_linger_ms={self.max_linger_ms})..."
+            )
+            try:
+                await self.consumer.consume_record_batches(
+                    self._submit_record_batch,
+                    max_records=self.batch_size,
+                    max_linger_ms=self.max_linger_ms
+                )
+            finally:
+                await self._wait_for_pending_batch()
+                await self.consumer.stop()
+            return
+        
+        if self.batch_size > 1:
+            print(
+                f"Starting ingestion worker in batched mode "
+                f"(batch_size={self.batch_size}, max_linger_ms={self.max_linger_ms})..."
+            )
+            try:
+                await self.consumer.consume_batches(
+                    self._submit_batch,
+                    max_records=self.batch_size,
+                    max_linger_ms=self.max_linger_ms
+                )
+            finally:
+                await self._wait_for_pending_batch()
+            return
         
         async def message_handler(topic: str, message: Dict[str, Any]):
             await self.process_supplier_feed(topic, message)
         
-        self.running = True
         print("Starting ingestion worker...")
         await self.consumer.consume(message_handler)
     
+    async def _submit_batch(self, messages: List[Dict[str, Any]]):
+        """Hand a batch off for persistence so the next fetch overlaps with it"""
+        # Batches are persisted one at a time so updates to a listing land in order
+        await self._wait_for_pending_batch()
+        self._pending_batch = asyncio.create_task(self.process_supplier_feed_batch(messages))
+    
+    async def _submit_record_batch(self, records: List[ConsumerRecord]):
+        """Hand a record batch off for persistence, committing its offsets afterwards"""
+        await self._wait_for_pending_batch()
+        if self.halted:
+            return
+        self._pending_batch = asyncio.create_task(self._persist_and_commit(records))
+    
+    async def _persist_and_commit(self, records: List[ConsumerRecord]):
+        """Persist a record batch, then commit the offsets it covers"""
+        if await self.process_record_batch(records):
+            await self._commit_offsets(self._next_offsets(records))
+        else:
+            self._halt("a feed batch failed to persist")
+    
+    def _halt(self, reason: str):
+        """Stop consuming and committing after a batch was lost
+        
+        Committed offsets stay before the failed batch, so it is redelivered
+        once the worker is restarted.
+        """
+        if self.halted:
+            return
+        self.halted = True
+        # Batches in flight are never persisted, so their feeds must not be
+        # skipped when redelivered
+        self._unpersisted_fingerprints.clear()
+        print(f"Stopping ingestion: {reason}; offsets stay at the last persisted batch")
+        if self.consumer:
+            self.consumer.running = False
+    
+    async def _wait_for_pending_batch(self):
+        """Wait for the in-flight batch, if any, to be persisted"""
+        if self._pending_batch:
+            await self._pending_batch
+            self._pending_batch = None
+    
+    @staticmethod
+    def _listing_type(message: Dict[str, Any]) -> str:
+        """Normalized listing type of a feed message"""
+        return (message.get("type") or "").lower()
+    
+    @staticmethod
+    def _message_key(record: ConsumerRecord, message: Optional[Dict[str, Any]] = None) -> str:
+        """Routing and idempotency key of a record: the listing its feed writes to
+        
+        Producers' Kafka keys (e.g. Airbnb listing IDs) can split one deal or
+        price history across keys, so the key always comes from the value.
+        """
+        return feed_listing_key(record.value if message is None else message)
+    
+    @staticmethod
+    def _next_offsets(records: List[ConsumerRecord]) -> Dict[TopicPartition, int]:
+        """Offsets to commit once the given records are persisted"""
+        offsets: Dict[TopicPartition, int] = {}
+        for record in records:
+            tp = TopicPartition(record.topic, record.partition)
+            offsets[tp] = max(record.offset + 1, offsets.get(tp, 0))
+        return offsets
+    
+    def _lane_for(self, record: ConsumerRecord) -> int:
+        """Route a record to a lane by the listing it writes to"""
+        return zlib.crc32(self._message_key(record).encode("utf-8")) % self.lanes
+    
+    async def _run_lanes(self):
+        """Fetch batches, fan them out to lanes by listing key and commit behind them"""
+        queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=self.LANE_QUEUE_SIZE) for _ in range(self.lanes)
+        ]
+        lane_tasks = [asyncio.create_task(self._lane_loop(queue)) for queue in queues]
+        
+        async def dispatch(records: List[ConsumerRecord]):
+            chunks: List[List[ConsumerRecord]] = [[] for _ in range(self.lanes)]
+            for record in records:
+                chunks[self._lane_for(record)].append(record)
+            
+            fetched = _FetchedBatch(
+                self._next_offsets(records),
+                remaining=sum(1 for chunk in chunks if chunk)
+            )
+            self._inflight.append(fetched)
+            for queue, chunk in zip(queues, chunks):
+                if chunk:
+                    # Blocks when a lane falls behind, which pauses fetching
+                    await queue.put((chunk, fetched))
+        
+        try:
+            await self.consumer.consume_record_batches(
+                dispatch,
+                max_records=self.batch_size,
+                max_linger_ms=self.max_linger_ms
+            )
+        finally:
+            for queue in queues:
+                await queue.put(None)
+            await asyncio.gather(*lane_tasks)
+            await self._commit_persisted_offsets()
+            await self.consumer.stop()
+    
+    async def _lane_loop(self, queue: asyncio.Queue):
+        """Persist chunks for one lane in arrival order"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            records, fetched = item
+            # After a failure, later chunks are drained unpersisted; they are
+            # redelivered with the failed one, in order
+            if self.halted:
+                continue
+            if not await self.process_record_batch(records):
+                fetched.failed = True
+                self._halt("a lane chunk failed to persist")
+                continue
+            fetched.remaining -= 1
+            await self._commit_persisted_offsets()
+    
+    async def _commit_persisted_offsets(self):
+        """Commit offsets of the leading fetched batches that every lane has persisted"""
+        async with self._commit_lock:
+            offsets: Dict[TopicPartition, int] = {}
+            while (
+                self._inflight
+                and self._inflight[0].remaining == 0
+                and not self._inflight[0].failed
+            ):
+                offsets.update(self._inflight.popleft().offsets)
+            await self._commit_offsets(offsets)
+    
+    async def _commit_offsets(self, offsets: Dict[TopicPartition, int]):
+        """Commit offsets to Kafka, logging failures; nothing is committed once halted"""
+        if not offsets or self.halted:
+            return
+        try:
+            await self.consumer.commit(offsets)
+        except Exception as e:
+            print(f"Error committing offsets: {e}")
+    
+    async def _run_pipeline(self):
+        """Feed fetched batches through the staged pipeline, committing behind persistence"""
+        pipeline = FeedPipeline(
+            [
+                PipelineStage("decode", self._decode_stage, self.stage_concurrency["decode"]),
+                PipelineStage("lookup", self._lookup_stage, self.stage_concurrency["lookup"]),
+                PipelineStage("score", self._score_stage, self.stage_concurrency["score"]),
+                PipelineStage("tag", self._tag_stage, self.stage_concurrency["tag"]),
+                # One batch at a time so updates to a listing land in order
+                PipelineStage("persist", self._persist_stage, 1)
+            ],
+            queue_size=self.pipeline_queue_size,
+            sink=self._commit_batch,
+            on_error=self._on_stage_error
+        )
+        await pipeline.start()
+        
+        async def submit(records: List[ConsumerRecord]):
+            # Blocks while the pipeline is full, which pauses fetching
+            await pipeline.submit(records)
+        
+        try:
+            await self.consumer.consume_record_batches(
+                submit,
+                max_records=self.batch_size,
+                max_linger_ms=self.max_linger_ms
+            )
+        finally:
+            await pipeline.close()
+            await self.consumer.stop()
+    
+    async def _decode_stage(self, records: List[ConsumerRecord]) -> _FeedBatch:
+        """Deserialize record values and gather the flight and hotel feeds"""
+        messages = await asyncio.to_thread(
+            lambda: [self.consumer.decode_record(record) for record in records]
+        )
+        batch = await self._collect_feeds(list(zip(records, messages)))
+        batch.records = records
+        return batch
+    
+    async def _lookup_stage(self, batch: _FeedBatch) -> _FeedBatch:
+        """Drop replayed records and load historical prices"""
+        if batch.entries:
+            await self.db_executor.run(self._lookup_batch, batch)
+        return batch
+    
+    async def _score_stage(self, batch: _FeedBatch) -> _FeedBatch:
+        """Score the batch off the event loop"""
+        if batch.entries:
+            await asyncio.to_thread(self._score_batch, batch)
+        return batch
+    
+    async def _tag_stage(self, batch: _FeedBatch) -> _FeedBatch:
+        """Tag the batch off the event loop"""
+        if batch.entries:
+            await asyncio.to_thread(self._tag_batch, batch)
+        return batch
+    
+    async def _persist_stage(self, batch: _FeedBatch) -> _FeedBatch:
+        """Persist the batch as key-partitioned transactions run in parallel"""
+        if self.halted:
+            return batch
+        if not batch.entries:
+            self._settle_fingerprints(batch)
+            return batch
+        
+        partitions = self._partition_batch(batch, self.stage_concurrency["persist"])
+        counts = await asyncio.gather(
+            *(self.db_executor.run(self._persist_batch, part) for part in partitions)
+        )
+        print(
+            f"Processed batch of {len(batch.records)} feed(s): "
+            f"{sum(flights for flights, _ in counts)} flight deal(s), "
+            f"{sum(hotels for _, hotels in counts)} hotel deal(s), "
+            f"{batch.unchanged} unchanged, {batch.replayed} replayed"
+        )
+        self._settle_fingerprints(batch)
+        return batch
+    
+    async def _on_stage_error(self, stage: PipelineStage, item: Any, error: Exception):
+        """Log a failed pipeline item and halt, so it is redelivered after a restart"""
+        print(f"Error in {stage.name} stage: {error}")
+        self._halt(f"a batch failed in the {stage.name} stage")
+    
+    async def _commit_batch(self, batch: _FeedBatch):
+        """Commit the offsets of a persisted batch"""
+        await self._commit_offsets(self._next_offsets(batch.records))
+    
+    def _partition_batch(self, batch: _FeedBatch, count: int) -> List[_FeedBatch]:
+        """Split a processed batch by message key into at most count batches"""
+        if count <= 1:
+            return [batch]
+        
+        partitions = [_FeedBatch([]) for _ in range(count)]
+        for index, (record, message) in enumerate(batch.entries):
+            key = self._message_key(record, message)
+            part = partitions[zlib.crc32(key.encode("utf-8")) % count]
+            part.entries.append((record, message))
+            part.history.append(batch.history[index])
+            part.deal_infos.append(batch.deal_infos[index])
+            part.tags.append(batch.tags[index])
+        return [part for part in partitions if part.entries]
+    
     async def stop(self):
         """Stop the ingestion worker"""
         self.running = False
+        # Let the in-flight batch persist and commit before the consumer goes away
+        await self._wait_for_pending_batch()
         if self.consumer:
             await self.consumer.stop()
+        self.db_executor.shutdown()
+        
+        if feed_fingerprint_cache.enabled:
+            print(f"Feed fingerprint cache: {feed_fingerprint_cache.stats()}")
+            try:
+                feed_fingerprint_cache.save()
+            except Exception as e:
+                print(f"Error saving feed fingerprints: {e}")
 
@@ -0,0 +1,128 @@
+"""Staged processing pipeline connected by bounded asyncio queues"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+# Marks the end of the stream as it drains through the stages
+_DONE = object()
+
+
+class PipelineStage:
+    """A named pipeline step handled by up to `concurrency` items at a time"""
+    
+    __slots__ = ("name", "handler", "concurrency")
+    
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        concurrency: int = 1
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+
+
+class FeedPipeline:
+    """Runs items through a chain of stages connected by bounded queues
+    
+    Each stage handles up to its concurrency in items at once but passes
+    results on in arrival order, so the pipeline as a whole preserves order.
+    When a stage falls behind, the queues in front of it fill up and submit()
+    blocks, pausing whatever feeds the pipeline. An item whose handler raises
+    is dropped and reported to on_error (or logged), and the pipeline is
+    marked failed: from then on no stage passes results on, so the sink never
+    sees an item that came after a lost one. Results of the last stage go to
+    the sink.
+    """
+    
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        queue_size: int = 2,
+        sink: Optional[Callable[[Any], Awaitable[None]]] = None,
+        on_error: Optional[Callable[[PipelineStage, Any, Exception], Awaitable[None]]] = None
+    ):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.sink = sink
+        self.on_error = on_error
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self.failed = False
+    
+    async def start(self):
+        """Start one worker per stage"""
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for index, stage in enumerate(self.stages):
+            outbox = self._queues[index + 1] if index + 1 < len(self.stages) else None
+            self._tasks.append(
+                asyncio.create_task(self._run_stage(stage, self._queues[index], outbox))
+            )
+    
+    async def submit(self, item: Any):
+        """Queue an item for the first stage, waiting while the pipeline is full"""
+        await self._queues[0].put(item)
+    
+    async def close(self):
+        """Drain queued items through every stage and stop the workers"""
+        if not self._tasks:
+            return
+        await self._queues[0].put(_DONE)
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+    
+    async def _run_stage(
+        self,
+        stage: PipelineStage,
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue]
+    ):
+        """Start handlers for incoming items, bounded by the stage's concurrency"""
+        slots = asyncio.Semaphore(stage.concurrency)
+        in_flight: asyncio.Queue = asyncio.Queue()
+        forwarder = asyncio.create_task(self._forward(stage, in_flight, slots, outbox))
+        
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await in_flight.put(_DONE)
+                break
+            await slots.acquire()
+            await in_flight.put((item, asyncio.create_task(stage.handler(item))))
+        
+        await forwarder
+    
+    async def _forward(
+        self,
+        stage: PipelineStage,
+        in_flight: asyncio.Queue,
+        slots: asyncio.Semaphore,
+        outbox: Optional[asyncio.Queue]
+    ):
+        """Pass handler results downstream in the order the items arrived"""
+        while True:
+            entry = await in_flight.get()
+            if entry is _DONE:
+                if outbox is not None:
+                    await outbox.put(_DONE)
+                return
+            
+            item, task = entry
+            try:
+                result = await task
+            except Exception as e:
+                result = None
+                self.failed = True
+                if self.on_error:
+                    await self.on_error(stage, item, e)
+                else:
+                    print(f"Error in {stage.name} stage: {e}")
+            
+            # The slot is held until the result is handed on, so a full
+            # downstream queue also stops this stage from starting new items
+            if result is not None and not self.failed:
+                if outbox is not None:
+                    await outbox.put(result)
+                elif self.sink:
+                    await self.sink(result)
+            slots.release()
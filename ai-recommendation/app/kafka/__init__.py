@@ -1,6 +1,31 @@
 """Kafka package"""
-from .producer import KafkaProducerClient, kafka_producer
+from .producer import KafkaProducerClient
 from .consumer import KafkaConsumerClient
+from .codecs import (
+    JsonCodec,
+    OrjsonCodec,
+    FeedBinaryCodec,
+    get_codec,
+    get_feed_codec,
+    codec_headers,
+)
 
-__all__ = ["KafkaProducerClient", "kafka_producer", "KafkaConsumerClient"]
+__all__ = [
+    "KafkaProducerClient",
+    "kafka_producer",
+    "KafkaConsumerClient",
+    "JsonCodec",
+    "OrjsonCodec",
+    "FeedBinaryCodec",
+    "get_codec",
+    "get_feed_codec",
+    "codec_headers",
+]
 
+
+def __getattr__(name: str):
+    # kafka_producer connects on first access; see app.kafka.producer
+    if name == "kafka_producer":
+        from . import producer
+        return producer.kafka_producer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
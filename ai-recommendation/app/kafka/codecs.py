@@ -0,0 +1,313 @@
+"""Pluggable Kafka message codecs"""
+import json
+import os
+import struct
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.schemas.feed_records import (
+    CarFeed,
+    FeedRecord,
+    FlightFeed,
+    HotelFeed,
+    decode_feed_record,
+)
+
+try:
+    import orjson
+except ImportError:  # optional faster codec
+    orjson = None
+
+# Kafka header announcing how a message value is encoded
+CONTENT_TYPE_HEADER = "content-type"
+
+
+def _default(value: Any) -> Any:
+    """Serialize values the JSON encoders do not handle natively"""
+    to_dict = getattr(value, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """Standard library JSON codec"""
+    
+    name = "json"
+    content_type = b"application/json"
+    
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, default=_default).encode("utf-8")
+    
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """orjson codec; same wire format as JsonCodec, faster to encode and decode"""
+    
+    name = "orjson"
+    content_type = b"application/json"
+    
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class PassthroughCodec:
+    """Sends values that were already encoded by another codec unchanged"""
+    
+    name = "passthrough"
+    content_type = b"application/octet-stream"
+    
+    def encode(self, value: bytes) -> bytes:
+        return value
+    
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+
+_F64 = struct.Struct("<d")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _write_varint(out: bytearray, value: int):
+    """Append an unsigned LEB128 varint"""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 varint; returns (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_bytes(out: bytearray, value: bytes):
+    _write_varint(out, len(value))
+    out += value
+
+
+def _read_bytes(data: bytes, pos: int) -> Tuple[bytes, int]:
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length], pos + length
+
+
+def _write_str(out: bytearray, value: Any):
+    _write_bytes(out, (value if isinstance(value, str) else str(value)).encode("utf-8"))
+
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    value, pos = _read_bytes(data, pos)
+    return value.decode("utf-8"), pos
+
+
+def _write_f64(out: bytearray, value: Any):
+    out += _F64.pack(float(value))
+
+
+def _read_f64(data: bytes, pos: int) -> Tuple[float, int]:
+    return _F64.unpack_from(data, pos)[0], pos + 8
+
+
+def _write_int(out: bytearray, value: Any):
+    # Zigzag so small negative numbers stay short
+    value = int(value)
+    _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def _read_int(data: bytes, pos: int) -> Tuple[int, int]:
+    value, pos = _read_varint(data, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+
+def _write_datetime(out: bytearray, value: Any):
+    # Naive datetimes as microseconds since the epoch; anything else as text
+    if isinstance(value, datetime) and value.tzinfo is None:
+        out.append(0)
+        _write_int(out, (value - _EPOCH) // timedelta(microseconds=1))
+    else:
+        out.append(1)
+        _write_str(out, value.isoformat() if isinstance(value, (datetime, date)) else value)
+
+
+def _read_datetime(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos]
+    if tag == 0:
+        micros, pos = _read_int(data, pos + 1)
+        return _EPOCH + timedelta(microseconds=micros), pos
+    return _read_str(data, pos + 1)
+
+
+def _write_json(out: bytearray, value: Any):
+    _write_bytes(out, json.dumps(value, default=_default, separators=(",", ":")).encode("utf-8"))
+
+
+def _read_json(data: bytes, pos: int) -> Tuple[Any, int]:
+    value, pos = _read_bytes(data, pos)
+    return json.loads(value), pos
+
+
+_WRITERS: Dict[str, Callable[[bytearray, Any], None]] = {
+    "str": _write_str,
+    "f64": _write_f64,
+    "int": _write_int,
+    "datetime": _write_datetime,
+    "json": _write_json,
+}
+_READERS: Dict[str, Callable[[bytes, int], Tuple[Any, int]]] = {
+    "str": _read_str,
+    "f64": _read_f64,
+    "int": _read_int,
+    "datetime": _read_datetime,
+    "json": _read_json,
+}
+
+
+class FeedBinaryCodec:
+    """Compact binary codec for feed records, versioned by schema
+    
+    Layout: schema version byte, record type byte, a presence bitmap over the
+    type's fields, the present fields in schema order, then a JSON blob with
+    any extra fields. Messages that are not flight, hotel or car feeds are
+    stored whole as JSON under record type 0. Field layouts are frozen per
+    schema version; changing them means adding a new version.
+    """
+    
+    name = "feedbin"
+    SCHEMA_VERSION = 1
+    content_type = b"application/x-feed-record;v=1"
+    
+    RECORD_TYPES = {1: FlightFeed, 2: HotelFeed, 3: CarFeed}
+    LAYOUTS: Dict[type, Sequence[Tuple[str, str]]] = {
+        FlightFeed: (
+            ("airline", "str"), ("flight_number", "str"),
+            ("origin", "str"), ("destination", "str"),
+            ("departure_time", "datetime"), ("arrival_time", "datetime"),
+            ("price", "f64"), ("original_price", "f64"), ("available_seats", "int"),
+        ),
+        HotelFeed: (
+            ("name", "str"), ("city", "str"), ("state", "str"), ("country", "str"),
+            ("address", "str"), ("location", "str"), ("amenities", "json"),
+            ("rating", "f64"), ("price_per_night", "f64"), ("original_price", "f64"),
+            ("available_rooms", "int"),
+        ),
+        CarFeed: (
+            ("make", "str"), ("model", "str"), ("year", "int"),
+            ("rental_company", "str"), ("location", "str"), ("features", "json"),
+            ("price_per_day", "f64"), ("original_price", "f64"),
+        ),
+    }
+    TYPE_CODES = {record_type: code for code, record_type in RECORD_TYPES.items()}
+    
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, dict):
+            value = decode_feed_record(dict(value))
+        type_code = self.TYPE_CODES.get(type(value), 0)
+        out = bytearray((self.SCHEMA_VERSION, type_code))
+        if not type_code:
+            _write_json(out, value)
+            return bytes(out)
+        
+        layout = self.LAYOUTS[type(value)]
+        values = [getattr(value, name) for name, _ in layout]
+        bitmap = 0
+        for index, field_value in enumerate(values):
+            if field_value is not None:
+                bitmap |= 1 << index
+        out += bitmap.to_bytes((len(layout) + 7) // 8, "little")
+        for (_, kind), field_value in zip(layout, values):
+            if field_value is not None:
+                _WRITERS[kind](out, field_value)
+        if value.extra:
+            _write_json(out, value.extra)
+        else:
+            out.append(0)
+        return bytes(out)
+    
+    def decode(self, data: bytes) -> Any:
+        version, type_code = data[0], data[1]
+        if version != self.SCHEMA_VERSION:
+            raise ValueError(f"Unsupported feed record schema version: {version}")
+        if not type_code:
+            return _read_json(data, 2)[0]
+        
+        record_type = self.RECORD_TYPES[type_code]
+        layout = self.LAYOUTS[record_type]
+        width = (len(layout) + 7) // 8
+        bitmap = int.from_bytes(data[2:2 + width], "little")
+        pos = 2 + width
+        
+        record = record_type.__new__(record_type)
+        for index, (name, kind) in enumerate(layout):
+            if bitmap >> index & 1:
+                field_value, pos = _READERS[kind](data, pos)
+            else:
+                field_value = None
+            setattr(record, name, field_value)
+        extra, pos = _read_bytes(data, pos)
+        record.extra = json.loads(extra) if extra else {}
+        return record
+
+
+def get_codec(name: Optional[str] = None):
+    """Return the codec named by `name` or KAFKA_CODEC (json, orjson, auto or feedbin)"""
+    name = (name or os.getenv("KAFKA_CODEC", "auto")).lower()
+    if name in ("auto", "orjson"):
+        if orjson is not None:
+            return OrjsonCodec()
+        if name == "orjson":
+            print("orjson is not installed; falling back to json codec")
+        return JsonCodec()
+    if name == "json":
+        return JsonCodec()
+    if name == "feedbin":
+        return FeedBinaryCodec()
+    raise ValueError(f"Unknown Kafka codec: {name}")
+
+
+def get_feed_codec(encoding: Optional[str] = None):
+    """Codec for publishing supplier feeds: KAFKA_FEED_ENCODING json (default) or binary"""
+    encoding = (encoding or os.getenv("KAFKA_FEED_ENCODING", "json")).lower()
+    if encoding == "binary":
+        return FeedBinaryCodec()
+    return get_codec()
+
+
+def codec_headers(codec) -> List[Tuple[str, bytes]]:
+    """Kafka headers announcing the codec of a message"""
+    return [(CONTENT_TYPE_HEADER, codec.content_type)]
+
+
+def codec_for_headers(headers: Optional[Sequence[Tuple[str, bytes]]], default):
+    """Pick the codec announced in a message's headers; JSON and unmarked use default"""
+    for key, value in headers or ():
+        if key == CONTENT_TYPE_HEADER:
+            if value.split(b";", 1)[0] == FeedBinaryCodec.content_type.split(b";", 1)[0]:
+                return _feed_binary_codec
+            break
+    return default
+
+
+_feed_binary_codec = FeedBinaryCodec()
+
+
+def decode_value(codec, data: bytes, typed_records: bool = False) -> Any:
+    """Decode a message value into a typed feed record or a plain dict"""
+    value = codec.decode(data)
+    if typed_records:
+        return decode_feed_record(value)
+    return value.to_dict() if isinstance(value, FeedRecord) else value
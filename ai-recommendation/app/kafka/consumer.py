@@ -1,18 +1,33 @@
 """Kafka consumer for AI recommendation service"""
-from aiokafka import AIOKafkaConsumer
-import json
+from aiokafka import AIOKafkaConsumer, ConsumerRecord, TopicPartition
 import asyncio
 import os
-from typing import Callable, Dict, Any, List
+from typing import Callable, Dict, Any, List, Awaitable
+from app.kafka.codecs import get_codec, codec_for_headers, decode_value
 
 
 class KafkaConsumerClient:
     """Kafka consumer client"""
     
-    def __init__(self, topics: List[str], group_id: str = "ai-recommendation-group"):
+    def __init__(
+        self,
+        topics: List[str],
+        group_id: str = "ai-recommendation-group",
+        enable_auto_commit: bool = True,
+        decode_values: bool = True,
+        codec=None,
+        typed_records: bool = False
+    ):
         self.bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
         self.topics = topics
         self.group_id = group_id
+        self.enable_auto_commit = enable_auto_commit
+        # When False, record values are left as raw bytes for the caller to decode
+        self.decode_values = decode_values
+        # Codec for JSON and unmarked messages; a content-type header can select another
+        self.codec = codec or get_codec()
+        # Decode feed messages into slotted FlightFeed/HotelFeed/CarFeed records
+        self.typed_records = typed_records
         self.consumer = None
         self.running = False
     
@@ -22,13 +37,17 @@ class KafkaConsumerClient:
             *self.topics,
             bootstrap_servers=self.bootstrap_servers,
             group_id=self.group_id,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')),
             auto_offset_reset='earliest',
-            enable_auto_commit=True,
+            enable_auto_commit=self.enable_auto_commit,
         )
         await self.consumer.start()
         self.running = True
     
+    def decode_record(self, record: ConsumerRecord) -> Any:
+        """Decode a record's value with the codec announced in its headers"""
+        codec = codec_for_headers(record.headers, self.codec)
+        return decode_value(codec, record.value, self.typed_records)
+    
     async def consume(self, message_handler: Callable[[str, Dict[Any, Any]], None]):
         """Consume messages"""
         if not self.consumer:
@@ -39,13 +58,71 @@ class KafkaConsumerClient:
                 if not self.running:
                     break
                 topic = message.topic
-                value = message.value
+                value = self.decode_record(message) if self.decode_values else message.value
                 await message_handler(topic, value)
         except Exception as e:
             print(f"Error consuming messages: {e}")
         finally:
             await self.stop()
     
+    async def consume_batches(
+        self,
+        batch_handler: Callable[[List[Dict[Any, Any]]], Awaitable[None]],
+        max_records: int = 500,
+        max_linger_ms: int = 500
+    ):
+        """Consume message values in batches using getmany()"""
+        async def handle_records(records: List[ConsumerRecord]):
+            await batch_handler([record.value for record in records])
+        
+        try:
+            await self.consume_record_batches(handle_records, max_records, max_linger_ms)
+        finally:
+            await self.stop()
+    
+    async def consume_record_batches(
+        self,
+        batch_handler: Callable[[List[ConsumerRecord]], Awaitable[None]],
+        max_records: int = 500,
+        max_linger_ms: int = 500
+    ):
+        """Consume raw ConsumerRecord batches using getmany()
+        
+        A batch is handed to batch_handler once it holds max_records records or
+        max_linger_ms has elapsed since the first fetch, whichever comes first.
+        The consumer is left running on return so the caller can commit offsets.
+        """
+        if not self.consumer:
+            await self.start()
+        
+        loop = asyncio.get_running_loop()
+        try:
+            while self.running:
+                records: List[ConsumerRecord] = []
+                deadline = loop.time() + max_linger_ms / 1000
+                while self.running and len(records) < max_records:
+                    remaining_ms = max(0, int((deadline - loop.time()) * 1000))
+                    batch = await self.consumer.getmany(
+                        timeout_ms=remaining_ms,
+                        max_records=max_records - len(records)
+                    )
+                    for partition_records in batch.values():
+                        if self.decode_values:
+                            for record in partition_records:
+                                record.value = self.decode_record(record)
+                        records.extend(partition_records)
+                    if remaining_ms == 0:
+                        break
+                
+                if records:
+                    await batch_handler(records)
+        except Exception as e:
+            print(f"Error consuming message batches: {e}")
+    
+    async def commit(self, offsets: Dict[TopicPartition, int]):
+        """Commit the given next-offsets per partition"""
+        await self.consumer.commit(offsets)
+    
     async def stop(self):
         """Stop consumer"""
         self.running = False
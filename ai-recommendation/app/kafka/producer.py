@@ -1,43 +1,179 @@
 """Kafka producers for AI recommendation service"""
 from kafka import KafkaProducer
 from aiokafka import AIOKafkaProducer
-import json
 import os
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from app.kafka.codecs import get_codec, codec_headers
+
+# Called with (record metadata, None) on delivery or (None, error) on failure
+DeliveryCallback = Callable[[Any, Optional[Exception]], None]
 
 
 class KafkaProducerClient:
-    """Kafka producer client"""
+    """Kafka producer client
+    
+    send_message() waits for the broker on every call. send_async() returns
+    as soon as the record is buffered; the client batches buffered records
+    per partition (KAFKA_PRODUCER_LINGER_MS, KAFKA_PRODUCER_BATCH_SIZE,
+    KAFKA_PRODUCER_COMPRESSION) and reports each delivery through callbacks
+    and the sent/delivered/failed counters. flush() waits for everything
+    buffered, and close() flushes before shutting down.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        codec=None,
+        linger_ms: int = None,
+        batch_size: int = None,
+        compression_type: str = None,
+        acks: str = None
+    ):
         self.bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092,localhost:9092")
+        self.codec = codec or get_codec()
+        self.linger_ms = linger_ms if linger_ms is not None else int(
+            os.getenv("KAFKA_PRODUCER_LINGER_MS", "20")
+        )
+        self.batch_size = batch_size if batch_size is not None else int(
+            os.getenv("KAFKA_PRODUCER_BATCH_SIZE", "65536")
+        )
+        compression_type = compression_type or os.getenv("KAFKA_PRODUCER_COMPRESSION", "none")
+        self.compression_type = None if compression_type.lower() == "none" else compression_type
+        acks = acks or os.getenv("KAFKA_PRODUCER_ACKS", "1")
+        self.headers = codec_headers(self.codec)
+        
+        self.sent = 0
+        self.delivered = 0
+        self.failed = 0
+        self.last_error = None
+        # Delivery callbacks run on the producer's I/O thread
+        self._lock = threading.Lock()
+        
         self.producer = KafkaProducer(
             bootstrap_servers=self._format_bootstrap(self.bootstrap_servers),
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+            value_serializer=self.codec.encode,
             key_serializer=lambda k: k.encode('utf-8') if k else None,
+            linger_ms=self.linger_ms,
+            batch_size=self.batch_size,
+            compression_type=self.compression_type,
+            acks="all" if acks == "all" else int(acks),
         )
-
+    
     @staticmethod
     def _format_bootstrap(bootstrap: str) -> List[str]:
         return [b.strip() for b in bootstrap.split(',') if b.strip()]
     
     def send_message(self, topic: str, message: Dict[Any, Any], key: str = None):
-        """Send message to Kafka topic"""
+        """Send message to Kafka topic and wait for the broker to acknowledge it"""
+        future = self.send_async(topic, message, key=key)
+        if future is None:
+            return False
         try:
-            future = self.producer.send(topic, value=message, key=key)
             future.get(timeout=10)
             return True
         except Exception as e:
             print(f"Error sending message to Kafka: {e}")
             return False
     
-    def close(self):
-        """Close producer"""
-        self.producer.close()
+    def send_async(
+        self,
+        topic: str,
+        message: Dict[Any, Any],
+        key: str = None,
+        on_delivery: Optional[DeliveryCallback] = None
+    ):
+        """Buffer a message for sending without waiting for the broker
+        
+        Returns the send future, or None if the message could not be buffered.
+        on_delivery(metadata, error) is called once the broker acknowledges
+        the message or gives up on it.
+        """
+        with self._lock:
+            self.sent += 1
+        try:
+            future = self.producer.send(topic, value=message, key=key, headers=self.headers)
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Error sending message to Kafka: {e}")
+            if on_delivery:
+                on_delivery(None, e)
+            return None
+        
+        future.add_callback(self._on_success, on_delivery)
+        future.add_errback(self._on_error, on_delivery)
+        return future
+    
+    def send_batch(
+        self,
+        topic: str,
+        messages: Iterable[Dict[Any, Any]],
+        key_fn: Optional[Callable[[Dict[Any, Any]], Optional[str]]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, int]:
+        """Send messages and wait once for the whole batch; returns (delivered, failed)"""
+        futures = [
+            self.send_async(topic, message, key=key_fn(message) if key_fn else None)
+            for message in messages
+        ]
+        self.flush(timeout)
+        delivered = sum(1 for f in futures if f is not None and f.succeeded())
+        return delivered, len(futures) - delivered
+    
+    # kafka-python calls callbacks registered with extra args as f(*args, result),
+    # so on_delivery comes first
+    def _on_success(self, on_delivery: Optional[DeliveryCallback], metadata):
+        with self._lock:
+            self.delivered += 1
+        if on_delivery:
+            on_delivery(metadata, None)
+    
+    def _on_error(self, on_delivery: Optional[DeliveryCallback], error: Exception):
+        self._record_failure(error)
+        print(f"Error delivering message to Kafka: {error}")
+        if on_delivery:
+            on_delivery(None, error)
+    
+    def _record_failure(self, error: Exception):
+        with self._lock:
+            self.failed += 1
+            self.last_error = str(error)
+    
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every buffered message is delivered or has failed"""
+        self.producer.flush(timeout=timeout)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Delivery counters; pending is buffered but not yet acknowledged"""
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "pending": self.sent - self.delivered - self.failed,
+                "last_error": self.last_error
+            }
+    
+    def close(self, timeout: Optional[float] = 10):
+        """Flush buffered messages and close producer"""
+        try:
+            self.flush(timeout)
+        except Exception as e:
+            print(f"Error flushing Kafka producer: {e}")
+        self.producer.close(timeout=timeout)
+
+
+# Global producer instance, created on first use so that importing the
+# package (e.g. for offline imports) does not need a reachable broker
+_kafka_producer: Optional[KafkaProducerClient] = None
 
 
-# Global producer instance
-kafka_producer = KafkaProducerClient()
+def __getattr__(name: str):
+    global _kafka_producer
+    if name == "kafka_producer":
+        if _kafka_producer is None:
+            _kafka_producer = KafkaProducerClient()
+        return _kafka_producer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_bootstrap_servers() -> List[str]:
@@ -47,11 +183,24 @@ def get_bootstrap_servers() -> List[str]:
     )
 
 
-def create_async_producer() -> AIOKafkaProducer:
-    """Factory for an aiokafka producer using shared bootstrap configuration."""
+def create_async_producer(codec=None, linger_ms: int = None) -> AIOKafkaProducer:
+    """Factory for an aiokafka producer using shared bootstrap configuration.
+    
+    Batching, compression and acks follow the KAFKA_PRODUCER_* settings used
+    by KafkaProducerClient. Callers pass codec_headers(codec) with each send
+    so consumers can tell binary feed records from JSON.
+    """
+    codec = codec or get_codec()
+    compression_type = os.getenv("KAFKA_PRODUCER_COMPRESSION", "none")
+    acks = os.getenv("KAFKA_PRODUCER_ACKS", "1")
     return AIOKafkaProducer(
         bootstrap_servers=",".join(get_bootstrap_servers()),
-        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        value_serializer=codec.encode,
         key_serializer=lambda k: k.encode("utf-8") if k else None,
+        linger_ms=linger_ms if linger_ms is not None else int(
+            os.getenv("KAFKA_PRODUCER_LINGER_MS", "20")
+        ),
+        max_batch_size=int(os.getenv("KAFKA_PRODUCER_BATCH_SIZE", "65536")),
+        compression_type=None if compression_type.lower() == "none" else compression_type,
+        acks="all" if acks == "all" else int(acks),
     )
-
@@ -3,7 +3,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import health_router, bundles_router, watches_router, chat_router
 from app.websocket import websocket_router
-from app.db.session import create_db_and_tables
+from app.db.session import create_db_and_tables, engine
+from app.data.deal_index import deal_index
+from app.data.deal_leaderboard import deal_leaderboards
+from app.data.bundle_store import bundle_store
+from sqlmodel import Session
 import os
 
 # Create FastAPI app
@@ -34,12 +38,28 @@ app.include_router(websocket_router)
 async def startup_event():
     """Initialize database on startup"""
     create_db_and_tables()
+    if deal_index.enabled:
+        try:
+            with Session(engine) as session:
+                indexed = deal_index.rebuild(session)
+            print(f"Built deal index with {indexed} active deal(s)")
+        except Exception as e:
+            print(f"Error building deal index: {e}")
+    if deal_leaderboards.enabled:
+        try:
+            with Session(engine) as session:
+                boards = deal_leaderboards.load(session)
+            print(f"Loaded {boards} deal leaderboard(s)")
+        except Exception as e:
+            print(f"Error loading deal leaderboards: {e}")
     print("AI Recommendation Service started")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    # Finish saving bundles composed by recent requests
+    bundle_store.shutdown(wait=True)
     print("AI Recommendation Service shutting down")
 
 
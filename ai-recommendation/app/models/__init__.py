@@ -1,8 +1,11 @@
 """Models package"""
 from .flight_deal import FlightDeal, FlightDealBase
 from .hotel_deal import HotelDeal, HotelDealBase
-from .bundle import Bundle, BundleBase
+from .bundle import Bundle, BundleBase, BundleItem, BundleTag
 from .watch import Watch, WatchBase
+from .price_history import PriceHistory, PriceDailyRollup
+from .ingestion_offset import IngestionOffset
+from .deal_leaderboard import DealLeaderboard
 
 __all__ = [
     "FlightDeal",
@@ -11,7 +14,13 @@ __all__ = [
     "HotelDealBase",
     "Bundle",
     "BundleBase",
+    "BundleItem",
+    "BundleTag",
     "Watch",
     "WatchBase",
+    "PriceHistory",
+    "PriceDailyRollup",
+    "IngestionOffset",
+    "DealLeaderboard",
 ]
 
@@ -1,8 +1,12 @@
 """Bundle model - combines flights, hotels, and cars"""
 from sqlmodel import SQLModel, Field, Relationship
-from typing import Optional, List
+from sqlalchemy import Index
+from typing import Optional, List, Iterable
 from datetime import datetime
 
+# Deal types a bundle can hold, in the order their items are stored
+DEAL_TYPES = ("flight", "hotel", "car")
+
 
 class BundleBase(SQLModel):
     name: str
@@ -16,14 +20,94 @@ class BundleBase(SQLModel):
 class Bundle(BundleBase, table=True):
     """Bundle database model"""
     __tablename__ = "bundles"
+    __table_args__ = (
+        # Bundle search: active bundles, best savings first
+        Index("ix_bundles_active_savings", "is_active", "savings"),
+        # Reuse of an identical composition
+        Index("ix_bundles_composition", "composition_key"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    composition_key: str = Field(
+        default="",
+        description="Hash of the search params and deal IDs the bundle was composed from"
+    )
     
-    # Relationships would be handled via junction tables in a real implementation
-    # For simplicity, we'll store IDs as JSON or use separate tables
+    # Deals and tags live in bundle_items and bundle_tags; these comma-separated
+    # copies are kept in sync by set_contents for existing readers of the table
     flight_deal_ids: str = Field(default="", description="Comma-separated flight deal IDs")
     hotel_deal_ids: str = Field(default="", description="Comma-separated hotel deal IDs")
     car_deal_ids: str = Field(default="", description="Comma-separated car deal IDs")
+    
+    items: List["BundleItem"] = Relationship(
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan",
+            "order_by": "BundleItem.position",
+            "lazy": "selectin"
+        }
+    )
+    tag_links: List["BundleTag"] = Relationship(
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan",
+            "order_by": "BundleTag.tag",
+            "lazy": "selectin"
+        }
+    )
+    
+    def set_contents(
+        self,
+        flight_ids: Iterable[int] = (),
+        hotel_ids: Iterable[int] = (),
+        car_ids: Iterable[int] = (),
+        tags: Iterable[str] = ()
+    ):
+        """Replace the bundle's deals and tags"""
+        ids = {"flight": list(flight_ids), "hotel": list(hotel_ids), "car": list(car_ids)}
+        self.items = [
+            BundleItem(deal_type=deal_type, deal_id=deal_id, position=position)
+            for position, (deal_type, deal_id) in enumerate(
+                (deal_type, deal_id) for deal_type in DEAL_TYPES for deal_id in ids[deal_type]
+            )
+        ]
+        tag_names = sorted({tag.strip() for tag in tags if tag.strip()})
+        self.tag_links = [BundleTag(tag=tag) for tag in tag_names]
+        self.flight_deal_ids = ",".join(str(deal_id) for deal_id in ids["flight"])
+        self.hotel_deal_ids = ",".join(str(deal_id) for deal_id in ids["hotel"])
+        self.car_deal_ids = ",".join(str(deal_id) for deal_id in ids["car"])
+        self.tags = ",".join(tag_names)
+    
+    def deal_ids(self, deal_type: str) -> List[int]:
+        """IDs of the bundle's deals of one type, in bundle order"""
+        return [item.deal_id for item in self.items if item.deal_type == deal_type]
+    
+    @property
+    def tag_list(self) -> List[str]:
+        return [link.tag for link in self.tag_links]
 
+
+class BundleItem(SQLModel, table=True):
+    """One deal of a bundle"""
+    __tablename__ = "bundle_items"
+    __table_args__ = (
+        # Bundles containing a given deal
+        Index("ix_bundle_items_deal", "deal_type", "deal_id", "bundle_id"),
+    )
+    
+    bundle_id: int = Field(foreign_key="bundles.id", primary_key=True)
+    position: int = Field(primary_key=True, description="Order of the deal within the bundle")
+    deal_type: str = Field(description="flight, hotel, or car")
+    deal_id: int
+
+
+class BundleTag(SQLModel, table=True):
+    """One tag of a bundle"""
+    __tablename__ = "bundle_tags"
+    __table_args__ = (
+        # Tag search: bundles carrying a tag
+        Index("ix_bundle_tags_tag", "tag", "bundle_id"),
+    )
+    
+    bundle_id: int = Field(foreign_key="bundles.id", primary_key=True)
+    tag: str = Field(primary_key=True)
@@ -0,0 +1,19 @@
+"""Deal leaderboard model - the best active deals per route and per city"""
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class DealLeaderboard(SQLModel, table=True):
+    """One ranked entry of a route's or city's leaderboard"""
+    __tablename__ = "deal_leaderboards"
+    
+    listing_type: str = Field(primary_key=True, description="flight or hotel")
+    scope_key: str = Field(
+        primary_key=True,
+        description="origin_key:destination_key for flights, city_key for hotels"
+    )
+    rank: int = Field(primary_key=True, description="1 is the best deal")
+    deal_id: int
+    deal_score: float
+    price: float
+    updated_at: datetime = Field(default_factory=datetime.now)
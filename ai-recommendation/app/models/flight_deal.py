@@ -1,7 +1,9 @@
 """Flight deal model"""
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, event
 from typing import Optional
 from datetime import datetime
+from app.models.keys import location_key
 
 
 class FlightDealBase(SQLModel):
@@ -23,9 +25,23 @@ class FlightDealBase(SQLModel):
 class FlightDeal(FlightDealBase, table=True):
     """Flight deal database model"""
     __tablename__ = "flight_deals"
+    __table_args__ = (
+        # Route lookups: active deals for an (origin, destination), best score first
+        Index("ix_flight_deals_route", "is_active", "origin_key", "destination_key", "deal_score"),
+        # Upsert identity; flight_number leads so batched IN lookups seek on it
+        Index("uq_flight_deals_identity", "flight_number", "airline", unique=True),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
+    origin_key: str = Field(default="", description="location_key(origin)")
+    destination_key: str = Field(default="", description="location_key(destination)")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_price_update: Optional[datetime] = Field(default=None, description="Last price update timestamp for history tracking")
 
+
+@event.listens_for(FlightDeal, "before_insert")
+@event.listens_for(FlightDeal, "before_update")
+def _set_location_keys(mapper, connection, deal: FlightDeal):
+    deal.origin_key = location_key(deal.origin)
+    deal.destination_key = location_key(deal.destination)
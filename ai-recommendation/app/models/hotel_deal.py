@@ -1,7 +1,9 @@
 """Hotel deal model"""
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, event
 from typing import Optional
 from datetime import datetime
+from app.models.keys import location_key
 
 
 class HotelDealBase(SQLModel):
@@ -23,9 +25,21 @@ class HotelDealBase(SQLModel):
 class HotelDeal(HotelDealBase, table=True):
     """Hotel deal database model"""
     __tablename__ = "hotel_deals"
+    __table_args__ = (
+        # City lookups: active deals in a city, best score first
+        Index("ix_hotel_deals_city", "is_active", "city_key", "deal_score"),
+        # Upsert identity; name leads so batched IN lookups seek on it
+        Index("uq_hotel_deals_identity", "name", "city", unique=True),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
+    city_key: str = Field(default="", description="location_key(city)")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_price_update: Optional[datetime] = Field(default=None, description="Last price update timestamp for history tracking")
 
+
+@event.listens_for(HotelDeal, "before_insert")
+@event.listens_for(HotelDeal, "before_update")
+def _set_location_key(mapper, connection, deal: HotelDeal):
+    deal.city_key = location_key(deal.city)
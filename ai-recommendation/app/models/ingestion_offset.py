@@ -0,0 +1,19 @@
+"""Ingestion offset model - last persisted Kafka offset per message key"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from datetime import datetime
+
+
+class IngestionOffset(SQLModel, table=True):
+    """Highest Kafka offset persisted for a message key on a topic partition"""
+    __tablename__ = "ingestion_offsets"
+    __table_args__ = (
+        # Pruning of offsets past the retention
+        Index("ix_ingestion_offsets_updated_at", "updated_at"),
+    )
+    
+    topic: str = Field(primary_key=True)
+    partition_id: int = Field(primary_key=True)
+    message_key: str = Field(primary_key=True)
+    last_offset: int
+    updated_at: datetime = Field(default_factory=datetime.now)
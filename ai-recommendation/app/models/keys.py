@@ -0,0 +1,27 @@
+"""Normalized lookup keys stored alongside free-form location columns, and feed routing keys"""
+import re
+from typing import Any, Dict, Optional
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def location_key(value: Optional[str]) -> str:
+    """Lower-cased slug of an airport code or city name: ' New York, NY' -> 'new-york-ny'"""
+    return _NON_ALNUM.sub("-", str(value or "").lower()).strip("-")
+
+
+def feed_listing_key(message: Dict[str, Any]) -> str:
+    """Listing a supplier feed writes to: 'flight:<flight number>' or 'hotel:<name>'
+    
+    A deal's identity (airline and flight number, hotel name and city) and its
+    price history rows (flight number, hotel name) fall under a single key, so
+    feeds sharing a key must be persisted by one transaction at a time, in order.
+    """
+    listing_type = (message.get("type") or "").lower()
+    if listing_type == "flight":
+        listing_id = message.get("flight_number") or ""
+    elif listing_type == "hotel":
+        listing_id = message.get("name") or ""
+    else:
+        listing_id = ""
+    return f"{listing_type}:{listing_id}"
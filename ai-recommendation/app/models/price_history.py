@@ -0,0 +1,33 @@
+"""Price history models - append-only price points and daily rollups"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from typing import Optional
+from datetime import datetime, date
+
+
+class PriceHistory(SQLModel, table=True):
+    """Append-only price point for a listing"""
+    __tablename__ = "price_history"
+    __table_args__ = (
+        # Covering index: per-listing range scans never touch the table rows
+        Index("ix_price_history_listing_ts", "listing_type", "listing_id", "ts", "price"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    listing_type: str = Field(description="flight, hotel, or car")
+    listing_id: str
+    ts: datetime = Field(default_factory=datetime.now)
+    price: float
+
+
+class PriceDailyRollup(SQLModel, table=True):
+    """Per-listing daily price aggregates used for rolling averages"""
+    __tablename__ = "price_history_daily"
+    
+    listing_type: str = Field(primary_key=True)
+    listing_id: str = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    price_sum: float = Field(default=0.0)
+    price_count: int = Field(default=0)
+    min_price: float
+    max_price: float
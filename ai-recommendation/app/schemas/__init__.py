@@ -13,6 +13,13 @@ from .watch_schemas import (
     WatchResponse,
     WatchNotification,
 )
+from .feed_records import (
+    FeedRecord,
+    FlightFeed,
+    HotelFeed,
+    CarFeed,
+    decode_feed_record,
+)
 
 __all__ = [
     "BundleResponse",
@@ -25,5 +32,10 @@ __all__ = [
     "WatchUpdate",
     "WatchResponse",
     "WatchNotification",
+    "FeedRecord",
+    "FlightFeed",
+    "HotelFeed",
+    "CarFeed",
+    "decode_feed_record",
 ]
 
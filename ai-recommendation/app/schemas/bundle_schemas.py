@@ -64,7 +64,7 @@ class CarDealResponse(BaseModel):
 
 class BundleResponse(BaseModel):
     """Bundle response schema"""
-    id: int
+    id: Optional[int] = Field(None, description="None while a newly composed bundle is being saved")
     name: str
     description: str
     total_price: float
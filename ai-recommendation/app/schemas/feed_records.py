@@ -0,0 +1,172 @@
+"""Typed supplier feed records decoded from Kafka messages"""
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Tuple, Union
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    """Coerce a price-like value to float"""
+    if type(value) is float:
+        return value
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value: Any, default: int = 0) -> int:
+    """Coerce a count-like value to int"""
+    if type(value) is int:
+        return value
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_datetime(value: Any) -> Any:
+    """Parse ISO-8601 strings; other values are kept as sent"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FeedRecord:
+    """Slotted base for typed feed records
+    
+    Prices and availability are resolved once at decode time. Fields outside
+    the schema are kept in `extra`, and get() gives the same dict-style access
+    the deal helpers use for plain messages.
+    """
+    
+    __slots__ = ("extra",)
+    
+    type = ""
+    FIELDS: Tuple[str, ...] = ()
+    _ATTRS: FrozenSet[str] = frozenset()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ATTRS = frozenset(cls.FIELDS) | {"type"}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeedRecord":
+        """Build a record from a decoded message, taking ownership of the dict
+        
+        Schema fields are popped off and what is left becomes `extra`, which
+        avoids copying the message.
+        """
+        record = cls.__new__(cls)
+        pop = data.pop
+        for name in cls.FIELDS:
+            setattr(record, name, pop(name, None))
+        pop("type", None)
+        record.extra = data
+        record._normalize()
+        return record
+    
+    def _normalize(self):
+        """Coerce field types and resolve derived fields"""
+    
+    def get(self, name: str, default: Any = None) -> Any:
+        """dict-style lookup over fields and extras; None counts as missing"""
+        if name in self._ATTRS:
+            value = getattr(self, name)
+        else:
+            value = self.extra.get(name)
+        return default if value is None else value
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain message dict, e.g. for re-encoding"""
+        data = {"type": self.type}
+        for name in self.FIELDS:
+            data[name] = getattr(self, name)
+        data.update(self.extra)
+        return data
+    
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
+
+
+class FlightFeed(FeedRecord):
+    """Flight supplier feed"""
+    
+    __slots__ = (
+        "airline", "flight_number", "origin", "destination",
+        "departure_time", "arrival_time",
+        "price", "original_price", "available_seats"
+    )
+    
+    type = "flight"
+    FIELDS = __slots__
+    
+    def _normalize(self):
+        self.original_price = _to_float(
+            self.original_price if self.original_price is not None else self.price
+        )
+        self.price = _to_float(self.price, self.original_price)
+        self.available_seats = _to_int(self.available_seats)
+        self.departure_time = _to_datetime(self.departure_time)
+        self.arrival_time = _to_datetime(self.arrival_time)
+
+
+class HotelFeed(FeedRecord):
+    """Hotel supplier feed"""
+    
+    __slots__ = (
+        "name", "city", "state", "country", "address", "location",
+        "amenities", "rating",
+        "price_per_night", "original_price", "available_rooms"
+    )
+    
+    type = "hotel"
+    FIELDS = __slots__
+    
+    def _normalize(self):
+        self.original_price = _to_float(
+            self.original_price if self.original_price is not None else self.price_per_night
+        )
+        self.price_per_night = _to_float(self.price_per_night, self.original_price)
+        self.available_rooms = _to_int(self.available_rooms)
+        if self.rating is not None:
+            self.rating = _to_float(self.rating)
+
+
+class CarFeed(FeedRecord):
+    """Car rental supplier feed"""
+    
+    __slots__ = (
+        "make", "model", "year", "rental_company", "location", "features",
+        "price_per_day", "original_price"
+    )
+    
+    type = "car"
+    FIELDS = __slots__
+    
+    def _normalize(self):
+        self.original_price = _to_float(
+            self.original_price if self.original_price is not None else self.price_per_day
+        )
+        self.price_per_day = _to_float(self.price_per_day, self.original_price)
+        if self.year is not None:
+            self.year = _to_int(self.year)
+
+
+FEED_RECORD_TYPES = {
+    record_type.type: record_type for record_type in (FlightFeed, HotelFeed, CarFeed)
+}
+
+
+def decode_feed_record(data: Any) -> Union[FeedRecord, Any]:
+    """Turn a decoded message into its typed record; unknown types pass through"""
+    if not isinstance(data, dict):
+        return data
+    record_type = FEED_RECORD_TYPES.get((data.get("type") or "").lower())
+    return record_type.from_dict(data) if record_type else data
@@ -1,6 +1,7 @@
 """Concierge agent - chat-facing agent that composes bundles"""
 from sqlmodel import Session
 from typing import List, Dict, Any, Optional
+from app.data.bundle_store import bundle_store, composition_key
 from app.models import FlightDeal, HotelDeal, Bundle
 from app.services.deal_selector import DealSelector
 from app.schemas import BundleCreate, BundleSearchParams
@@ -13,7 +14,7 @@ class ConciergeAgent:
         self.session = session
         self.deal_selector = DealSelector(session)
     
-    def create_bundle(
+    def compose_bundle(
         self,
         origin: Optional[str] = None,
         destination: Optional[str] = None,
@@ -21,7 +22,7 @@ class ConciergeAgent:
         max_price: Optional[float] = None,
         preferences: Optional[Dict[str, Any]] = None
     ) -> Bundle:
-        """Create a personalized bundle based on user preferences"""
+        """Compose an unsaved personalized bundle based on user preferences"""
         # Get best deals
         flights = []
         hotels = []
@@ -55,29 +56,45 @@ class ConciergeAgent:
         hotel_savings = sum((h.original_price_per_night - h.discounted_price_per_night) * 3 for h in hotels)
         total_savings = flight_savings + hotel_savings
         
-        # Create bundle
+        flight_ids = [f.id for f in flights]
+        hotel_ids = [h.id for h in hotels]
+        tags = self._generate_tags(flights, hotels, preferences)
+        
         bundle = Bundle(
             name=f"Bundle: {origin or 'Any'} → {destination or city or 'Any'}",
             description=f"Curated bundle with {len(flights)} flight(s) and {len(hotels)} hotel(s)",
             total_price=total_price,
             savings=total_savings,
-            flight_deal_ids=",".join(str(f.id) for f in flights),
-            hotel_deal_ids=",".join(str(h.id) for h in hotels),
-            tags=self._generate_tags(flights, hotels, preferences)
+            composition_key=composition_key(
+                origin, destination, city, max_price, flight_ids, hotel_ids, tags
+            )
         )
-        
-        self.session.add(bundle)
-        self.session.commit()
-        self.session.refresh(bundle)
-        
+        bundle.set_contents(flight_ids=flight_ids, hotel_ids=hotel_ids, tags=tags)
         return bundle
     
+    def create_bundle(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        city: Optional[str] = None,
+        max_price: Optional[float] = None,
+        preferences: Optional[Dict[str, Any]] = None
+    ) -> Bundle:
+        """Create a personalized bundle, reusing the stored one for an identical composition"""
+        bundle = self.compose_bundle(origin, destination, city, max_price, preferences)
+        existing = bundle_store.lookup(self.session, bundle.composition_key)
+        if existing is not None and existing.id is not None:
+            return existing
+        
+        # Written by the bundle store, which reuses the row of a write still pending
+        return self.session.get(Bundle, bundle_store.save_now(bundle))
+    
     def _generate_tags(
         self,
         flights: List[FlightDeal],
         hotels: List[HotelDeal],
         preferences: Optional[Dict[str, Any]] = None
-    ) -> str:
+    ) -> List[str]:
         """Generate tags for bundle based on deals and preferences"""
         tags = set()
         
@@ -99,27 +116,33 @@ class ConciergeAgent:
             if preferences.get("luxury"):
                 tags.add("luxury")
         
-        return ",".join(sorted(tags))
+        return sorted(tags)
     
     def recommend_bundles(self, params: BundleSearchParams, limit: int = 5) -> List[Bundle]:
-        """Recommend existing bundles or create new ones"""
+        """Recommend existing bundles or compose new ones, without writing on the request path"""
         # First try to find existing bundles
         existing = self.deal_selector.get_best_bundles(params, limit=limit)
         
         if len(existing) >= limit:
             return existing
         
-        # If not enough, create a new one
+        # If not enough, compose one; an identical composition reuses its stored row
         try:
-            new_bundle = self.create_bundle(
+            bundle = self.compose_bundle(
                 origin=params.origin,
                 destination=params.destination,
                 city=params.city,
                 max_price=params.max_price
             )
-            existing.append(new_bundle)
         except ValueError:
-            pass  # Couldn't create bundle
+            return existing[:limit]  # Couldn't create bundle
+        
+        stored = bundle_store.lookup(self.session, bundle.composition_key)
+        if stored is None:
+            # Persisted by the bundle store's writer; served unsaved meanwhile
+            bundle_store.save(bundle)
+            stored = bundle
+        if stored.id is None or all(b.id != stored.id for b in existing):
+            existing.append(stored)
         
         return existing[:limit]
-
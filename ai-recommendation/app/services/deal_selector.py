@@ -1,16 +1,68 @@
 """Deal selector service - picks best deals from cache/DB"""
 from sqlmodel import Session, select
-from typing import List, Optional
-from app.models import FlightDeal, HotelDeal, Bundle
+from typing import Callable, List, Optional, Type
+from app.data.deal_index import deal_index
+from app.data.deal_leaderboard import deal_leaderboards, flight_scope, hotel_scope
+from app.models import FlightDeal, HotelDeal, Bundle, BundleTag
+from app.models.keys import location_key
 from app.schemas import BundleSearchParams
 
 
 class DealSelector:
-    """Service for selecting the best deals"""
+    """Service for selecting the best deals
+    
+    Lookups for one route or city are answered from its leaderboard when
+    the limit fits on it; other lookups use the in-memory deal index when
+    it is built. Either way only the chosen rows are loaded, by primary key,
+    with a fallback to a database query when a row has changed since or the
+    index returns fewer deals than asked for.
+    """
     
     def __init__(self, session: Session):
         self.session = session
     
+    def _index_ready(self) -> bool:
+        # Stale or not, the current index answers; SQL does until the first build
+        if deal_index.enabled and deal_index.is_stale():
+            deal_index.refresh_in_background()
+        return deal_index.ready
+    
+    def _leaderboard_ids(
+        self,
+        listing_type: str,
+        scope_key: str,
+        max_price: Optional[float],
+        limit: int
+    ) -> Optional[List[int]]:
+        """Deal IDs from a scope's leaderboard, or None if it can't answer the query"""
+        if limit > deal_leaderboards.size:
+            return None
+        if deal_leaderboards.enabled and deal_leaderboards.is_stale():
+            deal_leaderboards.load(self.session)
+        if not deal_leaderboards.ready:
+            return None
+        return deal_leaderboards.top_ids(listing_type, scope_key, limit, max_price)
+    
+    def _load_ranked(
+        self,
+        model: Type,
+        deal_ids: List[int],
+        still_matches: Callable,
+        limit: int = 0
+    ) -> Optional[list]:
+        """Load deals in index order; None if fewer than limit or any no longer matches the query"""
+        # A short answer may only mean the index hasn't seen newer rows yet
+        if len(deal_ids) < limit:
+            return None
+        if not deal_ids:
+            return []
+        rows = self.session.exec(select(model).where(model.id.in_(deal_ids))).all()
+        by_id = {row.id: row for row in rows}
+        deals = [by_id.get(deal_id) for deal_id in deal_ids]
+        if any(deal is None or not still_matches(deal) for deal in deals):
+            return None
+        return deals
+    
     def get_best_flight_deals(
         self,
         origin: Optional[str] = None,
@@ -19,12 +71,37 @@ class DealSelector:
         limit: int = 10
     ) -> List[FlightDeal]:
         """Get best flight deals matching criteria"""
+        still_matches = lambda deal: deal.is_active and not (
+            max_price and deal.discounted_price > max_price
+        )
+        if origin and destination:
+            scope_key = flight_scope(origin, destination)
+            deal_ids = self._leaderboard_ids("flight", scope_key, max_price, limit)
+            if deal_ids is not None:
+                deals = self._load_ranked(
+                    FlightDeal, deal_ids,
+                    lambda deal: still_matches(deal) and flight_scope(
+                        deal.origin_key, deal.destination_key
+                    ) == scope_key
+                )
+                if deals is not None:
+                    return deals
+        if self._index_ready():
+            deals = self._load_ranked(
+                FlightDeal,
+                deal_index.top_flight_ids(origin, destination, max_price, limit),
+                still_matches,
+                limit
+            )
+            if deals is not None:
+                return deals
+        
         statement = select(FlightDeal).where(FlightDeal.is_active == True)
         
         if origin:
-            statement = statement.where(FlightDeal.origin.ilike(f"%{origin}%"))
+            statement = statement.where(FlightDeal.origin_key == location_key(origin))
         if destination:
-            statement = statement.where(FlightDeal.destination.ilike(f"%{destination}%"))
+            statement = statement.where(FlightDeal.destination_key == location_key(destination))
         if max_price:
             statement = statement.where(FlightDeal.discounted_price <= max_price)
         
@@ -38,10 +115,33 @@ class DealSelector:
         limit: int = 10
     ) -> List[HotelDeal]:
         """Get best hotel deals matching criteria"""
+        still_matches = lambda deal: deal.is_active and not (
+            max_price and deal.discounted_price_per_night > max_price
+        )
+        if city:
+            scope_key = hotel_scope(city)
+            deal_ids = self._leaderboard_ids("hotel", scope_key, max_price, limit)
+            if deal_ids is not None:
+                deals = self._load_ranked(
+                    HotelDeal, deal_ids,
+                    lambda deal: still_matches(deal) and deal.city_key == scope_key
+                )
+                if deals is not None:
+                    return deals
+        if self._index_ready():
+            deals = self._load_ranked(
+                HotelDeal,
+                deal_index.top_hotel_ids(city, max_price, limit),
+                still_matches,
+                limit
+            )
+            if deals is not None:
+                return deals
+        
         statement = select(HotelDeal).where(HotelDeal.is_active == True)
         
         if city:
-            statement = statement.where(HotelDeal.city.ilike(f"%{city}%"))
+            statement = statement.where(HotelDeal.city_key == location_key(city))
         if max_price:
             statement = statement.where(HotelDeal.discounted_price_per_night <= max_price)
         
@@ -55,19 +155,13 @@ class DealSelector:
         if params.max_price:
             statement = statement.where(Bundle.total_price <= params.max_price)
         
-        statement = statement.order_by(Bundle.savings.desc()).limit(limit)
-        bundles = list(self.session.exec(statement).all())
-        
-        # Filter by tags if provided
+        # Bundles carrying any of the tags; filtered before the limit
         if params.tags:
-            filtered = []
-            for bundle in bundles:
-                bundle_tags = [tag.strip() for tag in bundle.tags.split(",") if tag.strip()]
-                if any(tag in bundle_tags for tag in params.tags):
-                    filtered.append(bundle)
-            return filtered
+            tagged = select(BundleTag.bundle_id).where(BundleTag.tag.in_(params.tags))
+            statement = statement.where(Bundle.id.in_(tagged))
         
-        return bundles
+        statement = statement.order_by(Bundle.savings.desc()).limit(limit)
+        return list(self.session.exec(statement).all())
     
     def get_deal_by_id(self, deal_id: int, deal_type: str) -> Optional[FlightDeal | HotelDeal]:
         """Get deal by ID and type"""
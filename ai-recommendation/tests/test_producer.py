@@ -0,0 +1,59 @@
+"""Delivery callbacks of KafkaProducerClient.send_async"""
+import pytest
+from kafka.future import Future
+from app.kafka import producer as producer_module
+from app.kafka.producer import KafkaProducerClient
+
+
+class FakeKafkaProducer:
+    """Stands in for KafkaProducer, handing back the futures it is given"""
+    
+    def __init__(self, **config):
+        self.futures = []
+    
+    def send(self, topic, value=None, key=None, headers=None):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(producer_module, "KafkaProducer", FakeKafkaProducer)
+    return KafkaProducerClient()
+
+
+def test_success_reaches_on_delivery(client):
+    deliveries = []
+    future = client.send_async(
+        "feeds", {"id": 1}, on_delivery=lambda metadata, error: deliveries.append((metadata, error))
+    )
+    
+    future.success("metadata")
+    
+    assert deliveries == [("metadata", None)]
+    assert (client.sent, client.delivered, client.failed) == (1, 1, 0)
+
+
+def test_failure_reaches_on_delivery(client):
+    deliveries = []
+    error = RuntimeError("broker gone")
+    future = client.send_async(
+        "feeds", {"id": 1}, on_delivery=lambda metadata, error: deliveries.append((metadata, error))
+    )
+    
+    future.failure(error)
+    
+    assert deliveries == [(None, error)]
+    assert (client.sent, client.delivered, client.failed) == (1, 0, 1)
+    assert client.last_error == "broker gone"
+
+
+def test_callbacks_without_on_delivery(client):
+    delivered = client.send_async("feeds", {"id": 1})
+    failed = client.send_async("feeds", {"id": 2})
+    
+    delivered.success("metadata")
+    failed.failure(RuntimeError("broker gone"))
+    
+    assert (client.delivered, client.failed) == (1, 1)